@@ -1,10 +1,20 @@
-const Flashcard = require("../Models/Flashcard.model");
 const mongoose = require("mongoose");
 const createError = require("http-errors");
-const mongodb = require("mongodb");
-const binary = mongodb.Binary;
+const crypto = require("crypto");
+const { pipeline } = require("stream/promises");
+const MediaService = require("../Services/Media.service");
+const StreamUpload = require("../Middleware/StreamUpload.middleware");
+const MediaOptimizer = require("../Services/MediaOptimizer.service");
+const Repository = require("../Repositories/Repository");
+const ReadCache = require("../Services/ReadCache.service");
+const Serializer = require("../Services/Serializer.service");
 
-const MAX_FILE_SIZE = 500000; // defines maximum file size in bytes
+const IMMUTABLE_FILE_MAX_AGE = 31536000; // seconds a file can be cached for when it is requested by its hash, since that URL can never change contents
+const UPDATABLE_CARD_FIELDS = ["prompt", "response", "userResponseType"]; // the only fields a PUT on a card can change
+const FILE_VARIANTS = ["original", "thumbnail"]; // the copies of a card's file that can be requested instead of the default one
+// SVGs can contain scripts, so we never let a browser open one as a page on our origin. Files embedded in cards before uploads were
+// sniffed may be typed as whatever the client sent, e.g. "image/svg", so we match any svg type
+const SVG_FILE_TYPE = /^image\/svg/i;
 
 // define the needed functions in the module's exports 
 module.exports = {
@@ -12,31 +22,23 @@ module.exports = {
     findFlashcardById: async (request, response, next) => { // used to retrieve flashcards from the DB
         try {
             const searchedId = request.params.id; // getting the id in the route parameter
-            const result = await Flashcard.findById(searchedId);            
-            
-            if (result === null) { // id is formatted correctly, but doesn't map to any flashcards
-                next(createError(404, "Flashcard does not exist"));
-            } else {
-                response.send(result);
+            const cacheKey = `card:${searchedId}`;
+            let cached = ReadCache.get(cacheKey);
+            if (cached === undefined) {
+                const readToken = ReadCache.startRead();
+                const result = await Repository.findCardById(searchedId);
+                if (result === null) { // id is formatted correctly, but doesn't map to any flashcards
+                    next(createError(404, "Flashcard does not exist"));
+                    return;
+                }
+                cached = ReadCache.set(cacheKey, readToken, Serializer.serializeCard(result), `"${result._id}.${result.__v}"`);
             }
+            ReadCache.sendEntry(request, response, cached);
         } catch (error) {
             console.log(error.message);
             if (error instanceof mongoose.CastError) { // objectid is not formatted correctly
                 next(createError(400, "invalid flashcard id"));
-            }
-            next(error);
-        }
-    },
-
-    createNewFlashcard : async (cardPrompt, cardResponse, cardResponseType, createdId, next) => {
-        try {
-            const card = new Flashcard({prompt: cardPrompt, response: cardResponse, userResponseType: cardResponseType}); 
-            const result = await card.save();
-            createdId._id = result._id;
-        } catch (error) {
-            console.log(error.message);
-            if (error.name === "ValidationError") { // invalid post request body, likely misnamed or missing field
-                next(createError(400, error.message));
+                return;
             }
             next(error);
         }
@@ -44,17 +46,20 @@ module.exports = {
 
     deleteCard : async (cardId, status, next) => {
         try {
-            const result = await Flashcard.findByIdAndDelete(cardId); // finds and deletes an entry matching the id
+            const result = await Repository.deleteCard(cardId); // finds and deletes an entry matching the id
             if (result === null) { // id is formatted correctly, but doesn't map to any flashcards
                 next(createError(404, "Flashcard does not exist"));
                 status.name = 404;
             } else {
+                ReadCache.invalidate(`card:${result._id}`);
+                await MediaService.deleteCardFile(result.file); // the card's file lives outside the card, so it has to be removed separately
                 status.name = 200; // if result isn't null then something was deleted successfully
             }
         } catch (error) {
             console.log(error.message);
             if (error instanceof mongoose.CastError) { // objectid is not formatted correctly
                 next(createError(400, "invalid flashcard id"));
+                return;
             }
             next(error);
         }
@@ -62,127 +67,238 @@ module.exports = {
 
     updateFlashcard : async (request, response, next) => {
         try {
-            const options = {new: true, runValidators: true}; // we return the newly created flashcard body and also run our schema validation against the attempted update
-            const updatedBody = request.body;
+            const updatedBody = request.body === undefined ? {} : request.body;
             const updatedCardId = request.params.id;
 
-            if (request.files !== undefined) {
+            // the file field references a stored file, so it can only be changed through the file routes
+            if (request.is("multipart/form-data") || Object.keys(updatedBody).some((field) => field === "file" || field.startsWith("file."))) {
                 next(createError(422, "Files should be added through the cards/:id/file POST route"));
+                return;
+            }
+            // update operators could change any field, including the file reference
+            if (Object.keys(updatedBody).some((field) => field.startsWith("$"))) {
+                next(createError(422, "Update operators are not allowed"));
+                return;
+            }
+            // everything else on a card (its version, its place in its set, its file) is kept by the server, so only these fields are passed on
+            let updatedFields = {};
+            for (const field of UPDATABLE_CARD_FIELDS) {
+                if (updatedBody[field] !== undefined) {
+                    updatedFields[field] = updatedBody[field];
+                }
             }
 
-            const result = await Flashcard.findByIdAndUpdate(updatedCardId, updatedBody, options);
+            // we get back the newly updated flashcard body, and the attempted update is run against our schema validation
+            const result = await Repository.updateCard(updatedCardId, updatedFields);
             if (result === null) {
                 next(createError(404, "Flashcard does not exist")); // valid id format but no matching db entry
             } else {
-                response.send(result);
+                ReadCache.invalidate(`card:${result._id}`);
+                response.type("json").send(Serializer.serializeCard(result));
             }
         } catch (error) {
             console.log(error);
             if (error instanceof mongoose.CastError) { // triggers if provided objectid is not formatted correctly
                 next(createError(400, "invalid flashcard id"));
+                return;
             }
             if (error instanceof mongoose.Error.ValidationError) { // triggers if the updated body violates our schema - for now just if the provided userResponseType isn't supported
                 next(createError(400, "invalid request body"));
+                return;
             }
             next(error);
         }
     }, 
 
-    addFileToCard : async (request, response, next) => {
+    addFileToCard : async (request, response, next) => { // the file has already been streamed into the blob store by the StreamUpload middleware
+        let fileAttached = false; // until the file is attached to the card, any failure has to remove it from the blob store
         try {
-            if (request.files === null || request.files === undefined) {
-                next(createError(400, "No file attached"));
-                return;
-            }
-
-            const addedFile = request.files.file;
-            const fileValidationResult = validateFileInput(addedFile);
-            if (fileValidationResult.code !== 200) { // validateFileInput returns the correct server status code and message if an error occurs
-                next(createError(fileValidationResult.code, fileValidationResult.message));
+            const addedFile = request.files === undefined ? undefined : request.files.file;
+            if (addedFile === undefined) {
+                await StreamUpload.rejectUpload(request, next, createError(400, "No file attached"));
                 return;
             }
 
             const partOfPrompt = request.body.partOfPrompt;
             if (partOfPrompt !== "false" && partOfPrompt !== "true") { // the file must be part of a prompt or response, otherwise request is invalid
-                next(createError(400, "File must be part of a prompt or response"));
+                await StreamUpload.rejectUpload(request, next, createError(400, "File must be part of a prompt or response"));
                 return;
             }
             
-            const fileBinary = new binary(addedFile.data); // we need to get the binary from the file to convert it to an easily stored format
-            const options = {new: true};           
-            const file = {fileType: addedFile.mimetype, data: fileBinary, partOfPrompt: partOfPrompt};
+            // the file's bytes are in the blob store, the card only keeps a reference to them and a description of the file
             const cardId = request.params.id;
-            const result = await Flashcard.findByIdAndUpdate(cardId, {file: file}, options);
-            if (result === null) { // the id we're updating with doesn't exist in the db
-                next(createError(404, "Flashcard does not exist"));
+            const file = {fileId: addedFile.fileId, fileType: addedFile.fileType, size: addedFile.size, hash: addedFile.hash, partOfPrompt: partOfPrompt};
+            const result = await Repository.setCardFile(cardId, file); // we get the file being replaced (if any) so we can remove it from the blob store
+            if (result === null) { // there's no card to attach the file to
+                await StreamUpload.rejectUpload(request, next, createError(404, "Flashcard does not exist"));
+                return;
             } 
+            fileAttached = true;
+            ReadCache.invalidate(`card:${result._id}`);
+            await MediaService.deleteCardFile(result.file); // the replaced file and any copies the optimizer made of it
+            MediaOptimizer.scheduleCardFile(result._id, file); // the optimized copy and thumbnail are made after we respond
             response.send({_id: result._id}); // we don't want to send the entire binary when we update the card
         } catch (error) {
             console.log(error.message);
-            if (error instanceof mongoose.CastError) {
-                next(createError(400, "Invalid flashcard id"));
+            const sentError = error instanceof mongoose.CastError ? createError(400, "Invalid flashcard id") : error;
+            if (fileAttached) {
+                next(sentError);
+                return;
             }
-            if (error.name === "BSONError") { // This code may no longer be reachable, need to test
-                next(createError(400, "Invalid file attached"));
+            await StreamUpload.rejectUpload(request, next, sentError);
+        }
+    },
+
+    // sends the raw bytes of the file attached to the specified flashcard. By default this is the optimized copy of the file when the media
+    // optimizer has made one, ?variant=original sends the file exactly as it was uploaded and ?variant=thumbnail a downscaled copy of an image
+    getFileFromCard : async (request, response, next) => {
+        try {
+            const variant = request.query.variant;
+            if (variant !== undefined && !FILE_VARIANTS.includes(variant)) {
+                next(createError(400, "Invalid file variant"));
+                return;
+            }
+            const searchedId = request.params.id; // getting the id in the route parameter
+            const result = await Repository.findCardFile(searchedId);
+            if (result === null) { // id is formatted correctly, but doesn't map to any flashcards
+                next(createError(404, "Flashcard does not exist"));
+                return;
+            }
+            const file = result.file;
+            if (file === undefined || file.partOfPrompt === undefined || (file.fileId === undefined && file.data === undefined)) {
+                next(createError(404, "Flashcard has no file"));
+                return;
+            }
+            const isEmbedded = file.fileId === undefined; // files attached before the blob store existed are still inside the card until they're migrated
+            // files attached before we stored hashes don't have one, so we compute it here
+            const originalHash = file.hash !== undefined ? file.hash : crypto.createHash("sha256").update(file.data).digest("hex");
+            const servedFile = selectFileVariant(file, variant);
+            if (servedFile === null) {
+                next(createError(404, "Flashcard file has no thumbnail"));
+                return;
+            }
+            const fileSize = isEmbedded ? file.data.length : servedFile.size;
+            const fileHash = isEmbedded ? originalHash : servedFile.hash;
+            const etag = `"${fileHash}"`; // a strong ETag, since the hash changes with every byte of the file
+
+            response.set("ETag", etag);
+            response.set("Accept-Ranges", "bytes");
+            response.set("X-Content-Type-Options", "nosniff"); // browsers must treat the file as the type we send rather than guessing at it
+            if (SVG_FILE_TYPE.test(servedFile.fileType)) { // a script in the SVG can't run with the sandbox, and it's downloaded if it's opened directly
+                response.set("Content-Security-Policy", "sandbox");
+                response.set("Content-Disposition", "attachment");
+            }
+            // v names a version of the card's original file. Without an explicit variant, what that URL serves changes once the optimizer
+            // finishes, so it's only immutable after that point
+            const variantIsFinal = variant !== undefined || file.optimizedAt !== undefined;
+            if (request.query.v === originalHash && variantIsFinal) { // the client asked for this exact version of the file, so its contents at this URL can never change
+                response.set("Cache-Control", `public, max-age=${IMMUTABLE_FILE_MAX_AGE}, immutable`);
+            } else { // the card's file can be replaced, so caches must check back with us before reusing it
+                response.set("Cache-Control", "no-cache");
+            }
+            if (request.fresh) { // request.fresh compares If-None-Match against the ETag we set
+                response.status(304).end();
+                return;
+            }
+
+            response.type(servedFile.fileType);
+            let requestedRange = parseFileRange(request, fileSize, etag);
+            if (requestedRange === -1) { // the range doesn't overlap the file at all
+                response.set("Content-Range", `bytes */${fileSize}`);
+                next(createError(416, "Requested range not satisfiable"));
+                return;
+            }
+            if (requestedRange === null) { // no usable range, so we send the whole file
+                requestedRange = {start: 0, end: fileSize - 1};
+            } else {
+                response.status(206);
+                response.set("Content-Range", `bytes ${requestedRange.start}-${requestedRange.end}/${fileSize}`);
+            }
+            if (isEmbedded) {
+                response.send(file.data.subarray(requestedRange.start, requestedRange.end + 1)); // range ends are inclusive
+                return;
+            }
+            response.set("Content-Length", requestedRange.end - requestedRange.start + 1);
+            if (request.method === "HEAD" || fileSize === 0) { // there's nothing to stream
+                response.end();
+                return;
+            }
+            await pipeline(MediaService.openFileStream(servedFile.fileId, requestedRange.start, requestedRange.end), response);
+        } catch (error) {
+            console.log(error.message);
+            if (response.headersSent) { // we were part way through streaming the file, so all we can do is cut the response short
+                response.destroy(error);
+                return;
+            }
+            if (error instanceof mongoose.CastError) { // objectid is not formatted correctly
+                next(createError(400, "invalid flashcard id"));
+                return;
+            }
+            if (MediaService.isFileNotFound(error)) { // the card references a file that's no longer in the blob store
+                next(createError(404, "Flashcard has no file"));
+                return;
             }
             next(error);
         }
     },
 
-    deleteFileFromCard : async (request, response, next) => { // this deletes any file attached to the specified flashcard and sends it in the response
+    deleteFileFromCard : async (request, response, next) => { // this deletes any file attached to the specified flashcard and sends its details in the response
         try {
             const searchedId = request.params.id; // getting the id in the route parameter
-            const result = await Flashcard.findById(searchedId);      
+            const result = await Repository.removeCardFile(searchedId); // we get the card as it was before, so we still know what was removed
             if (result === null) {
                 next(createError(404, "Flashcard does not exist"));
             } else {
+                ReadCache.invalidate(`card:${result._id}`);
                 let existingFile = result.file;
-                
-                // the mongoose return if the file doesn't exist is strange - it returns an object that displays as {}
-                // but when checking its keys, it still has all the keys of a file object, they are just all undefined
-                // so, we check if the document contains a file by checking if one of those fields is undefined, since none of those fields should be undefined when the object is initialized
-                if (existingFile.partOfPrompt === undefined) { 
+                // every file is attached with partOfPrompt, so a card without it has no file
+                if (existingFile === undefined || existingFile.partOfPrompt === undefined) {
                     next(createError(422, "Card indicated for file removal has no file"));
+                    return;
                 }
+                await MediaService.deleteCardFile(existingFile);
                 response.send(existingFile);
-                // deleting the file from the flashcard. If we do this before sending the response then the existingFile variable is overwritten
-                result.file = undefined; 
-                result.save();
             }
         } catch (error) {
             console.log(error.message);
             if (error instanceof mongoose.CastError) { // objectid is not formatted correctly
                 next(createError(400, "invalid flashcard id"));
+                return;
             }
             next(error);
         }
     }
-    
 }
 
-// this function verifies that uploaded files are within size and type constraints
-// it returns the entity to be returned to the client (status code and error message, if applicable)
-function validateFileInput(file) {
-    let response = {code: 200, message: "OK"};
-    if (file === null || file === undefined) { // this condition may be impossible to trigger because there is a check at the start of the addFileToCard method for this
-        response.code = 400;
-        response.message = "No file attached";
-        return response; // we need to return response immediately here to not get errors for checking undefined fields
+// this function picks which copy of a card's file to send ({fileId, fileType, size, hash}), it returns null if the requested copy doesn't exist
+function selectFileVariant(file, variant) {
+    const optimized = file.optimized !== undefined && file.optimized.fileId !== undefined ? file.optimized : null;
+    const thumbnail = file.thumbnail !== undefined && file.thumbnail.fileId !== undefined ? file.thumbnail : null;
+    if (variant === "thumbnail") {
+        return thumbnail;
     }
-    if (file.data.length > MAX_FILE_SIZE) {
-        response.code = 422;
-        response.message = "Attached file is too large";
+    if (variant === undefined && optimized !== null) {
+        return optimized;
     }
-    const fileMimetypeArray = file.mimetype.split("/"); // separates keywords in the file's description, e.g. [image, jpeg]
-    if (fileMimetypeArray[0] !== "image" && fileMimetypeArray[0] !== "audio") {
-        response.code = 415
-        response.message = "Attached files must be image or audio files and cannot be PDFs";
+    return file;
+}
+
+// this function determines the byte range of a file the client asked for through the Range header
+// it returns null if the whole file should be sent, -1 if the range can't be satisfied, and {start, end} (inclusive) otherwise
+function parseFileRange(request, fileSize, etag) {
+    if (request.headers.range === undefined) {
+        return null;
     }
-    if (fileMimetypeArray[1] === "tiff" || fileMimetypeArray[1] === "tiff-fx") {
-        response.code = 415
-        response.message = "Attached files cannot be in the following formats: tiff";
+    const ifRange = request.headers["if-range"];
+    if (ifRange !== undefined && ifRange !== etag) { // the client's copy is out of date, so a piece of the new file is useless to it
+        return null;
     }
-
-    return response;
+    const ranges = request.range(fileSize, {combine: true});
+    if (ranges === -1) {
+        return -1;
+    }
+    if (ranges === -2 || ranges.type !== "bytes" || ranges.length !== 1) { // malformed or multipart ranges are ignored, which the spec permits
+        return null;
+    }
+    return {start: ranges[0].start, end: ranges[0].end};
 }
-
@@ -1,7 +1,20 @@
 const StudySet = require("../Models/StudySet.model");
+const Flashcard = require("../Models/Flashcard.model");
 const FlashcardController = require("../Controllers/Flashcard.Controller");
 const mongoose = require("mongoose");
 const createError = require("http-errors");
+const MediaService = require("../Services/Media.service");
+const MediaOptimizer = require("../Services/MediaOptimizer.service");
+const QuizStatsService = require("../Services/QuizStats.service");
+const Repository = require("../Repositories/Repository");
+const StreamUpload = require("../Middleware/StreamUpload.middleware");
+const ReadCache = require("../Services/ReadCache.service");
+const Serializer = require("../Services/Serializer.service");
+const { once } = require("events");
+const crypto = require("crypto");
+
+const DEFAULT_SET_PAGE_SIZE = 100; // number of sets returned by GET /sets when the client doesn't provide a limit
+const MAX_SET_PAGE_SIZE = 1000; // the most sets a client can request in one page
 
 // define the needed functions in the module exports
 module.exports = {
@@ -10,27 +23,66 @@ module.exports = {
     // is only intended to have 1 user per instance of itself
     getAllStudySets : async (request, response, next) => { // this method is necessary so the client can know what ids it needs to be accessing
         try {
-            const sets = await StudySet.find();
-            response.send({study_sets: sets});
+            // sets are returned a page at a time in _id order. The client passes the next_page value from one response as ?after= to get the next page
+            const limit = request.query.limit === undefined ? DEFAULT_SET_PAGE_SIZE : Number(request.query.limit);
+            if (!Number.isInteger(limit) || limit < 1 || limit > MAX_SET_PAGE_SIZE) {
+                next(createError(400, `limit must be a whole number between 1 and ${MAX_SET_PAGE_SIZE}`));
+                return;
+            }
+            const projection = buildSetProjection(request.query.fields);
+            if (projection === null) { // the client asked for a field that study sets don't have
+                next(createError(400, "invalid study set fields requested"));
+                return;
+            }
+            const after = request.query.after;
+            const cacheKey = `sets:${JSON.stringify([limit, request.query.fields, after])}`;
+            let cached = ReadCache.get(cacheKey);
+            if (cached === undefined) {
+                const readToken = ReadCache.startRead();
+                // we ask for one extra set so we know whether there's another page without a second query
+                const [sets, totalCount] = await Promise.all([Repository.listSets(after, limit + 1, projection), Repository.countSets()]);
+                const hasNextPage = sets.length > limit;
+                if (hasNextPage) {
+                    sets.pop();
+                }
+                const nextPage = hasNextPage ? sets[sets.length - 1]._id : null;
+                const body = `{"study_sets":[${sets.map(Serializer.serializeSet).join(",")}],"next_page":${JSON.stringify(nextPage)},"total_count":${totalCount}}`;
+                // a page holds many sets, so it has no single version to tag it with and is tagged by its contents instead
+                const etag = `"sets-${crypto.createHash("sha1").update(body).digest("base64url")}"`;
+                cached = ReadCache.set(cacheKey, readToken, body, etag);
+            }
+            ReadCache.sendEntry(request, response, cached);
         } catch (error) {
+            console.log(error.message);
+            if (error instanceof mongoose.CastError) { // the after parameter isn't a valid objectid
+                next(createError(400, "invalid page cursor"));
+                return;
+            }
             next(error); // some sort of internal server error would have to happen for an error here
         }
     },
 
     createStudySet : async (request, response, next) => { // add a study set to the database
         try {
+            // any files in the request were already stored by the StreamUpload middleware, so rejecting the request has to remove them
             const title = request.body.title;
             if (title === undefined || title === null) { // we make this check here instead of in schema validation because we also need to ensure that the title doesn't contain only whitespace
-                next(createError(400, "Sets must have a title"));
+                await StreamUpload.rejectUpload(request, next, createError(400, "Sets must have a title"));
                 return;
             }
             if (title.trim() === "") { // checking if the title contains only whitespace characters
-                next(createError(400, "Set title must contain non-whitespace characters"));
+                await StreamUpload.rejectUpload(request, next, createError(400, "Set title must contain non-whitespace characters"));
+                return;
+            }
+            if (request.body.cards !== undefined) { // the set is being created together with its cards (and their files) in one request
+                await createStudySetWithCards(request, response, next);
                 return;
             }
-            const set = new StudySet({"title": request.body.title}); // raises a 400 error if no title is included
-            const result = await set.save();
-            response.send(result);
+            await StreamUpload.discardUploads(request); // files without cards have nothing to belong to
+            const set = new StudySet({"title": request.body.title, nextCardPosition: 0}); // raises a 400 error if no title is included
+            const result = await Repository.insertSet(set);
+            ReadCache.invalidatePrefix("sets:");
+            response.type("json").send(Serializer.serializeSet(result));
         } catch (error) {
             console.log(error.message);
             next(error);
@@ -40,28 +92,23 @@ module.exports = {
     deleteStudySetById : async (request, response, next) => { // delete a study set from the database
         try {
             const deletedId = request.params.id; 
-            const result = await StudySet.findByIdAndDelete(deletedId); 
-            if (result === null) { // this triggers if the id is formatted correctly, but doesn't map to any products
+            // the set and all of its cards are removed together so we never leave cards in the DB with no references to them
+            const deleted = await Repository.deleteSetWithCards(deletedId);
+            if (deleted === null) { // this triggers if the id is formatted correctly, but doesn't map to any products
                 next(createError(404, "Study Set does not exist"));
-            } else {
-                const deletedCards = result.cards;
-                let errorOccurred = false;
-                // deleting all the cards in the set to avoid cards in the DB with no references to them
-                for (let i = 0; i < deletedCards.length; i++) { 
-                    let status = {name : 0};
-                    await FlashcardController.deleteCard(deletedCards[i], status, next);
-                    if (status.name !== 200) { // if all validation rules of the DB and API are followed then no errors should occur, but if one does occur we want to know about it
-                        errorOccurred = true;
-                    }
-                }
-                if (!errorOccurred) {
-                    response.send(result);
-                }
+                return;
             }
+            invalidateCachedSet(deleted.set._id);
+            ReadCache.invalidate(...deleted.set.cards.map((cardId) => `card:${cardId}`));
+            // files can't be removed inside the transaction. If this fails part way the orphan collector (Scripts/collectOrphans.js) removes whatever is left
+            const fileIds = deleted.cards.filter((card) => card.file !== undefined).flatMap((card) => MediaService.cardFileIds(card.file));
+            await Promise.all(fileIds.map((fileId) => MediaService.deleteFile(fileId)));
+            response.type("json").send(Serializer.serializeSet(deleted.set));
         } catch (error) {
             console.log(error.message);
             if (error instanceof mongoose.CastError) { // this triggers if the objectid is not formatted correctly
                 next(createError(400, "invalid study set id"));
+                return;
             }
             next(error)
         }
@@ -70,16 +117,64 @@ module.exports = {
     getStudySetById : async (request, response, next) => { // get a study set from the database matching a specific id
         try {
             const searchedId = request.params.id;
-            const result = await StudySet.findById(searchedId);
-            if (result === null) { // this will occur if the id has a valid format but doesn't match any sets in the database
+            const cacheKey = `set:${searchedId}`;
+            let cached = ReadCache.get(cacheKey);
+            if (cached === undefined) {
+                const readToken = ReadCache.startRead();
+                const result = await Repository.findSetById(searchedId);
+                if (result === null) { // this will occur if the id has a valid format but doesn't match any sets in the database
+                    next(createError(404, "Study Set does not exist"));
+                    return;
+                }
+                cached = ReadCache.set(cacheKey, readToken, Serializer.serializeSet(result), `"${result._id}.${result.__v}"`);
+            }
+            ReadCache.sendEntry(request, response, cached);
+        } catch (error) {
+            console.log(error.message);
+            if (error instanceof mongoose.CastError) { // this triggers if the objectid is not formatted correctly
+                next(createError(400, "invalid study set id"));
+                return;
+            }
+            next(error);
+        }
+    },
+
+    getCardsInSet : async (request, response, next) => { // streams every card in the set with the specified id back in a single response, in the set's card order
+        try {
+            const searchedId = request.params.id;
+            // we only need the ordered card ids, not the rest of the set, and whether its cards have positions yet
+            const studySet = await Repository.findSetById(searchedId, {cards: 1, nextCardPosition: 1});
+            if (studySet === null) { // this will occur if the id has a valid format but doesn't match any sets in the database
                 next(createError(404, "Study Set does not exist"));
-            } else {
-                response.send(result);
+                return;
+            }
+            const projection = buildCardProjection(request.query.fields);
+            if (projection === null) { // the client asked for a field that flashcards don't have
+                next(createError(400, "invalid card fields requested"));
+                return;
             }
+
+            let isFirstCard = true;
+            response.type("json");
+            response.write('{"cards":[');
+            // each card is written as soon as the repository hands it over, in the set's order
+            for await (const card of Repository.findCardsInSet(studySet, projection)) {
+                const chunk = (isFirstCard ? "" : ",") + Serializer.serializeCard(card);
+                isFirstCard = false;
+                if (!response.write(chunk)) { // waiting for the socket to drain if its buffer is full
+                    await once(response, "drain");
+                }
+            }
+            response.end("]}");
         } catch (error) {
             console.log(error.message);
+            if (response.headersSent) { // we've already started streaming cards, so the only thing left to do is cut the response short
+                response.destroy(error);
+                return;
+            }
             if (error instanceof mongoose.CastError) { // this triggers if the objectid is not formatted correctly
                 next(createError(400, "invalid study set id"));
+                return;
             }
             next(error);
         }
@@ -87,7 +182,6 @@ module.exports = {
 
     updateStudySetTitle : async (request, response, next) => { // update the title of a study set with a specified id
         try {
-            const options = {new: true}; // we return the newly modified set title
             const updatedId = request.params.id;
             const title = request.body.title;
             if (title === undefined || title === null) { // we make this check here instead of in schema validation because we also need to ensure that the title doesn't contain only whitespace
@@ -98,16 +192,18 @@ module.exports = {
                 next(createError(400, "Set title must contain non-whitespace characters"));
                 return;
             }
-            const result = await StudySet.findByIdAndUpdate(updatedId, {title: title}, options);
+            const result = await Repository.updateSetTitle(updatedId, title); // we return the newly modified set title
             if (result === null) { // no set was found matching the provided id
                 next(createError(404, "Study set does not exist")); 
             } else {
-                response.send(result);
+                invalidateCachedSet(result._id);
+                response.type("json").send(Serializer.serializeSet(result));
             }
         } catch (error) {
             console.log(error.message);
             if (error instanceof mongoose.CastError) { // triggers if provided id is not formatted correctly
                 next(createError(400, "invalid study set id"));
+                return;
             } 
             next(error); 
         }
@@ -116,26 +212,35 @@ module.exports = {
     addCardToSet : async (request, response, next) => { // add a card to the study set with the specified id
         try {
             const addedSetId = request.params.id;
-            const studySet = await StudySet.findById(addedSetId);
-            if (studySet === null) { // if it's null then no entry in the db matches the provided id
-                next(createError(404, "Study Set does not exist"));
+            if (!mongoose.isValidObjectId(addedSetId)) { // we check this before creating the card so an invalid id can't leave a card behind
+                next(createError(400, "invalid study set id"));
                 return;
-            } 
+            }
             const flashcardBody = request.body; 
-            let createdId = {_id: " "};
-            // we are passing the createdId object by reference since returning values from the FlashcardController is difficult
-            // we pass next so the helper function can do error handling itself
-            await FlashcardController.createNewFlashcard(flashcardBody.prompt, flashcardBody.response, flashcardBody.userResponseType, createdId, next);
-
-            if (createdId._id !== " ") { // checking if an error occurred and the id field wasn't updated
-                studySet.cards.push(createdId._id); // adding the id to the sets' array of ids
-                const result = await studySet.save();
-                response.send(result);
-            } // if this if block isn't executed then a 422 or 500 occurred on the method call
+            const card = new Flashcard({prompt: flashcardBody.prompt, response: flashcardBody.response, userResponseType: flashcardBody.userResponseType,
+                                        setId: addedSetId});
+            const validationError = card.validateSync(); // we validate the card before touching the set so an invalid card can't be added to it
+            if (validationError !== undefined) { // invalid post request body, likely misnamed or missing field
+                next(createError(400, validationError.message));
+                return;
+            }
+
+            let result;
+            try {
+                result = await Repository.addCardToSet(addedSetId, card);
+            } finally { // even a card that couldn't be stored may have been in the set for a moment
+                invalidateCachedSet(addedSetId);
+            }
+            if (result === null) { // if it's null then no entry in the db matches the provided id, and we haven't created anything yet
+                next(createError(404, "Study Set does not exist"));
+                return;
+            }
+            response.type("json").send(Serializer.serializeSet(result));
         } catch (error) {
             console.log(error.message);
             if (error instanceof mongoose.CastError) { // triggers if provided id is not formatted correctly
                 next(createError(400, "invalid study set id"));
+                return;
             } 
             next(error); 
         }
@@ -145,36 +250,64 @@ module.exports = {
         try {
             const modifiedSetId = request.params.set_id;
             const deletedCardId = request.params.card_id;
-            const studySet = await StudySet.findById(modifiedSetId);
-            if (studySet === null) { // if it's null then no entry in the db matches the provided id
-                next(createError(404, "Study set does not exist"));
+            if (!mongoose.isValidObjectId(modifiedSetId)) {
+                next(createError(400, "invalid study set id"));
+                return;
+            }
+            if (!mongoose.isValidObjectId(deletedCardId)) {
+                next(createError(400, "invalid flashcard id"));
+                return;
+            }
+            const result = await Repository.removeCardFromSet(modifiedSetId, deletedCardId);
+            if (result === null) { // either the set doesn't exist or the card isn't in it
+                if (!await Repository.setExists(modifiedSetId)) {
+                    next(createError(404, "Study set does not exist"));
+                } else {
+                    next(createError(404, "Flashcard does not exist"));
+                }
                 return;
             }
+            invalidateCachedSet(result._id);
             let status = {name: 0};
             // passing status object to allow the arrow function in the controller to modify it as a 'return'
+            // if this fails the card is no longer in any set, so the orphan collector will remove it
             await FlashcardController.deleteCard(deletedCardId, status, next);
             if (status.name === 200) { // if the status code is OK after deleting the card 
-                studySet.cards.remove(deletedCardId);
-                const result = await studySet.save();
-                response.send(result);
+                response.type("json").send(Serializer.serializeSet(result));
             } 
         } catch (error) {
             console.log(error.message);
             if (error instanceof mongoose.CastError) { // triggers if provided id is not formatted correctly
                 next(createError(400, "invalid study set id"));
+                return;
             } 
             next(error);
         }
     },
 
-    addQuizScore : async (request, response, next) => {
+    getStudySetStats : async (request, response, next) => { // get the quiz score aggregates for the study set with the specified id
         try {
-            const targetedSetId = request.params.id;
-            const studySet = await StudySet.findById(targetedSetId);
-            if (studySet === null) { // the provided id doesn't match any study set in the db
+            const searchedId = request.params.id;
+            // only the stats are read, the attempts themselves are never loaded to answer this
+            const result = await Repository.findSetById(searchedId, {quizStats: 1});
+            if (result === null) { // this will occur if the id has a valid format but doesn't match any sets in the database
                 next(createError(404, "Study Set does not exist"));
                 return;
             }
+            response.send({_id: result._id, ...QuizStatsService.describeStats(result.quizStats)});
+        } catch (error) {
+            console.log(error.message);
+            if (error instanceof mongoose.CastError) { // this triggers if the objectid is not formatted correctly
+                next(createError(400, "invalid study set id"));
+                return;
+            }
+            next(error);
+        }
+    },
+
+    addQuizScore : async (request, response, next) => {
+        try {
+            const targetedSetId = request.params.id;
             let addedQuizScore = request.body.addedQuizScore;
             if (addedQuizScore === undefined || addedQuizScore === null) { // verifying that the request body actually contains a quiz score to add
                 next(createError(400, "No quiz score provided"));
@@ -189,16 +322,144 @@ module.exports = {
                 next(createError(422, "Provided quiz score must be the fraction of correct answers and must be between 0 and 1"));
                 return;
             }
-            // if we get here then the quiz score is valid and can be added to the study set
-            studySet.quizScores.push(addedQuizScore); 
-            const result = await studySet.save();
-            response.send(result);
+            // if we get here then the quiz score is valid and can be stored as a new attempt
+            const result = await Repository.recordQuizAttempt(targetedSetId, addedQuizScore);
+            if (result === null) { // the provided id doesn't match any study set in the db
+                next(createError(404, "Study Set does not exist"));
+                return;
+            }
+            invalidateCachedSet(result._id);
+            response.send({_id: result._id, title: result.title, quizStats: QuizStatsService.describeStats(result.quizStats)});
         } catch (error) {
             console.log(error.message);
             if (error instanceof mongoose.CastError) { // triggers if provided objectid doesn't have a valid format
                 next(createError(400, "invalid study set id"));
+                return;
             }
             next(error);
         }
     }
-}
\ No newline at end of file
+}
+
+// this function handles a POST /sets request that includes the set's cards, creating the set, its cards and their files all at once
+// request.body.cards is an array (a JSON string in multipart requests) of {prompt, response, userResponseType, file: {partOfPrompt}}
+// the file for the card at index i is attached as "file-i" and has already been stored by the StreamUpload middleware. Either everything is created or nothing is
+async function createStudySetWithCards(request, response, next) {
+    let cardBodies = request.body.cards;
+    if (typeof cardBodies === "string") { // multipart requests can only send strings, so the cards arrive as JSON
+        try {
+            cardBodies = JSON.parse(cardBodies);
+        } catch (error) {
+            await StreamUpload.rejectUpload(request, next, createError(400, "Cards must be a JSON array"));
+            return;
+        }
+    }
+    if (!Array.isArray(cardBodies)) {
+        await StreamUpload.rejectUpload(request, next, createError(400, "Cards must be a JSON array"));
+        return;
+    }
+
+    // we validate every card before writing anything so a bad card can't leave a partially created set behind
+    const attachedFiles = request.files === null || request.files === undefined ? {} : request.files;
+    const set = new StudySet({title: request.body.title});
+    let cards = [];
+    for (let i = 0; i < cardBodies.length; i++) {
+        const cardBody = cardBodies[i] !== null && typeof cardBodies[i] === "object" ? cardBodies[i] : {};
+        const card = new Flashcard({prompt: cardBody.prompt, response: cardBody.response, userResponseType: cardBody.userResponseType, 
+                                    setId: set._id, position: i});
+        const validationError = card.validateSync();
+        if (validationError !== undefined) {
+            await StreamUpload.rejectUpload(request, next, createError(400, `Card ${i}: ${validationError.message}`));
+            return;
+        }
+        const addedFile = attachedFiles[`file-${i}`]; // the middleware already checked its size and type
+        if (addedFile !== undefined) {
+            const partOfPrompt = cardBody.file !== undefined && cardBody.file !== null ? String(cardBody.file.partOfPrompt) : undefined;
+            if (partOfPrompt !== "false" && partOfPrompt !== "true") { // the file must be part of a prompt or response, otherwise request is invalid
+                await StreamUpload.rejectUpload(request, next, createError(400, `Card ${i}: File must be part of a prompt or response`));
+                return;
+            }
+            card.file = {fileId: addedFile.fileId, fileType: addedFile.fileType, size: addedFile.size, hash: addedFile.hash, partOfPrompt: partOfPrompt};
+        }
+        cards.push(card);
+    }
+
+    set.cards = cards.map((card) => card._id);
+    set.nextCardPosition = cards.length;
+    let result;
+    try {
+        result = await Repository.insertSetWithCards(set, cards);
+    } catch (error) { // nothing was stored, so the uploaded files have nothing to belong to
+        await StreamUpload.discardUploads(request).catch((cleanupError) => console.log(cleanupError.message));
+        throw error;
+    }
+    // files attached as file-i for an i with no card have nothing to belong to
+    const unusedFileIds = Object.keys(attachedFiles).filter((fieldName) => parseInt(fieldName.slice("file-".length)) >= cards.length)
+                                                    .map((fieldName) => attachedFiles[fieldName].fileId);
+    await Promise.all(unusedFileIds.map((fileId) => MediaService.deleteFile(fileId)));
+    cards.forEach((card) => MediaOptimizer.scheduleCardFile(card._id, card.file)); // the optimized copies and thumbnails are made after we respond
+    ReadCache.invalidatePrefix("sets:");
+    response.type("json").send(Serializer.serializeSet(result));
+}
+
+// this function removes a set from the read cache after it changes, along with every cached page of GET /sets since any of them could include it
+function invalidateCachedSet(setId) {
+    ReadCache.invalidate(`set:${setId}`);
+    ReadCache.invalidatePrefix("sets:");
+}
+
+// this function builds the projection used when fetching the cards in a set
+// fieldsParameter is a comma separated list of card fields (e.g. "prompt,response")
+// it returns null if any of the requested fields don't exist on flashcards
+function buildCardProjection(fieldsParameter) {
+    if (fieldsParameter === undefined || fieldsParameter === "") { // no fields were requested, so we return whole cards (file data is never selected by default)
+        return {};
+    }
+    if (typeof fieldsParameter !== "string") { // this happens if the fields parameter is repeated in the query string
+        return null;
+    }
+    // the top level fields of a flashcard, e.g. "file" for the "file.data" path
+    const cardFields = new Set(Object.keys(Flashcard.schema.paths).map((path) => path.split(".")[0]));
+    let projection = {};
+    const requestedFields = fieldsParameter.split(",").map((field) => field.trim());
+    for (let i = 0; i < requestedFields.length; i++) {
+        const field = requestedFields[i];
+        if (!cardFields.has(field)) {
+            return null;
+        }
+        if (field === "file") { // selecting "file" directly would include its data, so we select everything about the file except its contents
+            projection["file.fileType"] = 1;
+            projection["file.size"] = 1;
+            projection["file.hash"] = 1;
+            projection["file.partOfPrompt"] = 1;
+            for (const optimizerField of ["width", "height", "duration", "optimized", "thumbnail", "optimizedAt"]) {
+                projection[`file.${optimizerField}`] = 1;
+            }
+        } else {
+            projection[field] = 1;
+        }
+    }
+    return projection;
+}
+
+// this function builds the projection used when listing study sets
+// fieldsParameter is a comma separated list of study set fields (e.g. "title,cards")
+// it returns null if any of the requested fields don't exist on study sets
+function buildSetProjection(fieldsParameter) {
+    if (fieldsParameter === undefined || fieldsParameter === "") { // no fields were requested, so we return whole sets (quiz history is kept out of sets)
+        return {};
+    }
+    if (typeof fieldsParameter !== "string") { // this happens if the fields parameter is repeated in the query string
+        return null;
+    }
+    const setFields = new Set(Object.keys(StudySet.schema.paths).map((path) => path.split(".")[0]));
+    let projection = {};
+    const requestedFields = fieldsParameter.split(",").map((field) => field.trim());
+    for (let i = 0; i < requestedFields.length; i++) {
+        if (!setFields.has(requestedFields[i])) {
+            return null;
+        }
+        projection[requestedFields[i]] = 1;
+    }
+    return projection;
+}
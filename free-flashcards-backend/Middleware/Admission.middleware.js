@@ -0,0 +1,149 @@
+const createError = require("http-errors");
+const Metrics = require("../Services/Metrics.service");
+
+// Limits how many requests of each class of route this process works on at once, so a burst of expensive requests (uploads, deleting large sets)
+// can't use up the memory and db connections that cheap reads need
+// A request over its class's limit waits in that class's queue. Once the queue is full, or it has waited too long, it's turned away straight
+// away with a 503 and a Retry-After header, rather than every request in the class getting slower and slower
+// each class's limits can be set in the .env file, e.g. for "set-delete": ADMISSION_SET_DELETE_CONCURRENCY, ADMISSION_SET_DELETE_QUEUE
+// (0 turns requests away as soon as the class is busy) and ADMISSION_SET_DELETE_QUEUE_TIMEOUT_MS. In cluster mode the limits are per worker
+
+const DEFAULT_LIMITS = {
+    "read": {concurrency: 64, queue: 256, queueTimeoutMs: 1000}, // GETs of sets and cards, which are mostly answered from the read cache
+    "download": {concurrency: 16, queue: 64, queueTimeoutMs: 2000}, // streaming a card's file holds a db cursor open for as long as the client takes
+    "write": {concurrency: 32, queue: 128, queueTimeoutMs: 2000}, // small JSON updates
+    "upload": {concurrency: 4, queue: 16, queueTimeoutMs: 5000}, // each one streams up to several files into the blob store
+    "set-delete": {concurrency: 2, queue: 16, queueTimeoutMs: 5000} // removes every card in the set and their files
+};
+
+let routeClasses = new Map(); // name -> {name, concurrency, maxQueued, queueTimeoutMs, retryAfterSeconds, inFlight, queue, admitted, queued, rejected}
+
+// define the needed functions in the module's exports
+module.exports = {
+
+    // returns middleware that admits a request once fewer than the class's limit of requests are running, and turns it away when it can't be
+    // the request counts against the limit until its response is finished or the client goes away
+    admitRequests : (className) => {
+        const routeClass = getRouteClass(className);
+        return (request, response, next) => {
+            if (routeClass.inFlight < routeClass.concurrency) {
+                start(routeClass, request, response, next);
+                return;
+            }
+            if (routeClass.queue.length >= routeClass.maxQueued) {
+                reject(routeClass, response, next, "queue_full");
+                return;
+            }
+            const waiter = {request: request, response: response, next: next, queuedAt: process.hrtime.bigint()};
+            waiter.timer = setTimeout(() => {
+                removeWaiter(routeClass, waiter);
+                reject(routeClass, response, next, "queue_timeout");
+            }, routeClass.queueTimeoutMs);
+            // a client that gives up while it's waiting shouldn't be started later, or hold up the requests behind it
+            // we only notice an upload's client going away once its body is read, so those are started and fail as soon as they read from the socket
+            waiter.onClose = () => {
+                clearTimeout(waiter.timer);
+                removeWaiter(routeClass, waiter);
+            };
+            response.once("close", waiter.onClose);
+            routeClass.queue.push(waiter);
+            routeClass.queued++;
+            reportLoad(routeClass);
+        };
+    },
+
+    // reports every class's limits, what it's doing right now and how many requests it has admitted and turned away, so the limits can be tuned
+    getStats : () => {
+        let stats = {};
+        for (const routeClass of routeClasses.values()) {
+            stats[routeClass.name] = {concurrency: routeClass.concurrency, maxQueued: routeClass.maxQueued, queueTimeoutMs: routeClass.queueTimeoutMs,
+                                      inFlight: routeClass.inFlight, queueDepth: routeClass.queue.length, admitted: routeClass.admitted,
+                                      queued: routeClass.queued, rejected: {...routeClass.rejected}};
+        }
+        return stats;
+    }
+}
+
+// this function returns the state of a class of routes, reading its limits from the .env file the first time it's used
+function getRouteClass(className) {
+    let routeClass = routeClasses.get(className);
+    if (routeClass !== undefined) {
+        return routeClass;
+    }
+    const defaults = DEFAULT_LIMITS[className];
+    if (defaults === undefined) {
+        throw new Error(`Unknown route class: ${className}`);
+    }
+    const envPrefix = `ADMISSION_${className.toUpperCase().replace(/-/g, "_")}`;
+    const queueTimeoutMs = readLimit(`${envPrefix}_QUEUE_TIMEOUT_MS`, defaults.queueTimeoutMs, 1);
+    routeClass = {
+        name: className,
+        concurrency: readLimit(`${envPrefix}_CONCURRENCY`, defaults.concurrency, 1),
+        maxQueued: readLimit(`${envPrefix}_QUEUE`, defaults.queue, 0),
+        queueTimeoutMs: queueTimeoutMs,
+        retryAfterSeconds: Math.ceil(queueTimeoutMs / 1000), // by then the requests ahead of it have had the time a queued request gets
+        inFlight: 0,
+        queue: [], // waiters in the order they arrived
+        admitted: 0,
+        queued: 0, // how many requests had to wait, including ones that were turned away after waiting too long
+        rejected: {queue_full: 0, queue_timeout: 0}
+    };
+    routeClasses.set(className, routeClass);
+    reportLoad(routeClass);
+    return routeClass;
+}
+
+// this function reads a whole number of at least minimum from the .env file, falling back to defaultValue if it isn't set or isn't valid
+function readLimit(name, defaultValue, minimum) {
+    const value = parseInt(process.env[name]);
+    return Number.isInteger(value) && value >= minimum ? value : defaultValue;
+}
+
+// this function runs an admitted request, and frees its place once its response is done with
+function start(routeClass, request, response, next) {
+    routeClass.inFlight++;
+    routeClass.admitted++;
+    reportLoad(routeClass);
+    response.once("close", () => {
+        routeClass.inFlight--;
+        startNextWaiter(routeClass);
+        reportLoad(routeClass);
+    });
+    next();
+}
+
+// this function starts the request that has waited the longest, if there's room for it
+function startNextWaiter(routeClass) {
+    if (routeClass.inFlight >= routeClass.concurrency || routeClass.queue.length === 0) {
+        return;
+    }
+    const waiter = routeClass.queue.shift();
+    clearTimeout(waiter.timer);
+    waiter.response.off("close", waiter.onClose);
+    Metrics.observeAdmissionWait(routeClass.name, Number(process.hrtime.bigint() - waiter.queuedAt) / 1e9);
+    start(routeClass, waiter.request, waiter.response, waiter.next);
+}
+
+function removeWaiter(routeClass, waiter) {
+    const index = routeClass.queue.indexOf(waiter);
+    if (index !== -1) {
+        routeClass.queue.splice(index, 1);
+        reportLoad(routeClass);
+    }
+}
+
+// this function turns a request away, reason is "queue_full" or "queue_timeout"
+function reject(routeClass, response, next, reason) {
+    routeClass.rejected[reason]++;
+    Metrics.countAdmissionRejection(routeClass.name, reason);
+    response.set("Retry-After", String(routeClass.retryAfterSeconds));
+    // an upload we turn away hasn't been read yet, and closing the connection saves the client from sending the rest of it
+    if (!response.req.complete) {
+        response.set("Connection", "close");
+    }
+    next(createError(503, reason === "queue_full" ? "Server is too busy, try again later" : "Timed out waiting for the server, try again later"));
+}
+
+function reportLoad(routeClass) {
+    Metrics.setAdmissionLoad(routeClass.name, routeClass.inFlight, routeClass.queue.length);
+}
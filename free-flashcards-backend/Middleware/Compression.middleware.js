@@ -0,0 +1,104 @@
+const zlib = require("zlib");
+
+const COMPRESSION_THRESHOLD = 1024; // bodies smaller than this many bytes barely shrink, so they aren't worth the CPU
+const COMPRESSED_TYPE = /^application\/json\b/; // files are already compressed formats, so only json is compressed
+const ENCODINGS = ["br", "gzip"]; // in order of preference when the client accepts both equally
+// brotli's default quality is meant for compressing static files ahead of time, this is far cheaper and still smaller than gzip
+const BROTLI_OPTIONS = {params: {[zlib.constants.BROTLI_PARAM_QUALITY]: 4, [zlib.constants.BROTLI_PARAM_MODE]: zlib.constants.BROTLI_MODE_TEXT}};
+
+// define the needed functions in the module's exports
+module.exports = {
+
+    COMPRESSION_THRESHOLD : COMPRESSION_THRESHOLD,
+
+    // compresses json responses with the best encoding the client accepts (Accept-Encoding)
+    // this works for whole bodies sent with response.send and for bodies written a piece at a time (e.g. GET /sets/:id/cards)
+    compressResponses : () => (request, response, next) => {
+        const write = response.write;
+        const end = response.end;
+        let compressor = null;
+        let decided = false;
+
+        // decides whether to compress from the response's headers, which can't change once the first byte of the body is written
+        // bodyLength is the size of the whole body when it's being sent in one piece, and null when more may follow
+        const decide = (bodyLength) => {
+            decided = true;
+            if (response.headersSent || !COMPRESSED_TYPE.test(response.get("Content-Type") || "")) {
+                return;
+            }
+            response.vary("Accept-Encoding"); // caches have to keep the compressed and uncompressed responses apart
+            const declaredLength = parseInt(response.get("Content-Length"));
+            const length = bodyLength !== null ? bodyLength : (Number.isNaN(declaredLength) ? null : declaredLength);
+            if (request.method === "HEAD" || response.statusCode === 204 || response.statusCode === 304 || response.get("Content-Encoding") !== undefined ||
+                (length !== null && length < COMPRESSION_THRESHOLD)) {
+                return;
+            }
+            const encoding = module.exports.negotiateEncoding(request);
+            if (encoding === null) {
+                return;
+            }
+            response.set("Content-Encoding", encoding);
+            response.removeHeader("Content-Length"); // the compressed length isn't known until the whole body has been compressed
+            compressor = encoding === "br" ? zlib.createBrotliCompress(BROTLI_OPTIONS) : zlib.createGzip();
+            compressor.on("data", (chunk) => {
+                if (!write.call(response, chunk)) { // the socket is full, so we stop compressing until it drains
+                    compressor.pause();
+                }
+            });
+            response.on("drain", () => compressor.resume());
+            // code writing to the response waits for drain when a write returns false, which only the compressor knows about
+            compressor.on("drain", () => response.emit("drain"));
+            compressor.on("end", () => end.call(response));
+            compressor.on("error", (error) => response.destroy(error));
+        };
+
+        response.write = function (chunk, encoding, callback) {
+            if (!decided) {
+                decide(null);
+            }
+            if (compressor === null) {
+                return write.call(this, chunk, encoding, callback);
+            }
+            return compressor.write(toBuffer(chunk, encoding), typeof encoding === "function" ? encoding : callback);
+        };
+
+        response.end = function (chunk, encoding, callback) {
+            if (typeof chunk === "function") { // end(callback)
+                callback = chunk;
+                chunk = undefined;
+            }
+            if (!decided) {
+                decide(chunk === undefined || chunk === null ? 0 : toBuffer(chunk, encoding).length);
+            }
+            if (compressor === null) {
+                return end.call(this, chunk, encoding, callback);
+            }
+            if (typeof callback === "function" || typeof encoding === "function") {
+                this.once("finish", typeof callback === "function" ? callback : encoding);
+            }
+            if (chunk !== undefined && chunk !== null) {
+                compressor.end(toBuffer(chunk, encoding));
+            } else {
+                compressor.end();
+            }
+            return this;
+        };
+        next();
+    },
+
+    // returns the encoding to compress a response to this request with, or null if it should be sent uncompressed
+    // browsers list gzip before br, and ties go to the client's order, so we ask about each encoding in our own order instead
+    negotiateEncoding : (request) => {
+        const encoding = ENCODINGS.find((candidate) => request.acceptsEncodings(candidate) === candidate);
+        return encoding === undefined ? null : encoding;
+    },
+
+    // compresses a whole body at once, for bodies we compress once and send many times (see ReadCache.service.js)
+    compressBody : (body, encoding) => {
+        return encoding === "br" ? zlib.brotliCompressSync(body, BROTLI_OPTIONS) : zlib.gzipSync(body);
+    }
+}
+
+function toBuffer(chunk, encoding) {
+    return Buffer.isBuffer(chunk) ? chunk : Buffer.from(chunk, typeof encoding === "string" ? encoding : "utf8");
+}
@@ -0,0 +1,42 @@
+const Metrics = require("../Services/Metrics.service");
+
+// define the needed functions in the module's exports
+module.exports = {
+
+    // records how long each request took and how many bytes it moved, by the route template it matched (see Metrics.service.js)
+    recordRequestMetrics : () => (request, response, next) => {
+        const start = process.hrtime.bigint();
+        const socket = request.socket;
+        // a connection carries one request at a time, so what crosses its socket while this request is open belongs to it
+        const bytesReadBefore = socket.bytesRead;
+        const bytesWrittenBefore = socket.bytesWritten;
+        response.once("close", () => {
+            const durationSeconds = Number(process.hrtime.bigint() - start) / 1e9;
+            const declaredLength = parseInt(request.get("Content-Length"));
+            // the socket may have read a small body together with the headers, before we started counting, so the declared length is better when there is one
+            const requestBytes = Number.isNaN(declaredLength) ? socket.bytesRead - bytesReadBefore : declaredLength;
+            const status = response.writableFinished ? String(response.statusCode) : "aborted"; // the client went away before we finished responding
+            Metrics.observeRequest(request.method, routeTemplate(request), status, durationSeconds, requestBytes, socket.bytesWritten - bytesWrittenBefore);
+        });
+        next();
+    }
+}
+
+// this function returns the template of the route a request matched, e.g. /cards/:id/file, or "unmatched" for requests no route handled
+// so that every id doesn't get its own series
+function routeTemplate(request) {
+    if (request.route === undefined) {
+        return "unmatched";
+    }
+    let base = request.baseUrl;
+    // express forgets the router's mount path once a route passes an error on with next(error), but it's the part of the url before the route's own segments
+    if (base === "") {
+        const urlSegments = request.originalUrl.split("?")[0].split("/").filter((segment) => segment !== "");
+        const routeSegments = request.route.path.split("/").filter((segment) => segment !== "");
+        base = urlSegments.length > routeSegments.length ? "/" + urlSegments.slice(0, urlSegments.length - routeSegments.length).join("/") : "";
+    }
+    if (request.route.path === "/" && base !== "") {
+        return base;
+    }
+    return base + request.route.path;
+}
@@ -0,0 +1,198 @@
+const busboy = require("busboy");
+const createError = require("http-errors");
+const { PassThrough } = require("stream");
+const MediaService = require("../Services/Media.service");
+const FileTypeService = require("../Services/FileType.service");
+
+const MAX_FILE_SIZE = 500000; // defines maximum file size in bytes
+const MAX_FIELD_SIZE = 1000000; // the largest text field we accept in bytes, e.g. the cards of a set created together with its cards
+const MAX_FIELDS = 16; // the most text fields a request can have. Every route needs only a couple, and each one is held in memory until the route runs
+const UPLOAD_CHUNK_SIZE = 64 * 1024; // the most of an uploaded file we hold in memory at once while it streams into the blob store
+
+// define the needed functions in the module's exports
+module.exports = {
+
+    // returns middleware that parses a multipart body as it arrives, storing each accepted file in the blob store without ever holding the whole file
+    // options.acceptsField(fieldName) says which file fields are stored (files in any other field are skipped), options.maxFiles caps how many files a request can have
+    // options.labelField(fieldName) can return a label (e.g. "Card 2") to start the error messages about that field's file with
+    // afterwards request.body holds the text fields and request.files maps each stored field to {fileId, fileType, size, hash}
+    // the files are already stored when the route runs, so a route that doesn't end up using them must remove them (see rejectUpload)
+    streamUpload : (options) => {
+        return (request, response, next) => {
+            if (!request.is("multipart/form-data")) { // e.g. a set created from a JSON body, which express.json has already parsed
+                next();
+                return;
+            }
+            let parser;
+            try {
+                parser = busboy({headers: request.headers, fileHwm: UPLOAD_CHUNK_SIZE, 
+                                 limits: {fileSize: MAX_FILE_SIZE, files: options.maxFiles, fieldSize: MAX_FIELD_SIZE, fields: MAX_FIELDS,
+                                          parts: options.maxFiles + MAX_FIELDS}});
+            } catch (error) { // the content type header has no boundary
+                next(createError(400, "Malformed multipart body"));
+                return;
+            }
+            request.body = {};
+            request.files = {};
+            let receivedFields = new Set(); // file fields we've started storing, a repeated field is skipped rather than replacing the first file
+            let pendingFiles = [];
+            let uploadError = null; // the first thing wrong with the upload. Once it's set every later file is skipped
+
+            const fail = (error) => {
+                if (uploadError === null) {
+                    uploadError = error;
+                }
+            };
+            parser.on("field", (fieldName, value, info) => {
+                if (info.valueTruncated) {
+                    fail(createError(422, `Field ${fieldName} is too large`));
+                    return;
+                }
+                request.body[fieldName] = value;
+            });
+            parser.on("file", (fieldName, fileStream) => {
+                if (uploadError !== null || !options.acceptsField(fieldName) || receivedFields.has(fieldName)) {
+                    fileStream.resume(); // busboy can't move on to the next part until this one has been read, so we read it and throw it away
+                    return;
+                }
+                receivedFields.add(fieldName);
+                const label = options.labelField === undefined ? undefined : options.labelField(fieldName);
+                pendingFiles.push(storeFile(fileStream, label).then((storedFile) => {
+                    request.files[fieldName] = storedFile;
+                }, fail));
+            });
+            parser.on("filesLimit", () => fail(createError(422, "Too many files attached")));
+            parser.on("fieldsLimit", () => fail(createError(413, "Too many fields in the request")));
+            parser.on("partsLimit", () => fail(createError(413, "Too many parts in the request")));
+            parser.on("error", (error) => {
+                console.log(error.message);
+                fail(createError(400, "Malformed multipart body"));
+                request.unpipe(parser);
+                request.resume(); // the rest of the body is useless to us, but it has to be read before we can respond
+            });
+            request.on("close", () => { // the client went away part way through, destroying the parser also ends the file being stored
+                if (!request.complete) {
+                    parser.destroy(new Error("Upload was interrupted"));
+                }
+            });
+            parser.on("close", async () => {
+                await Promise.all(pendingFiles); // failures have already been passed to fail
+                if (uploadError !== null) {
+                    await module.exports.rejectUpload(request, next, uploadError);
+                    return;
+                }
+                next();
+            });
+            request.pipe(parser);
+        };
+    },
+
+    // removes every file the upload middleware stored for this request, then passes the error on
+    rejectUpload : async (request, next, error) => {
+        try {
+            await module.exports.discardUploads(request);
+        } catch (cleanupError) { // the orphan collector will remove whatever we couldn't
+            console.log(cleanupError.message);
+        }
+        next(error);
+    },
+
+    // removes every file the upload middleware stored for this request
+    discardUploads : async (request) => {
+        if (request.files === undefined || request.files === null) {
+            return;
+        }
+        const storedFiles = Object.values(request.files);
+        request.files = {};
+        await Promise.all(storedFiles.map((storedFile) => MediaService.deleteFile(storedFile.fileId)));
+    }
+}
+
+// this function checks the type of an uploaded file, worked out from its contents
+// it returns the status code and error message to send to the client (code 200 if the file type is allowed)
+function checkFileType(fileType) {
+    let response = {code: 200, message: "OK"};
+    const fileMimetypeArray = fileType === undefined ? [] : fileType.split("/"); // separates keywords in the file's description, e.g. [image, jpeg]
+    if (fileMimetypeArray[0] !== "image" && fileMimetypeArray[0] !== "audio") {
+        response.code = 415
+        response.message = "Attached files must be image or audio files and cannot be PDFs";
+    }
+    if (fileMimetypeArray[1] === "tiff" || fileMimetypeArray[1] === "tiff-fx") {
+        response.code = 415
+        response.message = "Attached files cannot be in the following formats: tiff";
+    }
+    return response;
+}
+
+// this function streams one uploaded file into the blob store, stopping as soon as it turns out to be too large or of a type we don't accept
+// it resolves to the stored file's {fileId, fileType, size, hash}
+async function storeFile(fileStream, label) {
+    const uploadError = (code, message) => createError(code, label === undefined ? message : `${label}: ${message}`);
+    let body = null;
+    let tooLarge = false;
+    // busboy stops passing on the file's data once it reaches MAX_FILE_SIZE, we fail the upload right there instead of storing a cut off file
+    fileStream.on("limit", () => {
+        tooLarge = true;
+        if (body !== null) {
+            body.destroy(uploadError(422, "Attached file is too large"));
+        }
+    });
+    fileStream.on("error", (error) => { // only happens if the parser is destroyed, e.g. when the client disconnects
+        if (body !== null) {
+            body.destroy(error);
+        }
+    });
+
+    // the client's mimetype is only a claim, so the file's type comes from its first bytes
+    const { header, ended } = await readFileHeader(fileStream);
+    const fileType = FileTypeService.sniffFileType(header.subarray(0, FileTypeService.SNIFF_LENGTH));
+    const fileTypeResult = checkFileType(fileType);
+    if (fileTypeResult.code !== 200 || tooLarge) {
+        fileStream.resume();
+        throw tooLarge ? uploadError(422, "Attached file is too large") : uploadError(fileTypeResult.code, fileTypeResult.message);
+    }
+
+    // we never destroy busboy's stream (busboy would wait on it forever), so on failure we detach it and read what's left of it instead
+    body = new PassThrough();
+    if (ended) {
+        body.end(header);
+    } else {
+        body.write(header);
+        fileStream.pipe(body);
+    }
+    try {
+        const storedFile = await MediaService.saveFileStream(body, fileType);
+        return {fileId: storedFile.fileId, fileType: fileType, size: storedFile.size, hash: storedFile.hash};
+    } catch (error) {
+        fileStream.unpipe(body);
+        fileStream.resume();
+        throw error;
+    }
+}
+
+// this function reads the start of an uploaded file (at least SNIFF_LENGTH bytes, unless the file is shorter) and pauses the stream there
+// it resolves to the bytes read and whether that was the whole file
+function readFileHeader(fileStream) {
+    return new Promise((resolve, reject) => {
+        let chunks = [];
+        let length = 0;
+        const finish = (ended) => {
+            fileStream.off("data", onData);
+            fileStream.off("end", onEnd);
+            fileStream.off("error", reject);
+            resolve({header: Buffer.concat(chunks), ended: ended});
+        };
+        const onData = (chunk) => {
+            chunks.push(chunk);
+            length += chunk.length;
+            if (length >= FileTypeService.SNIFF_LENGTH) {
+                fileStream.pause();
+                finish(false);
+            }
+        };
+        const onEnd = () => finish(true);
+        fileStream.on("data", onData);
+        fileStream.once("end", onEnd);
+        fileStream.once("error", reject);
+    });
+}
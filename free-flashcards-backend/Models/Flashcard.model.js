@@ -15,18 +15,68 @@ const FlashcardSchema = new Schema({
         required: true, 
         enum: ['drawn', 'text', 'recorded'] // we currently only support 3 response types
     }, 
+    setId: { // the set this card is in. The set's cards array is still what makes the card part of it, this lets us go from a card to its set
+        type: Schema.Types.ObjectId
+    },
+    position: { // where the card sits in its set's order, cards added later have higher positions (see StudySet.model.js's nextCardPosition)
+        type: Number
+    },
     file: { // note that a file is not required - cards are permitted to only have a text prompt & response
+        fileId: { // the id of the file's contents in the media blob store (see Media.service.js)
+            type: Schema.Types.ObjectId
+        },
         fileType: { // we need to know how to construct the file data based on its format
             type: String
         }, 
-        data: { // the actual data contents of the file 
-            type: Buffer
+        data: { // files attached before the blob store existed keep their contents here until Scripts/migrateEmbeddedFiles.js moves them out. New files never use this
+            type: Buffer,
+            select: false
+        },
+        size: { // the length of the file's data in bytes
+            type: Number
+        },
+        hash: { // sha256 hex digest of the file's data, used as the file's ETag
+            type: String
         },
         partOfPrompt: { // indicates whether this file should be displayed as part of a card's prompt or response
             type: Boolean
-        } 
+        },
+        // everything below is filled in by the media optimizer after the file is attached (see MediaOptimizer.service.js)
+        width: { // an image's dimensions in pixels
+            type: Number
+        },
+        height: {
+            type: Number
+        },
+        duration: { // an audio file's length in seconds
+            type: Number
+        },
+        optimized: { // a smaller, lossless copy of the file in the blob store, served in place of the original when it exists
+            fileId: Schema.Types.ObjectId,
+            fileType: String,
+            size: Number,
+            hash: String
+        },
+        thumbnail: { // a downscaled copy of an image in the blob store
+            fileId: Schema.Types.ObjectId,
+            fileType: String,
+            size: Number,
+            hash: String,
+            width: Number,
+            height: Number
+        },
+        optimizedAt: { // when the optimizer finished with this file, unset until then
+            type: Date
+        }
     }
 });
+// lets us find the card (if any) that references a stored file, sparse since most cards don't have a file
+FlashcardSchema.index({"file.fileId": 1}, {sparse: true});
+FlashcardSchema.index({"file.optimized.fileId": 1}, {sparse: true});
+FlashcardSchema.index({"file.thumbnail.fileId": 1}, {sparse: true});
+
+// lets us read a set's cards in order, or count them, without going through the set's cards array
+FlashcardSchema.index({setId: 1, position: 1});
 
 const Flashcard = mongoose.model('flashcard', FlashcardSchema);
 module.exports = Flashcard;
\ No newline at end of file
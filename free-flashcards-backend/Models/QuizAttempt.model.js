@@ -0,0 +1,26 @@
+const mongoose = require("mongoose");
+const Schema = mongoose.Schema;
+
+// every quiz a user submits is stored here instead of on the study set, so sets stay the same size no matter how often they're quizzed
+const QuizAttemptSchema = new Schema({
+    setId: { // the study set that was quizzed
+        type: Schema.Types.ObjectId,
+        required: true
+    },
+    score: { // the fraction of the quiz's questions that were answered correctly
+        type: Number,
+        required: true,
+        min: 0,
+        max: 1
+    },
+    takenAt: { // when the quiz was submitted
+        type: Date,
+        required: true,
+        default: Date.now
+    }
+});
+// lets us read a set's history newest first and remove it along with the set without scanning every attempt
+QuizAttemptSchema.index({setId: 1, takenAt: -1});
+
+const QuizAttempt = mongoose.model('quizattempt', QuizAttemptSchema);
+module.exports = QuizAttempt;
@@ -10,12 +10,43 @@ const StudySetSchema = new Schema({
         type: [Schema.Types.ObjectId],
         required: true
     },
-    quizScores: {
+    nextCardPosition: { // the position the next card added to this set gets. Sets made before cards had positions don't have this until Scripts/migrateCardSetReferences.js gives them one
+        type: Number,
+        select: false
+    },
+    quizScores: { // sets quizzed before attempts had their own collection keep their scores here until Scripts/migrateQuizScores.js moves them out
         type: [Number],
-        required: true
+        select: false
+    },
+    quizStats: { // running aggregates over every attempt in the quizattempts collection, updated with each new attempt (see QuizStats.service.js)
+        attemptCount: {
+            type: Number,
+            default: 0
+        },
+        totalScore: { // kept so the mean can be updated without reading the attempts back
+            type: Number,
+            default: 0
+        },
+        meanScore: {
+            type: Number,
+            default: null
+        },
+        bestScore: {
+            type: Number,
+            default: null
+        },
+        recentScores: { // the most recent scores, oldest first
+            type: [Number]
+        },
+        movingAverage: { // exponential moving average of the scores, so recent attempts count for more than old ones
+            type: Number,
+            default: null
+        }
     }
 });
 
+// lets us find the set (if any) that references a card without scanning every set, used by the orphan collector
+StudySetSchema.index({cards: 1});
 
 const StudySet = mongoose.model('studyset', StudySetSchema);
 module.exports = StudySet;
\ No newline at end of file
@@ -0,0 +1,402 @@
+const mongoose = require("mongoose");
+const { Readable, Writable } = require("stream");
+const StudySet = require("../Models/StudySet.model");
+const Flashcard = require("../Models/Flashcard.model");
+const QuizStatsService = require("../Services/QuizStats.service");
+
+// Keeps study sets, flashcards, quiz attempts and files in this process's memory, used when the server is launched with "node app.js memory"
+// Nothing is saved once the process stops. This lets the tests and benchmarks run without a db, and lets the API's own logic be profiled
+// without the driver's overhead. See Repository.js for what each function does, they all behave like the Mongo repository's:
+// documents are stored and returned the way lean queries return them, malformed ids throw a mongoose.CastError and missing documents resolve to null
+// Every document is copied on its way in and out, so callers can't change what's stored by changing what they were given
+
+const SET_CARDS_PROJECTION = {title: 1, cards: 1}; // what we send back after changing a set's cards, quiz history isn't needed
+// fields that are select: false in the schemas, which the db leaves out unless they're asked for
+const HIDDEN_SET_PATHS = ["nextCardPosition", "quizScores"];
+const HIDDEN_CARD_PATHS = ["file.data"];
+const castObjectId = mongoose.Schema.Types.ObjectId.cast();
+
+let studySets = new Map(); // set id -> set
+let sortedSetIds = []; // the ids of every set in _id order, which is the order GET /sets pages through them in
+let flashcards = new Map(); // card id -> card
+let quizAttempts = new Map(); // set id -> the set's quiz attempts, oldest first
+let storedFiles = new Map(); // file id -> {_id, length, uploadDate, fileType, data}
+
+// define the needed functions in the module's exports
+module.exports = {
+
+    isReady : () => true,
+
+    listSets : async (after, limit, projection) => {
+        let start = 0;
+        if (after !== undefined) {
+            const afterKey = toObjectId(after).toHexString();
+            start = findSortedIndex(afterKey);
+            if (sortedSetIds[start] === afterKey) {
+                start++; // the page starts after the cursor, not on it
+            }
+        }
+        return sortedSetIds.slice(start, start + limit).map((setId) => project(studySets.get(setId), projection, HIDDEN_SET_PATHS));
+    },
+
+    countSets : async () => {
+        return studySets.size;
+    },
+
+    findSetById : async (setId, projection = {}) => {
+        const set = studySets.get(toObjectId(setId).toHexString());
+        return set === undefined ? null : project(set, projection, HIDDEN_SET_PATHS);
+    },
+
+    setExists : async (setId) => {
+        return studySets.has(toObjectId(setId).toHexString());
+    },
+
+    insertSet : async (set) => {
+        return project(storeSet(set), {}, HIDDEN_SET_PATHS);
+    },
+
+    insertSetWithCards : async (set, cards) => {
+        // every card was validated before this was called and nothing here can fail part way, so there's nothing to roll back
+        cards.forEach(storeCard);
+        return project(storeSet(set), {}, HIDDEN_SET_PATHS);
+    },
+
+    deleteSetWithCards : async (setId) => {
+        const key = toObjectId(setId).toHexString();
+        const set = studySets.get(key);
+        if (set === undefined) {
+            return null;
+        }
+        const deletedSet = project(set, {}, HIDDEN_SET_PATHS);
+        studySets.delete(key);
+        sortedSetIds.splice(findSortedIndex(key), 1);
+        quizAttempts.delete(key);
+        let deletedCards = [];
+        for (const cardId of set.cards) {
+            const card = flashcards.get(cardId.toHexString());
+            if (card !== undefined) {
+                flashcards.delete(cardId.toHexString());
+                deletedCards.push(project(card, {}, HIDDEN_CARD_PATHS));
+            }
+        }
+        return {set: deletedSet, cards: deletedCards};
+    },
+
+    updateSetTitle : async (setId, title) => {
+        const set = studySets.get(toObjectId(setId).toHexString());
+        if (set === undefined) {
+            return null;
+        }
+        set.title = castUpdate(StudySet, set, {title: title}, false).title;
+        set.__v++;
+        return project(set, {}, HIDDEN_SET_PATHS);
+    },
+
+    addCardToSet : async (setId, card) => {
+        const set = studySets.get(toObjectId(setId).toHexString());
+        if (set === undefined) {
+            return null;
+        }
+        if (set.nextCardPosition !== undefined) { // sets are only missing this when they're imported from before cards had positions
+            card.position = set.nextCardPosition++;
+        }
+        set.cards.push(card._id);
+        set.__v++;
+        storeCard(card);
+        return project(set, SET_CARDS_PROJECTION, HIDDEN_SET_PATHS);
+    },
+
+    removeCardFromSet : async (setId, cardId) => {
+        const set = studySets.get(toObjectId(setId).toHexString());
+        const removedId = toObjectId(cardId);
+        const index = set === undefined ? -1 : set.cards.findIndex((candidate) => candidate.equals(removedId));
+        if (index === -1) { // either the set doesn't exist or the card isn't in it
+            return null;
+        }
+        set.cards.splice(index, 1);
+        set.__v++;
+        return project(set, SET_CARDS_PROJECTION, HIDDEN_SET_PATHS);
+    },
+
+    findCardsInSet : async function* (set, projection) {
+        // the set's cards array is always in position order here, since no set in memory predates positions
+        for (const cardId of set.cards) {
+            const card = flashcards.get(cardId.toHexString());
+            if (card !== undefined) {
+                yield project(card, projection, HIDDEN_CARD_PATHS);
+            }
+        }
+    },
+
+    recordQuizAttempt : async (setId, score) => {
+        const key = toObjectId(setId).toHexString();
+        const set = studySets.get(key);
+        if (set === undefined) {
+            return null;
+        }
+        set.quizStats = QuizStatsService.addScore(set.quizStats, score);
+        set.__v++;
+        if (!quizAttempts.has(key)) {
+            quizAttempts.set(key, []);
+        }
+        quizAttempts.get(key).push({_id: new mongoose.Types.ObjectId(), setId: set._id, score: score, takenAt: new Date()});
+        return project(set, {title: 1, quizStats: 1}, HIDDEN_SET_PATHS);
+    },
+
+    findCardById : async (cardId) => {
+        const card = flashcards.get(toObjectId(cardId).toHexString());
+        return card === undefined ? null : project(card, {}, HIDDEN_CARD_PATHS);
+    },
+
+    findCardFile : async (cardId) => {
+        const card = flashcards.get(toObjectId(cardId).toHexString());
+        return card === undefined ? null : project(card, {file: 1, "file.data": 1}, HIDDEN_CARD_PATHS);
+    },
+
+    updateCard : async (cardId, fields) => {
+        const card = flashcards.get(toObjectId(cardId).toHexString());
+        if (card === undefined) {
+            return null;
+        }
+        const { _id, ...updatedFields } = fields; // a document's id can't be changed
+        Object.assign(card, castUpdate(Flashcard, card, updatedFields, true));
+        card.__v++;
+        return project(card, {}, HIDDEN_CARD_PATHS);
+    },
+
+    deleteCard : async (cardId) => {
+        const key = toObjectId(cardId).toHexString();
+        const card = flashcards.get(key);
+        if (card === undefined) {
+            return null;
+        }
+        flashcards.delete(key);
+        return project(card, {}, HIDDEN_CARD_PATHS);
+    },
+
+    setCardFile : async (cardId, file) => {
+        const card = flashcards.get(toObjectId(cardId).toHexString());
+        if (card === undefined) {
+            return null;
+        }
+        const previous = project(card, {file: 1}, HIDDEN_CARD_PATHS);
+        card.file = castUpdate(Flashcard, card, {file: file}, false).file;
+        card.__v++;
+        return previous;
+    },
+
+    removeCardFile : async (cardId) => {
+        const card = flashcards.get(toObjectId(cardId).toHexString());
+        if (card === undefined) {
+            return null;
+        }
+        const previous = project(card, {}, HIDDEN_CARD_PATHS);
+        delete card.file;
+        card.__v++;
+        return previous;
+    },
+
+    setOptimizedFile : async (cardId, fileId, fields) => {
+        const card = flashcards.get(toObjectId(cardId).toHexString());
+        // this only applies if the card still has the file that was optimized, so copies of a file that's been replaced are never attached
+        if (card === undefined || card.file?.fileId === undefined || !card.file.fileId.equals(fileId) || card.file.optimizedAt !== undefined) {
+            return false;
+        }
+        for (const [path, value] of Object.entries(fields)) {
+            setPath(card, path, copyValue(value));
+        }
+        card.__v++;
+        return true;
+    },
+
+    openUploadStream : (fileType) => {
+        const fileId = new mongoose.Types.ObjectId();
+        let chunks = [];
+        const uploadStream = new Writable({
+            write(chunk, encoding, callback) {
+                chunks.push(chunk);
+                callback();
+            },
+            final(callback) { // the file only becomes visible once all of it has arrived, like a GridFS file
+                const data = Buffer.concat(chunks);
+                chunks = [];
+                storedFiles.set(fileId.toHexString(), {_id: fileId, length: data.length, uploadDate: new Date(), fileType: fileType, data: data});
+                callback();
+            }
+        });
+        uploadStream.id = fileId;
+        uploadStream.abort = async () => {
+            chunks = [];
+            storedFiles.delete(fileId.toHexString());
+        };
+        return uploadStream;
+    },
+
+    openFileStream : (fileId, start, end) => {
+        const storedFile = storedFiles.get(toObjectId(fileId).toHexString());
+        if (storedFile === undefined) { // errors the same way a GridFS download of a missing file does (see Media.service.js's isFileNotFound)
+            return new Readable({
+                read() {
+                    const error = new Error(`FileNotFound: file ${fileId} was not found`);
+                    error.code = "ENOENT";
+                    this.destroy(error);
+                }
+            });
+        }
+        const data = start === undefined ? storedFile.data : storedFile.data.subarray(start, end + 1);
+        return Readable.from([data], {objectMode: false});
+    },
+
+    deleteFile : async (fileId) => {
+        storedFiles.delete(toObjectId(fileId).toHexString());
+    },
+
+    listStoredFiles : async (afterId, limit, uploadedBefore) => {
+        const afterKey = afterId === null ? null : toObjectId(afterId).toHexString();
+        return [...storedFiles.keys()].sort()
+                                      .filter((fileId) => (afterKey === null || fileId > afterKey) && storedFiles.get(fileId).uploadDate < uploadedBefore)
+                                      .slice(0, limit)
+                                      .map((fileId) => ({_id: storedFiles.get(fileId)._id, length: storedFiles.get(fileId).length}));
+    }
+}
+
+// this function casts an id the way a query would, throwing the same CastError the db would give the controllers for a malformed one
+function toObjectId(value) {
+    try {
+        return castObjectId(value);
+    } catch (error) {
+        throw new mongoose.Error.CastError("ObjectId", value, "_id", error);
+    }
+}
+
+// this function returns the index in sortedSetIds where the set id is or would be inserted
+function findSortedIndex(setId) {
+    let low = 0;
+    let high = sortedSetIds.length;
+    while (low < high) {
+        const middle = (low + high) >> 1;
+        if (sortedSetIds[middle] < setId) { // hex strings of the same length sort the same way as the objectids they encode
+            low = middle + 1;
+        } else {
+            high = middle;
+        }
+    }
+    return low;
+}
+
+// these functions store a new (already validated) set or card document at version 0, the way save() and insertMany() do, and return what was stored
+function storeSet(set) {
+    const key = set._id.toHexString();
+    const stored = {...copyValue(set.toObject()), __v: 0};
+    studySets.set(key, stored);
+    sortedSetIds.splice(findSortedIndex(key), 0, key);
+    return stored;
+}
+
+function storeCard(card) {
+    const stored = {...copyValue(card.toObject()), __v: 0};
+    flashcards.set(card._id.toHexString(), stored);
+    return stored;
+}
+
+// this function casts the fields of an update to a stored document against its model's schema, returning them as they would be stored
+// a value that can't be cast throws a CastError like a db update does, and with runValidators a value the schema doesn't allow throws its ValidationError
+function castUpdate(Model, stored, fields, runValidators) {
+    const document = Model.hydrate(copyValue(stored));
+    document.set(fields);
+    const updatedPaths = Object.keys(fields).filter((path) => Model.schema.path(path) !== undefined || Model.schema.pathType(path) === "nested");
+    const validationError = document.validateSync(updatedPaths);
+    if (validationError !== undefined) {
+        const castError = Object.values(validationError.errors).find((error) => error instanceof mongoose.Error.CastError);
+        if (castError !== undefined) {
+            throw castError;
+        }
+        if (runValidators) {
+            throw validationError;
+        }
+    }
+    const updated = document.toObject();
+    let cast = {};
+    for (const path of updatedPaths) {
+        cast[path] = copyValue(updated[path]);
+    }
+    return cast;
+}
+
+// this function returns a copy of a stored document with only the fields in projection, like a lean query with that projection
+// an empty projection returns every field except the hidden ones, which are only returned when a projection asks for them
+function project(document, projection, hiddenPaths) {
+    const paths = Object.keys(projection);
+    if (paths.length === 0) {
+        let projected = copyValue(document);
+        for (const path of hiddenPaths) {
+            unsetPath(projected, path);
+        }
+        return projected;
+    }
+    let projected = {_id: document._id}; // the db always includes the id
+    for (const path of paths) {
+        const value = getPath(document, path);
+        if (value !== undefined) {
+            setPath(projected, path, copyValue(value));
+        }
+    }
+    // asking for a whole object (e.g. "file") doesn't include its hidden fields unless they're asked for too
+    for (const path of hiddenPaths) {
+        if (!paths.includes(path) && paths.some((requested) => path.startsWith(`${requested}.`))) {
+            unsetPath(projected, path);
+        }
+    }
+    return projected;
+}
+
+// this function deep copies plain objects and arrays, objectids and buffers are never changed in place so they're shared
+function copyValue(value) {
+    if (Array.isArray(value)) {
+        return value.map(copyValue);
+    }
+    if (value instanceof Date) {
+        return new Date(value.getTime());
+    }
+    if (value !== null && typeof value === "object" && Object.getPrototypeOf(value) === Object.prototype) {
+        let copy = {};
+        for (const [key, field] of Object.entries(value)) {
+            copy[key] = copyValue(field);
+        }
+        return copy;
+    }
+    return value;
+}
+
+// these functions read, write and remove a dotted path (e.g. "file.optimized.fileId") of a plain object
+function getPath(object, path) {
+    let value = object;
+    for (const part of path.split(".")) {
+        if (value === null || typeof value !== "object") {
+            return undefined;
+        }
+        value = value[part];
+    }
+    return value;
+}
+
+function setPath(object, path, value) {
+    const parts = path.split(".");
+    let parent = object;
+    for (const part of parts.slice(0, -1)) {
+        if (parent[part] === null || typeof parent[part] !== "object") {
+            parent[part] = {};
+        }
+        parent = parent[part];
+    }
+    parent[parts[parts.length - 1]] = value;
+}
+
+function unsetPath(object, path) {
+    const parts = path.split(".");
+    const parent = parts.length === 1 ? object : getPath(object, parts.slice(0, -1).join("."));
+    if (parent !== null && typeof parent === "object") {
+        delete parent[parts[parts.length - 1]];
+    }
+}
@@ -0,0 +1,283 @@
+const mongoose = require("mongoose");
+const StudySet = require("../Models/StudySet.model");
+const Flashcard = require("../Models/Flashcard.model");
+const QuizAttempt = require("../Models/QuizAttempt.model");
+const TransactionService = require("../Services/Transaction.service");
+const QuizStatsService = require("../Services/QuizStats.service");
+
+// Stores study sets, flashcards and quiz attempts in MongoDB through their mongoose models, and files in GridFS
+// This is the backend the server uses unless it's launched in memory mode, see Repository.js for what each function does
+
+const BUCKET_NAME = "media"; // files are stored in the media.files and media.chunks collections
+const SET_CARDS_PROJECTION = {title: 1, cards: 1}; // what we send back after changing a set's cards, quiz history isn't needed
+// when adding a card we also need to know which position it was given, which is never sent to clients
+const SET_POSITION_PROJECTION = {...SET_CARDS_PROJECTION, nextCardPosition: 1};
+// every update bumps the document's version, which is part of its ETag (see ReadCache.service.js). Only save() does this on its own
+const BUMP_VERSION = {__v: 1};
+// we need a card's file references when it's deleted so its files (and the optimizer's copies of them) can be removed too
+const CARD_FILE_PROJECTION = {"file.fileId": 1, "file.optimized.fileId": 1, "file.thumbnail.fileId": 1};
+
+let bucket = null; // created the first time it's needed since the db connection may not be open when this module is loaded
+
+// returns the GridFS bucket flashcard files are stored in
+function getBucket() {
+    if (bucket === null) {
+        bucket = new mongoose.mongo.GridFSBucket(mongoose.connection.db, {bucketName: BUCKET_NAME});
+    }
+    return bucket;
+}
+
+// this function adds a card to the end of a set whose cards have positions, giving the card the set's next position
+// $push adds the id in a single atomic update, so concurrent adds to the same set can't overwrite each other, and the same update takes the
+// set's next position for the card, so positions are handed out in the same order the cards are added
+// resolves to the set's title and cards, or null if the set doesn't exist or its cards haven't been given positions yet
+async function pushPositionedCard(setId, card) {
+    const result = await StudySet.findOneAndUpdate({_id: setId, nextCardPosition: {$exists: true}},
+                                                   {$push: {cards: card._id}, $inc: {...BUMP_VERSION, nextCardPosition: 1}},
+                                                   {new: true, projection: SET_POSITION_PROJECTION}).lean();
+    if (result === null) {
+        return null;
+    }
+    card.position = result.nextCardPosition - 1;
+    return {_id: result._id, title: result.title, cards: result.cards};
+}
+
+// this function takes a card back out of a set, after the set listed a card that couldn't be stored
+async function pullCard(setId, cardId) {
+    await StudySet.updateOne({_id: setId}, {$pull: {cards: cardId}, $inc: BUMP_VERSION}).catch((pullError) => console.log(pullError.message));
+}
+
+// define the needed functions in the module's exports
+module.exports = {
+
+    isReady : () => mongoose.connection.readyState === mongoose.ConnectionStates.connected,
+
+    listSets : async (after, limit, projection) => {
+        const filter = after === undefined ? {} : {_id: {$gt: after}};
+        return StudySet.find(filter, projection).sort({_id: 1}).limit(limit).lean();
+    },
+
+    countSets : async () => {
+        return StudySet.estimatedDocumentCount(); // read from collection metadata, so this doesn't get slower as sets are added
+    },
+
+    findSetById : async (setId, projection = {}) => {
+        return StudySet.findById(setId, projection).lean();
+    },
+
+    setExists : async (setId) => {
+        return await StudySet.exists({_id: setId}) !== null;
+    },
+
+    insertSet : async (set) => {
+        return (await set.save()).toObject();
+    },
+
+    insertSetWithCards : async (set, cards) => {
+        try {
+            await TransactionService.runInTransaction(async (session) => {
+                await Flashcard.insertMany(cards, {session: session});
+                await set.save({session: session});
+            });
+        } catch (error) {
+            // on a replica set the transaction already rolled back, but a standalone server keeps whatever was written, so we remove it ourselves
+            await Promise.all([
+                Flashcard.deleteMany({_id: {$in: set.cards}}),
+                StudySet.deleteOne({_id: set._id})
+            ]).catch((cleanupError) => console.log(cleanupError.message));
+            throw error;
+        }
+        return set.toObject();
+    },
+
+    deleteSetWithCards : async (setId) => {
+        // the set and all of its cards are removed together so we never leave cards in the DB with no references to them
+        return TransactionService.runInTransaction(async (session) => {
+            const deletedSet = await StudySet.findByIdAndDelete(setId, {session: session}).lean();
+            if (deletedSet === null) {
+                return null;
+            }
+            const deletedCards = await Flashcard.find({_id: {$in: deletedSet.cards}}, CARD_FILE_PROJECTION, {session: session}).lean();
+            await Flashcard.deleteMany({_id: {$in: deletedSet.cards}}, {session: session});
+            await QuizAttempt.deleteMany({setId: deletedSet._id}, {session: session});
+            return {set: deletedSet, cards: deletedCards};
+        });
+    },
+
+    updateSetTitle : async (setId, title) => {
+        return StudySet.findByIdAndUpdate(setId, {title: title, $inc: BUMP_VERSION}, {new: true}).lean();
+    },
+
+    addCardToSet : async (setId, card) => {
+        let result = await pushPositionedCard(setId, card);
+        if (result !== null) {
+            try {
+                await card.save();
+            } catch (error) { // the set lists a card that was never created, so we take it back out
+                await pullCard(setId, card._id);
+                throw error;
+            }
+            return result;
+        }
+
+        // the set doesn't exist, or its cards haven't been given positions yet (see Scripts/migrateCardSetReferences.js)
+        // for a set that's waiting to be migrated the card is stored before the set lists it, so whichever way this interleaves with the
+        // migration the card gets a position: either the migration reads the set after our push and positions the card with the rest, or our
+        // push changes the set's version and the migration redoes the set. We never make up a position from the set's cards ourselves
+        if (!await module.exports.setExists(setId)) { // we haven't created anything yet
+            return null;
+        }
+        await card.save();
+        try {
+            result = await StudySet.findOneAndUpdate({_id: setId, nextCardPosition: {$exists: false}}, {$push: {cards: card._id}, $inc: BUMP_VERSION},
+                                                     {new: true, projection: SET_CARDS_PROJECTION}).lean();
+            if (result === null) { // the set was migrated (or deleted) since we looked, so the card takes the next position after all
+                // the position is taken and given to the card before the set lists it, so the card is never read without one
+                const reserved = await StudySet.findOneAndUpdate({_id: setId, nextCardPosition: {$exists: true}}, {$inc: {nextCardPosition: 1}},
+                                                                 {new: true, projection: {nextCardPosition: 1}}).lean();
+                if (reserved !== null) {
+                    await Flashcard.updateOne({_id: card._id}, {$set: {position: reserved.nextCardPosition - 1}, $inc: BUMP_VERSION});
+                    result = await StudySet.findOneAndUpdate({_id: setId}, {$push: {cards: card._id}, $inc: BUMP_VERSION},
+                                                             {new: true, projection: SET_CARDS_PROJECTION}).lean();
+                }
+            }
+        } catch (error) {
+            await pullCard(setId, card._id);
+            await Flashcard.deleteOne({_id: card._id}).catch((deleteError) => console.log(deleteError.message));
+            throw error;
+        }
+        if (result === null) { // the set was deleted while we were adding to it
+            await Flashcard.deleteOne({_id: card._id});
+        }
+        return result;
+    },
+
+    removeCardFromSet : async (setId, cardId) => {
+        // the update only matches if the set contains the card, and $pull removes it without rewriting the rest of the set
+        return StudySet.findOneAndUpdate({_id: setId, cards: cardId}, {$pull: {cards: cardId}, $inc: BUMP_VERSION},
+                                         {new: true, projection: SET_CARDS_PROJECTION}).lean();
+    },
+
+    findCardsInSet : async function* (set, projection) {
+        if (set.nextCardPosition !== undefined) {
+            // the {setId, position} index hands us the set's cards already in order, so each one is passed on as soon as it arrives
+            // a card only counts if the set still lists it, since one whose removal from the set failed part way keeps its setId
+            const cardIds = new Set(set.cards.map((cardId) => cardId.toString()));
+            for await (const card of Flashcard.find({setId: set._id}, projection).sort({position: 1}).lean().cursor()) {
+                if (cardIds.has(card._id.toString())) {
+                    yield card;
+                }
+            }
+            return;
+        }
+
+        // sets that Scripts/migrateCardSetReferences.js hasn't given positions yet are resolved through their cards array instead
+        // one $in query resolves the whole set instead of one findById per card
+        const orderedIds = set.cards.map((cardId) => cardId.toString());
+        const arrivedCards = new Map(); // cards the cursor returned before their turn in the set's order
+        let nextIndex = 0; // position in orderedIds of the next card we need to pass on
+        for await (const card of Flashcard.find({_id: {$in: set.cards}}, projection).lean().cursor()) {
+            arrivedCards.set(card._id.toString(), card);
+            // $in gives no ordering guarantee, so we only pass a card on once every card before it has been
+            while (nextIndex < orderedIds.length && arrivedCards.has(orderedIds[nextIndex])) {
+                yield arrivedCards.get(orderedIds[nextIndex]);
+                arrivedCards.delete(orderedIds[nextIndex]);
+                nextIndex++;
+            }
+        }
+        // anything left over is waiting behind an id that no longer maps to a card, so we skip the missing ids
+        for (; nextIndex < orderedIds.length; nextIndex++) {
+            if (arrivedCards.has(orderedIds[nextIndex])) {
+                yield arrivedCards.get(orderedIds[nextIndex]);
+            }
+        }
+    },
+
+    recordQuizAttempt : async (setId, score) => {
+        return TransactionService.runInTransaction(async (session) => {
+            // without a replica set there's no transaction, so the attempt is stored first: the aggregates can't be taken back out (the best
+            // and recent scores and the moving average lose what they were), but an attempt can be, so a failure never leaves stats counting
+            // an attempt that doesn't exist
+            if (await StudySet.exists({_id: setId}).session(session) === null) { // this also throws the CastError for a malformed id before we write anything
+                return null;
+            }
+            const [attempt] = await QuizAttempt.create([{setId: setId, score: score}], {session: session});
+            let set;
+            try {
+                // the aggregates are computed by the server from the stored values, so concurrent attempts can't overwrite each other's updates
+                set = await StudySet.findOneAndUpdate({_id: setId}, QuizStatsService.buildStatsUpdate(score),
+                                                      {new: true, projection: {title: 1, quizStats: 1}, session: session}).lean();
+            } catch (error) {
+                await QuizAttempt.deleteOne({_id: attempt._id}, {session: session}).catch((deleteError) => console.log(deleteError.message));
+                throw error;
+            }
+            if (set === null) { // the set was deleted since we checked, so the attempt we stored belongs to nothing
+                await QuizAttempt.deleteOne({_id: attempt._id}, {session: session});
+                return null;
+            }
+            return set;
+        });
+    },
+
+    findCardById : async (cardId) => {
+        return Flashcard.findById(cardId).lean();
+    },
+
+    findCardFile : async (cardId) => {
+        // file.data only exists on cards whose file hasn't been moved to the blob store yet, so selecting it costs nothing for every other card
+        const card = await Flashcard.findById(cardId, {file: 1}).select("+file.data").lean();
+        if (card !== null && card.file !== undefined && card.file.data !== undefined) {
+            card.file.data = Buffer.from(card.file.data.buffer); // lean queries return the driver's Binary, callers work with Buffers
+        }
+        return card;
+    },
+
+    updateCard : async (cardId, fields) => {
+        // we also run our schema validation against the attempted update
+        return Flashcard.findByIdAndUpdate(cardId, {...fields, $inc: BUMP_VERSION}, {new: true, runValidators: true}).lean();
+    },
+
+    deleteCard : async (cardId) => {
+        return Flashcard.findByIdAndDelete(cardId).lean();
+    },
+
+    setCardFile : async (cardId, file) => {
+        return Flashcard.findByIdAndUpdate(cardId, {file: file, $inc: BUMP_VERSION}, {new: false, projection: {file: 1}}).lean();
+    },
+
+    removeCardFile : async (cardId) => {
+        // unsetting the file in one update returns the card as it was before, so we still know what was removed without loading the file's data
+        return Flashcard.findByIdAndUpdate(cardId, {$unset: {file: 1}, $inc: BUMP_VERSION}, {new: false}).lean();
+    },
+
+    setOptimizedFile : async (cardId, fileId, fields) => {
+        // the filter only matches if the card still has the file we optimized, so we never attach copies of a file that's been replaced
+        const outcome = await Flashcard.updateOne({_id: cardId, "file.fileId": fileId, "file.optimizedAt": {$exists: false}}, {$set: fields, $inc: BUMP_VERSION});
+        return outcome.matchedCount === 1;
+    },
+
+    openUploadStream : (fileType) => {
+        return getBucket().openUploadStream("flashcard-file", {metadata: {fileType: fileType}});
+    },
+
+    openFileStream : (fileId, start, end) => {
+        let options = {};
+        if (start !== undefined) {
+            options.start = start;
+            options.end = end + 1; // GridFS treats the end of a range as exclusive
+        }
+        return getBucket().openDownloadStream(fileId, options);
+    },
+
+    deleteFile : async (fileId) => {
+        await getBucket().delete(fileId);
+    },
+
+    listStoredFiles : async (afterId, limit, uploadedBefore) => {
+        let filter = {uploadDate: {$lt: uploadedBefore}};
+        if (afterId !== null) {
+            filter._id = {$gt: afterId};
+        }
+        return getBucket().find(filter, {sort: {_id: 1}, limit: limit, projection: {_id: 1, length: 1}}).toArray();
+    }
+}
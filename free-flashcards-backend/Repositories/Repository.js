@@ -0,0 +1,101 @@
+// Every read and write of study sets, flashcards, quiz attempts and stored files goes through this module, which passes it on to one of two backends:
+//   Mongo.repository.js stores everything in MongoDB (and files in GridFS). This is the default
+//   Memory.repository.js keeps everything in this process's memory, for running the tests and benchmarks without a db ("node app.js memory")
+// initDB.js picks the backend once at startup, before any request is handled
+//
+// Both backends behave the same way as far as their callers can tell:
+//   - documents to insert are passed in as unsaved model documents, so mongoose validates them (and gives them their ids) the same way for both
+//   - documents are returned as plain objects shaped like the results of lean queries, without the schemas' select: false fields unless asked for
+//   - a malformed id throws a mongoose.CastError, and a document that doesn't exist resolves to null (or false)
+//   - every change to a set or card bumps its version (__v), which is part of its ETag (see ReadCache.service.js)
+
+const BACKENDS = {mongo: "./Mongo.repository", memory: "./Memory.repository"};
+
+let backendName = "mongo";
+let backend = require(BACKENDS[backendName]);
+
+// define the needed functions in the module's exports
+module.exports = {
+
+    // switches every caller over to the named backend ("mongo" or "memory")
+    useBackend : (name) => {
+        if (BACKENDS[name] === undefined) {
+            throw new Error(`Unknown repository backend: ${name}`);
+        }
+        backendName = name;
+        backend = require(BACKENDS[name]);
+    },
+
+    getBackendName : () => backendName,
+
+    // whether the backend can take requests, which for the db means the connection is open
+    isReady : () => backend.isReady(),
+
+    // resolves to up to limit sets in _id order, starting after the set with the id after (if it's given). projection picks their fields
+    listSets : (after, limit, projection) => backend.listSets(after, limit, projection),
+
+    // resolves to how many sets there are, which for the db may be an estimate
+    countSets : () => backend.countSets(),
+
+    findSetById : (setId, projection) => backend.findSetById(setId, projection),
+
+    setExists : (setId) => backend.setExists(setId),
+
+    // stores a new StudySet document, resolving to the stored set
+    insertSet : (set) => backend.insertSet(set),
+
+    // stores a new StudySet document together with its new Flashcard documents, resolving to the stored set. If it fails, nothing is left stored
+    insertSetWithCards : (set, cards) => backend.insertSetWithCards(set, cards),
+
+    // removes a set with its cards and quiz attempts, resolving to {set, cards} with the cards' file references so their files can be removed too
+    deleteSetWithCards : (setId) => backend.deleteSetWithCards(setId),
+
+    updateSetTitle : (setId, title) => backend.updateSetTitle(setId, title),
+
+    // stores a new Flashcard document at the end of a set, giving it the set's next position. Resolves to the set's title and cards
+    // resolves to null without storing the card if the set doesn't exist, and rejects without leaving the card in the set if it can't be stored
+    addCardToSet : (setId, card) => backend.addCardToSet(setId, card),
+
+    // takes a card out of a set without deleting it, resolving to the set's title and cards or null if the set doesn't exist or doesn't contain the card
+    removeCardFromSet : (setId, cardId) => backend.removeCardFromSet(setId, cardId),
+
+    // async iterates over the cards in a set, in the set's order. set needs its _id, cards and nextCardPosition fields, projection picks the cards' fields
+    findCardsInSet : (set, projection) => backend.findCardsInSet(set, projection),
+
+    // stores a quiz attempt and adds its score to the set's quizStats, resolving to the set's _id, title and updated quizStats
+    // resolves to null without storing anything if the set doesn't exist
+    recordQuizAttempt : (setId, score) => backend.recordQuizAttempt(setId, score),
+
+    findCardById : (cardId) => backend.findCardById(cardId),
+
+    // resolves to a card's _id and file, including the contents of files that were embedded in the card before the blob store existed
+    findCardFile : (cardId) => backend.findCardFile(cardId),
+
+    // changes the given fields of a card, resolving to the updated card. A field the schema doesn't allow throws its ValidationError
+    updateCard : (cardId, fields) => backend.updateCard(cardId, fields),
+
+    // resolves to the deleted card
+    deleteCard : (cardId) => backend.deleteCard(cardId),
+
+    // replaces a card's file field, resolving to the card's _id and file as they were before
+    setCardFile : (cardId, file) => backend.setCardFile(cardId, file),
+
+    // removes a card's file field, resolving to the card as it was before
+    removeCardFile : (cardId) => backend.removeCardFile(cardId),
+
+    // sets the given dotted file fields (e.g. "file.width") on a card, but only if its file is still fileId and hasn't been optimized yet
+    // resolves to whether the card was changed
+    setOptimizedFile : (cardId, fileId, fields) => backend.setOptimizedFile(cardId, fileId, fields),
+
+    // returns a writable stream that stores a new file, with the file's id as its id property and an abort() that removes whatever was written
+    openUploadStream : (fileType) => backend.openUploadStream(fileType),
+
+    // returns a readable stream of a stored file's bytes, start and end are optional and inclusive. A missing file errors the stream
+    openFileStream : (fileId, start, end) => backend.openFileStream(fileId, start, end),
+
+    // removes a stored file. The db rejects if the file doesn't exist, which Media.service.js's deleteFile ignores
+    deleteFile : (fileId) => backend.deleteFile(fileId),
+
+    // resolves to up to limit stored files ({_id, length}) in _id order, starting after afterId and only including files stored before uploadedBefore
+    listStoredFiles : (afterId, limit, uploadedBefore) => backend.listStoredFiles(afterId, limit, uploadedBefore)
+}
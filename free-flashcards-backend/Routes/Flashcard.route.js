@@ -3,13 +3,22 @@ const express = require("express");
 const router = express.Router();
 
 const FlashcardController = require("../Controllers/Flashcard.Controller");
+const { streamUpload } = require("../Middleware/StreamUpload.middleware");
+const { admitRequests } = require("../Middleware/Admission.middleware");
 
-router.get('/:id', FlashcardController.findFlashcardById); // gets a single flashcard matching the specified id
+// every route is admitted under a class of routes that costs about the same to serve, see Admission.middleware.js
+const admitWrites = admitRequests("write");
 
-router.post('/:id/file', FlashcardController.addFileToCard); // adds a file to the flashcard with the specified id
+router.get('/:id', admitRequests("read"), FlashcardController.findFlashcardById); // gets a single flashcard matching the specified id
 
-router.delete('/:id/file', FlashcardController.deleteFileFromCard); // adds a file to the flashcard with the specified id
+router.get('/:id/file', admitRequests("download"), FlashcardController.getFileFromCard); // sends the raw contents of the file attached to the flashcard with the specified id
 
-router.put('/:id', FlashcardController.updateFlashcard); // updates the flashcard with the specified id
+// the file is streamed into the blob store as it arrives, so it's never held in memory (see StreamUpload.middleware.js)
+router.post('/:id/file', admitRequests("upload"), streamUpload({acceptsField: (fieldName) => fieldName === "file", maxFiles: 1}), 
+            FlashcardController.addFileToCard); // adds a file to the flashcard with the specified id
+
+router.delete('/:id/file', admitWrites, FlashcardController.deleteFileFromCard); // deletes the file attached to the flashcard with the specified id
+
+router.put('/:id', admitWrites, FlashcardController.updateFlashcard); // updates the flashcard with the specified id
 
 module.exports = router;
\ No newline at end of file
@@ -3,24 +3,44 @@ const express = require("express");
 const router = express.Router();
 
 const StudySetController = require("../Controllers/StudySet.Controller");
+const { streamUpload } = require("../Middleware/StreamUpload.middleware");
+const { admitRequests } = require("../Middleware/Admission.middleware");
+
 const StudySet = require("../Models/StudySet.model");
 
+const MAX_FILES_PER_SET = 500; // the most files a set can be created with in one request
+
 // handles requests on the route <root>/sets
+// every route is admitted under a class of routes that costs about the same to serve, see Admission.middleware.js
+
+const admitReads = admitRequests("read");
+const admitWrites = admitRequests("write");
+const admitUploads = admitRequests("upload");
+// a set created with files streams them all into the blob store, one created from a JSON body is an ordinary write
+const admitSetCreation = (request, response, next) => (request.is("multipart/form-data") ? admitUploads : admitWrites)(request, response, next);
+
+router.get('/', admitReads, StudySetController.getAllStudySets); // gets all study sets
+
+// a set created together with its cards has each card's file attached as file-<card index>, which is streamed into the blob store as it arrives
+const setFileUpload = streamUpload({acceptsField: (fieldName) => /^file-(0|[1-9][0-9]*)$/.test(fieldName), maxFiles: MAX_FILES_PER_SET,
+                                    labelField: (fieldName) => `Card ${fieldName.slice("file-".length)}`});
+
+router.post('/', admitSetCreation, setFileUpload, StudySetController.createStudySet); // creates a new study set
 
-router.get('/', StudySetController.getAllStudySets); // gets all study sets
+router.delete('/:id', admitRequests("set-delete"), StudySetController.deleteStudySetById); // deletes the study set matching the provided id
 
-router.post('/', StudySetController.createStudySet); // creates a new study set
+router.get('/:id', admitReads, StudySetController.getStudySetById); // gets a study study set matching the provided id
 
-router.delete('/:id', StudySetController.deleteStudySetById); // deletes the study set matching the provided id
+router.get('/:id/cards', admitReads, StudySetController.getCardsInSet); // gets every card in the study set matching the provided id in one request
 
-router.get('/:id', StudySetController.getStudySetById); // gets a study study set matching the provided id
+router.get('/:id/stats', admitReads, StudySetController.getStudySetStats); // gets the quiz score aggregates for the study set matching the provided id
 
-router.put('/:id', StudySetController.updateStudySetTitle); // updates the title of the study set with the provided id
+router.put('/:id', admitWrites, StudySetController.updateStudySetTitle); // updates the title of the study set with the provided id
 
-router.post('/:id', StudySetController.addCardToSet); // adds a flashcard to the study set with the specified id
+router.post('/:id', admitWrites, StudySetController.addCardToSet); // adds a flashcard to the study set with the specified id
 
-router.delete('/:set_id/:card_id', StudySetController.deleteCardFromSet); // deletes the specified card from the set
+router.delete('/:set_id/:card_id', admitWrites, StudySetController.deleteCardFromSet); // deletes the specified card from the set
 
-router.post('/:id/quiz', StudySetController.addQuizScore); // add a new quiz score to the specified study set
+router.post('/:id/quiz', admitWrites, StudySetController.addQuizScore); // add a new quiz score to the specified study set
 
 module.exports = router;
@@ -0,0 +1,71 @@
+// Measures what it costs to serialize and send a large study set's cards: the CPU time of the old paths (JSON.stringify on hydrated
+// mongoose documents, or on lean ones for GET /sets/:id/cards) against the compiled serializers on lean documents, and the payload size
+// with and without compression
+// This doesn't need a database, the cards are generated in memory
+//
+// usage: node Scripts/benchmarkSerialization.js [cardCount] [rounds]
+const zlib = require("zlib");
+const mongoose = require("mongoose");
+const Flashcard = require("../Models/Flashcard.model");
+const StudySet = require("../Models/StudySet.model");
+const Serializer = require("../Services/Serializer.service");
+const Compression = require("../Middleware/Compression.middleware");
+
+const cardCount = parseInt(process.argv[2]) || 5000;
+const rounds = parseInt(process.argv[3]) || 20;
+
+// this function builds cards that look like real ones, about a third of them with a file
+function buildCards() {
+    let cards = [];
+    for (let i = 0; i < cardCount; i++) {
+        let card = new Flashcard({prompt: `What is the meaning of term number ${i}?`, response: `Term ${i} means something different from term ${i + 1}`,
+                                  userResponseType: ["text", "drawn", "recorded"][i % 3], __v: 0}); // documents read from the db have a version
+        if (i % 3 === 0) {
+            card.file = {fileId: new mongoose.Types.ObjectId(), fileType: "image/png", size: 20000 + i, hash: "ab".repeat(32), partOfPrompt: true,
+                         width: 640, height: 480, optimizedAt: new Date()};
+        }
+        cards.push(card);
+    }
+    return cards;
+}
+
+// this function returns the average milliseconds a call of run takes, after a few warm up calls
+function time(run) {
+    for (let i = 0; i < 3; i++) {
+        run();
+    }
+    const start = process.hrtime.bigint();
+    for (let i = 0; i < rounds; i++) {
+        run();
+    }
+    return Number(process.hrtime.bigint() - start) / 1e6 / rounds;
+}
+
+const hydratedCards = buildCards();
+const leanCards = hydratedCards.map((card) => card.toObject()); // what a .lean() query gives us
+const set = new StudySet({title: "A large set", cards: hydratedCards.map((card) => card._id), __v: 0});
+const leanSet = set.toObject();
+
+const before = {
+    cards: time(() => hydratedCards.map((card) => JSON.stringify(card)).join(",")),
+    leanCards: time(() => leanCards.map((card) => JSON.stringify(card)).join(",")),
+    set: time(() => JSON.stringify(set))
+};
+const after = {
+    cards: time(() => leanCards.map(Serializer.serializeCard).join(",")),
+    set: time(() => Serializer.serializeSet(leanSet))
+};
+const oldBody = Buffer.from(`{"cards":[${hydratedCards.map((card) => JSON.stringify(card)).join(",")}]}`);
+const newBody = Buffer.from(`{"cards":[${leanCards.map(Serializer.serializeCard).join(",")}]}`);
+
+console.log(`${cardCount} cards, average of ${rounds} rounds`);
+console.log(`serializing the cards: ${before.cards.toFixed(2)} ms before (${before.leanCards.toFixed(2)} ms from lean documents), ${after.cards.toFixed(2)} ms after`);
+console.log(`serializing the set:   ${before.set.toFixed(2)} ms before, ${after.set.toFixed(2)} ms after`);
+console.log(`payload: ${oldBody.length} bytes before, ${newBody.length} bytes after`);
+for (const encoding of ["gzip", "br"]) {
+    let compressed;
+    const compressTime = time(() => {
+        compressed = Compression.compressBody(newBody, encoding);
+    });
+    console.log(`  ${encoding}: ${compressed.length} bytes (${(newBody.length / compressed.length).toFixed(1)}x smaller) in ${compressTime.toFixed(2)} ms`);
+}
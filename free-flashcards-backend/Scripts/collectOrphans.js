@@ -0,0 +1,19 @@
+// Removes flashcards that no study set references, and stored files that no flashcard references, in bounded batches
+// These are left behind when a request fails part way through on a server without transactions, or when a file removal fails after its card is deleted
+//
+// usage: node Scripts/collectOrphans.js <production|test> [batchSize] [--dry-run]
+require("dotenv").config({path: `${__dirname}/../.env`});
+const mongoose = require("mongoose");
+const OrphanCollector = require("../Services/OrphanCollector.service");
+
+const launchArgs = process.argv;
+const dryRun = launchArgs.includes("--dry-run");
+const batchSize = parseInt(launchArgs[3]) || undefined; // undefined uses the collector's default
+
+require("../initDB")(launchArgs[2]).then(() => OrphanCollector.collectOrphans({batchSize: batchSize, dryRun: dryRun})).then((report) => {
+    const verb = dryRun ? "would remove" : "removed";
+    console.log(`${verb} ${report.cardsRemoved} orphaned cards (${report.cardBytes} bytes) and ${report.filesRemoved} orphaned files (${report.fileBytes} bytes)`);
+}).catch((error) => {
+    console.log(error.message);
+    process.exitCode = 1;
+}).finally(() => mongoose.connection.close());
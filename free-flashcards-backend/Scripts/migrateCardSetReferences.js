@@ -0,0 +1,59 @@
+// Gives the cards of every study set made before cards knew their set a setId and a position, in the order of the set's cards array,
+// and starts the set's nextCardPosition after them. Once a set has a nextCardPosition its cards are read through the {setId, position} index
+// This can run while the server is up and can be stopped and rerun at any point: sets are only marked done (given a nextCardPosition) after
+// all of their cards are, and only if the set hasn't changed since we read it, so a card added or removed mid-migration makes us redo that set
+//
+// usage: node Scripts/migrateCardSetReferences.js <production|test> [batchSize]
+require("dotenv").config({path: `${__dirname}/../.env`});
+const mongoose = require("mongoose");
+const StudySet = require("../Models/StudySet.model");
+const Flashcard = require("../Models/Flashcard.model");
+
+const DEFAULT_BATCH_SIZE = 100;
+
+async function migrateCardSetReferences(batchSize) {
+    const legacyFilter = {nextCardPosition: {$exists: false}};
+    let totals = {sets: 0, cards: 0};
+
+    while (true) {
+        const batch = await StudySet.find(legacyFilter, {cards: 1, __v: 1}).sort({_id: 1}).limit(batchSize).lean();
+        if (batch.length === 0) {
+            break;
+        }
+        for (let i = 0; i < batch.length; i++) {
+            let set = batch[i];
+            while (set !== null) {
+                if (set.cards.length > 0) {
+                    // cards that no longer exist just don't match. The card's json changes, so its ETag has to as well
+                    await Flashcard.bulkWrite(set.cards.map((cardId, position) => ({
+                        updateOne: {filter: {_id: cardId}, update: {$set: {setId: set._id, position: position}, $inc: {__v: 1}}}
+                    })), {ordered: false});
+                }
+                // every change to a set bumps its version, so this only matches if the cards we just positioned are still the set's cards
+                // the set's json doesn't change, so its version doesn't need to
+                const result = await StudySet.updateOne({_id: set._id, __v: set.__v, ...legacyFilter}, {$set: {nextCardPosition: set.cards.length}});
+                if (result.modifiedCount === 1) {
+                    totals.sets++;
+                    totals.cards += set.cards.length;
+                    break;
+                }
+                set = await StudySet.findOne({_id: set._id, ...legacyFilter}, {cards: 1, __v: 1}).lean(); // null once it's deleted
+            }
+        }
+        console.log(`positioned ${totals.cards} cards in ${totals.sets} sets`);
+    }
+    return totals;
+}
+
+module.exports = migrateCardSetReferences;
+
+if (require.main === module) {
+    const launchArgs = process.argv;
+    const batchSize = parseInt(launchArgs[3]) || DEFAULT_BATCH_SIZE;
+    require("../initDB")(launchArgs[2]).then(() => migrateCardSetReferences(batchSize)).then((totals) => {
+        console.log(`done: gave ${totals.cards} cards in ${totals.sets} sets their set and position`);
+    }).catch((error) => {
+        console.log(error.message);
+        process.exitCode = 1;
+    }).finally(() => mongoose.connection.close());
+}
@@ -0,0 +1,62 @@
+// Moves files that are still embedded in flashcard documents (file.data) into the media blob store
+// The API can serve both kinds of file, so this can run while the server is up. Each card is only updated if its file is still embedded,
+// so a card that gets a new file uploaded mid-migration keeps the new file and the copy we made is removed
+//
+// usage: node Scripts/migrateEmbeddedFiles.js <production|test> [batchSize] [pauseMs]
+require("dotenv").config({path: `${__dirname}/../.env`});
+const mongoose = require("mongoose");
+const Flashcard = require("../Models/Flashcard.model");
+const MediaService = require("../Services/Media.service");
+
+const DEFAULT_BATCH_SIZE = 50; // at 500 KB per file this keeps each batch well under the driver's default message sizes
+const DEFAULT_PAUSE_MS = 100; // time between batches so the migration doesn't crowd out API traffic
+
+async function migrateEmbeddedFiles(batchSize, pauseMs) {
+    const embeddedFilter = {"file.data": {$exists: true}, "file.fileId": {$exists: false}};
+    let lastId = null; // we walk the cards in _id order so a card we skip can't be picked up again in the same run
+    let totals = {migrated: 0, skipped: 0, bytes: 0};
+
+    while (true) {
+        const batchFilter = lastId === null ? embeddedFilter : {...embeddedFilter, _id: {$gt: lastId}};
+        const batch = await Flashcard.find(batchFilter, {file: 1}).select("+file.data").sort({_id: 1}).limit(batchSize).lean();
+        if (batch.length === 0) {
+            break;
+        }
+        for (let i = 0; i < batch.length; i++) {
+            const card = batch[i];
+            const fileData = Buffer.from(card.file.data.buffer); // lean reads give us the driver's Binary
+            const storedFile = await MediaService.saveFileBuffer(fileData, card.file.fileType);
+            // only swap in the reference if nobody replaced or removed the embedded file since we read it
+            const result = await Flashcard.updateOne({_id: card._id, ...embeddedFilter}, {
+                $set: {"file.fileId": storedFile.fileId, "file.size": storedFile.size, "file.hash": storedFile.hash},
+                $unset: {"file.data": 1},
+                $inc: {__v: 1} // the card's json changes, so its ETag has to as well
+            });
+            if (result.modifiedCount === 1) {
+                totals.migrated++;
+                totals.bytes += storedFile.size;
+            } else {
+                await MediaService.deleteFile(storedFile.fileId);
+                totals.skipped++;
+            }
+        }
+        lastId = batch[batch.length - 1]._id;
+        console.log(`migrated ${totals.migrated} files (${totals.bytes} bytes), skipped ${totals.skipped}`);
+        await new Promise((resolve) => setTimeout(resolve, pauseMs));
+    }
+    return totals;
+}
+
+module.exports = migrateEmbeddedFiles;
+
+if (require.main === module) {
+    const launchArgs = process.argv;
+    const batchSize = parseInt(launchArgs[3]) || DEFAULT_BATCH_SIZE;
+    const pauseMs = launchArgs[4] !== undefined ? parseInt(launchArgs[4]) : DEFAULT_PAUSE_MS;
+    require("../initDB")(launchArgs[2]).then(() => migrateEmbeddedFiles(batchSize, pauseMs)).then((totals) => {
+        console.log(`done: moved ${totals.migrated} files (${totals.bytes} bytes) into the blob store`);
+    }).catch((error) => {
+        console.log(error.message);
+        process.exitCode = 1;
+    }).finally(() => mongoose.connection.close());
+}
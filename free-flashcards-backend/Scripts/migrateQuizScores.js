@@ -0,0 +1,60 @@
+// Moves quiz scores that are still stored on study sets (quizScores) into the quizattempts collection and folds them into each set's quizStats
+// The API no longer writes quizScores, so this can run while the server is up. Each set is only updated if its stats haven't changed since we read them,
+// so a quiz submitted mid-migration makes us read the set again instead of losing either score
+//
+// usage: node Scripts/migrateQuizScores.js <production|test> [batchSize]
+require("dotenv").config({path: `${__dirname}/../.env`});
+const mongoose = require("mongoose");
+const StudySet = require("../Models/StudySet.model");
+const QuizAttempt = require("../Models/QuizAttempt.model");
+const QuizStatsService = require("../Services/QuizStats.service");
+
+const DEFAULT_BATCH_SIZE = 100;
+
+async function migrateQuizScores(batchSize) {
+    const legacyFilter = {"quizScores.0": {$exists: true}};
+    let totals = {sets: 0, scores: 0};
+
+    while (true) {
+        const batch = await StudySet.find(legacyFilter, {quizScores: 1, quizStats: 1}).select("+quizScores").sort({_id: 1}).limit(batchSize).lean();
+        if (batch.length === 0) {
+            break;
+        }
+        for (let i = 0; i < batch.length; i++) {
+            let set = batch[i];
+            while (set !== null && set.quizScores !== undefined && set.quizScores.length > 0) {
+                const foldedStats = QuizStatsService.foldScores(set.quizStats, set.quizScores);
+                // the set's creation time is the only time we know these quizzes were taken by, so the attempts are ordered after it in the order they were stored
+                const createdAt = set._id.getTimestamp().getTime();
+                const attempts = set.quizScores.map((score, index) => ({setId: set._id, score: score, takenAt: new Date(createdAt + index)}));
+                const storedAttempts = await QuizAttempt.insertMany(attempts);
+                // only swap in the folded stats if nobody took a quiz on this set since we read it
+                const statsFilter = {"quizStats.attemptCount": set.quizStats?.attemptCount ?? null};
+                const result = await StudySet.updateOne({_id: set._id, ...statsFilter}, {$set: {quizStats: foldedStats}, $unset: {quizScores: 1}, 
+                                                                                          $inc: {__v: 1}}); // the set's json changes, so its ETag has to as well
+                if (result.modifiedCount === 1) {
+                    totals.sets++;
+                    totals.scores += attempts.length;
+                    break;
+                }
+                await QuizAttempt.deleteMany({_id: {$in: storedAttempts.map((attempt) => attempt._id)}});
+                set = await StudySet.findById(set._id, {quizScores: 1, quizStats: 1}).select("+quizScores").lean(); // someone took a quiz since we read the set
+            }
+        }
+        console.log(`migrated ${totals.scores} quiz scores from ${totals.sets} sets`);
+    }
+    return totals;
+}
+
+module.exports = migrateQuizScores;
+
+if (require.main === module) {
+    const launchArgs = process.argv;
+    const batchSize = parseInt(launchArgs[3]) || DEFAULT_BATCH_SIZE;
+    require("../initDB")(launchArgs[2]).then(() => migrateQuizScores(batchSize)).then((totals) => {
+        console.log(`done: moved ${totals.scores} quiz scores from ${totals.sets} sets into quiz attempts`);
+    }).catch((error) => {
+        console.log(error.message);
+        process.exitCode = 1;
+    }).finally(() => mongoose.connection.close());
+}
@@ -0,0 +1,35 @@
+// Makes the media optimizer's copies of every stored file it hasn't finished with yet (files attached before the optimizer existed, or
+// whose optimization failed or was dropped because the optimizer was busy), then prints how much each file type has been compressed by
+// With --report nothing is optimized, only the report is printed
+//
+// usage: node Scripts/optimizeMedia.js <production|test> [batchSize] [--report]
+require("dotenv").config({path: `${__dirname}/../.env`});
+const mongoose = require("mongoose");
+const MediaOptimizer = require("../Services/MediaOptimizer.service");
+
+const launchArgs = process.argv;
+const reportOnly = launchArgs.includes("--report");
+const batchSize = parseInt(launchArgs[3]) || undefined; // undefined uses the optimizer's default
+
+// this function prints one line per file type, e.g. "image/bmp: 12 files (0 pending, 12 optimized), 9437832 bytes served as 2063724 (4.57x), thumbnails 262800 bytes"
+function printReport(report) {
+    if (report.length === 0) {
+        console.log("no stored files");
+        return;
+    }
+    for (const entry of report) {
+        console.log(`${entry.fileType}: ${entry.files} files (${entry.pendingFiles} pending, ${entry.optimizedFiles} optimized), ` +
+                    `${entry.originalBytes} bytes served as ${entry.servedBytes} (${entry.compressionRatio.toFixed(2)}x), thumbnails ${entry.thumbnailBytes} bytes`);
+    }
+}
+
+require("../initDB")(launchArgs[2]).then(async () => {
+    if (!reportOnly) {
+        const result = await MediaOptimizer.optimizePendingFiles({batchSize: batchSize});
+        console.log(`optimized ${result.optimized} files, skipped ${result.skipped} that changed while being optimized, ${result.failed} failed`);
+    }
+    printReport(await MediaOptimizer.getOptimizationReport());
+}).catch((error) => {
+    console.log(error.message);
+    process.exitCode = 1;
+}).finally(() => mongoose.connection.close());
@@ -0,0 +1,72 @@
+// works out what kind of file an upload is from its first bytes, since the mimetype a client sends is only what the client claims the file is
+
+const SNIFF_LENGTH = 1024; // how many bytes from the start of a file we look at, SVGs can have a long XML prolog before their <svg> tag
+
+// each signature is a byte pattern at an offset from the start of the file, null entries in a pattern match any byte
+const SIGNATURES = [
+    {fileType: "image/jpeg", offset: 0, bytes: [0xFF, 0xD8, 0xFF]},
+    {fileType: "image/png", offset: 0, bytes: [0x89, 0x50, 0x4E, 0x47, 0x0D, 0x0A, 0x1A, 0x0A]},
+    {fileType: "image/gif", offset: 0, bytes: ascii("GIF87a")},
+    {fileType: "image/gif", offset: 0, bytes: ascii("GIF89a")},
+    {fileType: "image/webp", offset: 0, bytes: [...ascii("RIFF"), null, null, null, null, ...ascii("WEBP")]},
+    {fileType: "image/bmp", offset: 0, bytes: ascii("BM")},
+    {fileType: "image/tiff", offset: 0, bytes: [0x49, 0x49, 0x2A, 0x00]},
+    {fileType: "image/tiff", offset: 0, bytes: [0x4D, 0x4D, 0x00, 0x2A]},
+    {fileType: "image/x-icon", offset: 0, bytes: [0x00, 0x00, 0x01, 0x00]},
+    {fileType: "image/avif", offset: 4, bytes: ascii("ftypavif")},
+    {fileType: "audio/wav", offset: 0, bytes: [...ascii("RIFF"), null, null, null, null, ...ascii("WAVE")]},
+    {fileType: "audio/mpeg", offset: 0, bytes: ascii("ID3")},
+    {fileType: "audio/ogg", offset: 0, bytes: ascii("OggS")},
+    {fileType: "audio/flac", offset: 0, bytes: ascii("fLaC")},
+    {fileType: "audio/mp4", offset: 4, bytes: ascii("ftypM4A ")},
+    {fileType: "video/mp4", offset: 4, bytes: ascii("ftyp")}, // any other mp4 brand is a video
+    {fileType: "audio/webm", offset: 0, bytes: [0x1A, 0x45, 0xDF, 0xA3]}, // browsers record audio as webm, we can't tell it apart from webm video without parsing it
+    {fileType: "application/pdf", offset: 0, bytes: ascii("%PDF-")}
+];
+
+module.exports = {
+
+    SNIFF_LENGTH : SNIFF_LENGTH,
+
+    // returns the mimetype of the file starting with header (its first SNIFF_LENGTH bytes, or all of it if it's shorter), or undefined if we don't recognise it
+    sniffFileType : (header) => {
+        for (let i = 0; i < SIGNATURES.length; i++) {
+            if (matchesSignature(header, SIGNATURES[i])) {
+                return SIGNATURES[i].fileType;
+            }
+        }
+        // mp3 files without an ID3 tag start straight away with a frame, whose first 11 bits are set. AAC (ADTS) frames look the same but with layer bits of 0
+        if (header.length >= 2 && header[0] === 0xFF && (header[1] & 0xE0) === 0xE0) {
+            return (header[1] & 0x06) === 0 ? "audio/aac" : "audio/mpeg";
+        }
+        if (isSvg(header)) {
+            return "image/svg+xml";
+        }
+        return undefined;
+    }
+}
+
+function ascii(text) {
+    return [...Buffer.from(text, "latin1")];
+}
+
+function matchesSignature(header, signature) {
+    if (header.length < signature.offset + signature.bytes.length) {
+        return false;
+    }
+    for (let i = 0; i < signature.bytes.length; i++) {
+        if (signature.bytes[i] !== null && header[signature.offset + i] !== signature.bytes[i]) {
+            return false;
+        }
+    }
+    return true;
+}
+
+// SVGs are text, so we check that the file starts like XML and has an <svg> tag near its start
+function isSvg(header) {
+    const text = header.toString("utf8").replace(/^\uFEFF/, "").trimStart();
+    if (!text.startsWith("<")) {
+        return false;
+    }
+    return /<svg[\s>]/i.test(text);
+}
@@ -0,0 +1,90 @@
+const crypto = require("crypto");
+const { Readable, Transform } = require("stream");
+const { pipeline } = require("stream/promises");
+const Repository = require("../Repositories/Repository");
+
+// define the needed functions in the module's exports
+// cards only hold a reference to their file (fileId) and a description of it, the file's bytes are kept by the repository (GridFS with the Mongo one)
+module.exports = {
+
+    // streams the readable source into the blob store and resolves to {fileId, size, hash} once every chunk has been written
+    saveFileStream : async (source, fileType) => {
+        const fileHash = crypto.createHash("sha256");
+        let fileSize = 0;
+        // this passes the file through unchanged while we measure it, so we never need the whole file in memory
+        const measure = new Transform({
+            transform(chunk, encoding, callback) {
+                fileHash.update(chunk);
+                fileSize += chunk.length;
+                callback(null, chunk);
+            }
+        });
+        const uploadStream = Repository.openUploadStream(fileType);
+        try {
+            await pipeline(source, measure, uploadStream);
+        } catch (error) {
+            await uploadStream.abort().catch(() => {}); // removes any chunks that were already written
+            throw error;
+        }
+        return {fileId: uploadStream.id, size: fileSize, hash: fileHash.digest("hex")};
+    },
+
+    // stores a file we already have in memory (e.g. one being moved out of a flashcard document)
+    saveFileBuffer : async (buffer, fileType) => {
+        return module.exports.saveFileStream(Readable.from([buffer]), fileType);
+    },
+
+    // returns a readable stream of the file's bytes, start and end are optional and inclusive
+    openFileStream : (fileId, start, end) => {
+        return Repository.openFileStream(fileId, start, end);
+    },
+
+    // reads a whole stored file into memory, only for files small enough to hold at once (uploads are capped by the StreamUpload middleware)
+    readFileBuffer : async (fileId) => {
+        let chunks = [];
+        for await (const chunk of Repository.openFileStream(fileId)) {
+            chunks.push(chunk);
+        }
+        return Buffer.concat(chunks);
+    },
+
+    // removes a file from the blob store, removing a file that doesn't exist is not an error
+    deleteFile : async (fileId) => {
+        if (fileId === undefined || fileId === null) {
+            return;
+        }
+        try {
+            await Repository.deleteFile(fileId);
+        } catch (error) {
+            if (!isFileNotFound(error)) {
+                throw error;
+            }
+        }
+    },
+
+    // removes a card's file and the copies the media optimizer made of it, file is the card's file field (which may be empty)
+    deleteCardFile : async (file) => {
+        if (file === undefined || file === null) {
+            return;
+        }
+        await Promise.all(module.exports.cardFileIds(file).map((fileId) => module.exports.deleteFile(fileId)));
+    },
+
+    // returns the ids of every stored file a card's file field references
+    cardFileIds : (file) => {
+        const fileIds = [file.fileId, file.optimized && file.optimized.fileId, file.thumbnail && file.thumbnail.fileId];
+        return fileIds.filter((fileId) => fileId !== undefined && fileId !== null);
+    },
+
+    // returns up to limit stored files ({_id, length}) in _id order, starting after afterId and only including files uploaded before uploadedBefore
+    listStoredFiles : async (afterId, limit, uploadedBefore) => {
+        return Repository.listStoredFiles(afterId, limit, uploadedBefore);
+    },
+
+    isFileNotFound : isFileNotFound
+}
+
+// the driver reports a missing GridFS file with a generic error - download streams set an ENOENT code and deletes only have a message
+function isFileNotFound(error) {
+    return error.code === "ENOENT" || (typeof error.message === "string" && error.message.startsWith("File not found for id"));
+}
@@ -0,0 +1,206 @@
+const os = require("os");
+const path = require("path");
+const { Worker } = require("worker_threads");
+const Flashcard = require("../Models/Flashcard.model");
+const MediaService = require("./Media.service");
+const Repository = require("../Repositories/Repository");
+const ReadCache = require("./ReadCache.service");
+const Config = require("../config");
+
+// decoding and re-encoding media is CPU bound, so it runs on a small pool of worker threads and never blocks requests
+// we leave a core free for the thread serving requests, and in cluster mode the other cores are shared out between the workers' pools
+const POOL_SIZE = Math.max(1, Math.min(4, Math.floor((os.cpus().length - 1) / Config.processCount)));
+const MAX_QUEUED_TASKS = 100; // files waiting past this are left for Scripts/optimizeMedia.js rather than piling up in memory
+const TASK_TIMEOUT_MS = 30000; // a worker stuck on one file this long is replaced
+const DEFAULT_BATCH_SIZE = 50; // the most cards the backfill optimizes at once
+const WORKER_PATH = path.join(__dirname, "../Workers/MediaOptimizer.worker.js");
+
+let workers = []; // {worker, task}, where task is the task the worker is running or null when it's idle
+let queuedTasks = []; // {taskId, data, fileType, resolve, reject} waiting for an idle worker
+let nextTaskId = 0;
+
+// define the needed functions in the module's exports
+module.exports = {
+
+    MAX_QUEUED_TASKS : MAX_QUEUED_TASKS,
+
+    // optimizes a card's file in the background, called once a new file is attached to a card
+    // failures are only logged, the card keeps serving its original file and Scripts/optimizeMedia.js can retry it later
+    scheduleCardFile : (cardId, file) => {
+        if (file === undefined || file === null || file.fileId === undefined) {
+            return;
+        }
+        module.exports.optimizeCardFile(cardId, file).catch((error) => console.log(`could not optimize the file of card ${cardId}: ${error.message}`));
+    },
+
+    // records a card file's dimensions or duration and stores its optimized copy and thumbnail, if the optimizer can make them
+    // resolves to true once the card is updated, or false if the card's file was replaced, removed, or already optimized while we worked on it
+    optimizeCardFile : async (cardId, file) => {
+        const data = await MediaService.readFileBuffer(file.fileId);
+        const result = await runTask(data, file.fileType);
+
+        let update = {"file.optimizedAt": new Date()};
+        for (const field of ["width", "height", "duration"]) {
+            if (result[field] !== null) {
+                update[`file.${field}`] = result[field];
+            }
+        }
+        let savedFileIds = []; // any copies we store have to be removed again if the card can't take them
+        try {
+            if (result.optimized !== null) {
+                const stored = await MediaService.saveFileBuffer(result.optimized.data, result.optimized.fileType);
+                savedFileIds.push(stored.fileId);
+                update["file.optimized"] = {fileId: stored.fileId, fileType: result.optimized.fileType, size: stored.size, hash: stored.hash};
+            }
+            if (result.thumbnail !== null) {
+                const stored = await MediaService.saveFileBuffer(result.thumbnail.data, result.thumbnail.fileType);
+                savedFileIds.push(stored.fileId);
+                update["file.thumbnail"] = {fileId: stored.fileId, fileType: result.thumbnail.fileType, size: stored.size, hash: stored.hash,
+                                            width: result.thumbnail.width, height: result.thumbnail.height};
+            }
+            // the card is only updated if it still has the file we optimized, so we never attach copies of a file that's been replaced
+            if (!await Repository.setOptimizedFile(cardId, file.fileId, update)) {
+                await Promise.all(savedFileIds.map((fileId) => MediaService.deleteFile(fileId)));
+                return false;
+            }
+            ReadCache.invalidate(`card:${cardId}`);
+            return true;
+        } catch (error) {
+            await Promise.all(savedFileIds.map((fileId) => MediaService.deleteFile(fileId).catch(() => {})));
+            throw error;
+        }
+    },
+
+    // optimizes every stored file the optimizer hasn't finished with yet (files attached before it existed, or whose optimization failed)
+    // resolves to {optimized, skipped, failed}, where skipped files were replaced or removed while we worked on them
+    optimizePendingFiles : async ({batchSize = DEFAULT_BATCH_SIZE} = {}) => {
+        batchSize = Math.min(batchSize, MAX_QUEUED_TASKS); // a bigger batch would overflow the queue
+        let report = {optimized: 0, skipped: 0, failed: 0};
+        let lastId = null;
+        while (true) {
+            let filter = {"file.fileId": {$exists: true}, "file.optimizedAt": {$exists: false}};
+            if (lastId !== null) {
+                filter._id = {$gt: lastId};
+            }
+            const batch = await Flashcard.find(filter, {file: 1}).sort({_id: 1}).limit(batchSize).lean();
+            if (batch.length === 0) {
+                return report;
+            }
+            lastId = batch[batch.length - 1]._id; // failed files stay pending, so we walk past them rather than retrying them forever
+            const outcomes = await Promise.allSettled(batch.map((card) => module.exports.optimizeCardFile(card._id, card.file)));
+            for (let i = 0; i < outcomes.length; i++) {
+                if (outcomes[i].status === "rejected") {
+                    console.log(`could not optimize the file of card ${batch[i]._id}: ${outcomes[i].reason.message}`);
+                    report.failed++;
+                } else if (outcomes[i].value) {
+                    report.optimized++;
+                } else {
+                    report.skipped++;
+                }
+            }
+        }
+    },
+
+    // resolves to one entry per file type describing how much the optimizer has saved:
+    // {fileType, files, pendingFiles, optimizedFiles, originalBytes, servedBytes, thumbnailBytes, compressionRatio}
+    // servedBytes is what the files cost to send by default (the optimized copy when there is one) and compressionRatio is originalBytes / servedBytes
+    getOptimizationReport : async () => {
+        const groups = await Flashcard.aggregate([
+            {$match: {"file.fileId": {$exists: true}}},
+            {$group: {
+                _id: "$file.fileType",
+                files: {$sum: 1},
+                pendingFiles: {$sum: {$cond: [{$ifNull: ["$file.optimizedAt", false]}, 0, 1]}},
+                optimizedFiles: {$sum: {$cond: [{$ifNull: ["$file.optimized.fileId", false]}, 1, 0]}},
+                originalBytes: {$sum: "$file.size"},
+                servedBytes: {$sum: {$ifNull: ["$file.optimized.size", "$file.size"]}},
+                thumbnailBytes: {$sum: {$ifNull: ["$file.thumbnail.size", 0]}}
+            }},
+            {$sort: {_id: 1}}
+        ]);
+        return groups.map(({_id, ...group}) => ({
+            fileType: _id,
+            ...group,
+            compressionRatio: group.servedBytes > 0 ? group.originalBytes / group.servedBytes : 1
+        }));
+    }
+}
+
+// this function runs the optimizer on a file's bytes in the worker pool, resolving to the worker's result (see MediaCodecs.optimizeMedia)
+function runTask(data, fileType) {
+    if (queuedTasks.length >= MAX_QUEUED_TASKS) {
+        return Promise.reject(new Error("The media optimizer queue is full"));
+    }
+    return new Promise((resolve, reject) => {
+        queuedTasks.push({taskId: nextTaskId++, data: data, fileType: fileType, resolve: resolve, reject: reject});
+        dispatchTasks();
+    });
+}
+
+// this function hands queued tasks to idle workers, starting workers as they're needed until the pool is full
+function dispatchTasks() {
+    while (queuedTasks.length > 0) {
+        let slot = workers.find((candidate) => candidate.task === null);
+        if (slot === undefined) {
+            if (workers.length >= POOL_SIZE) {
+                return;
+            }
+            slot = startWorker();
+        }
+        const task = queuedTasks.shift();
+        slot.task = task;
+        task.timer = setTimeout(() => {
+            // terminating the worker fires its exit event, which fails the task and frees the slot
+            slot.worker.terminate();
+        }, TASK_TIMEOUT_MS);
+        slot.worker.postMessage({taskId: task.taskId, data: task.data, fileType: task.fileType}); // the data is copied, the caller keeps its buffer
+    }
+}
+
+// this function starts a worker and adds it to the pool
+function startWorker() {
+    let slot = {worker: new Worker(WORKER_PATH), task: null};
+    slot.worker.on("message", ({taskId, result, error}) => {
+        const task = slot.task;
+        if (task === null || task.taskId !== taskId) {
+            return;
+        }
+        finishTask(slot);
+        if (error !== undefined) {
+            task.reject(new Error(error));
+        } else {
+            task.resolve(restoreBuffers(result));
+        }
+        dispatchTasks();
+    });
+    slot.worker.on("error", (error) => { // an uncaught error stops the worker, its exit event follows
+        console.log(`media optimizer worker failed: ${error.message}`);
+    });
+    slot.worker.on("exit", () => {
+        workers = workers.filter((candidate) => candidate !== slot);
+        const task = slot.task;
+        if (task !== null) {
+            finishTask(slot);
+            task.reject(new Error("The media optimizer stopped before finishing the file"));
+        }
+        dispatchTasks(); // a replacement worker is started if there's still work waiting
+    });
+    slot.worker.unref(); // an idle pool shouldn't keep the process alive, this has to come after the listeners since adding them refs the worker again
+    workers.push(slot);
+    return slot;
+}
+
+function finishTask(slot) {
+    clearTimeout(slot.task.timer);
+    slot.task = null;
+}
+
+// buffers sent from a worker arrive as plain Uint8Arrays, this turns the result's back into Buffers without copying them
+function restoreBuffers(result) {
+    for (const variant of [result.optimized, result.thumbnail]) {
+        if (variant !== null) {
+            variant.data = Buffer.from(variant.data.buffer, variant.data.byteOffset, variant.data.byteLength);
+        }
+    }
+    return result;
+}
@@ -0,0 +1,229 @@
+const cluster = require("cluster");
+const mongoose = require("mongoose");
+const { monitorEventLoopDelay } = require("perf_hooks");
+const Config = require("../config");
+
+// Counts and times what the server does so it can be scraped by Prometheus at GET /metrics
+// Recording only increments a few numbers, everything else (formatting, merging the workers' numbers in cluster mode) happens when
+// someone asks for the metrics, so an unscraped server pays next to nothing for them
+
+const LATENCY_BUCKETS = [0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10]; // seconds
+const QUERY_BUCKETS = [0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 5]; // seconds, most queries take a few milliseconds
+const WAIT_BUCKETS = [0.001, 0.005, 0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5]; // seconds, up to the longest queue timeout (see Admission.middleware.js)
+const SIZE_BUCKETS = [256, 1024, 4096, 16384, 65536, 262144, 1048576, 4194304, 16777216, 67108864]; // bytes, up to the largest upload
+const SNAPSHOT_TIMEOUT_MS = 2000; // how long we wait on the other workers for their metrics in cluster mode
+const EVENT_LOOP_RESOLUTION_MS = 20;
+
+let metrics = new Map(); // name -> {name, type, help, labelNames, buckets, series}, where series maps a key made from the label values to the numbers for them
+let collectionModels = new Map(); // collection name -> the name of its model, or the collection name itself for collections without one (e.g. media.files)
+let runningCommands = new Map(); // the driver's requestId -> {model, operation} for db commands that haven't finished yet
+let pendingSnapshots = new Map(); // snapshotId -> resolve, for snapshots we've asked the primary for in cluster mode
+let nextSnapshotId = 0;
+
+const requestDuration = defineMetric("http_request_duration_seconds", "histogram", "Time taken to respond to requests, by route template and status",
+                                     ["method", "route", "status"], LATENCY_BUCKETS);
+const requestSize = defineMetric("http_request_size_bytes", "histogram", "Size of request bodies, by route template", ["method", "route"], SIZE_BUCKETS);
+const responseSize = defineMetric("http_response_size_bytes", "histogram", "Bytes sent in response to requests including headers, by route template",
+                                  ["method", "route"], SIZE_BUCKETS);
+const commandDuration = defineMetric("mongodb_command_duration_seconds", "histogram", "Time taken by db commands, by model and operation",
+                                     ["model", "operation"], QUERY_BUCKETS);
+const commandFailures = defineMetric("mongodb_command_failures_total", "counter", "db commands that failed, by model and operation", ["model", "operation"]);
+const admissionInFlight = defineMetric("http_admission_in_flight_requests", "gauge", "Requests being worked on, by route class", ["route_class"]);
+const admissionQueueDepth = defineMetric("http_admission_queue_depth", "gauge", "Requests waiting to be admitted, by route class", ["route_class"]);
+const admissionWait = defineMetric("http_admission_queue_wait_seconds", "histogram", "Time admitted requests waited in their route class's queue",
+                                   ["route_class"], WAIT_BUCKETS);
+const admissionRejections = defineMetric("http_admission_rejections_total", "counter", "Requests turned away with a 503, by route class and reason",
+                                         ["route_class", "reason"]);
+const eventLoopLag = defineMetric("nodejs_eventloop_lag_seconds", "gauge", "How late the event loop ran timers since the last scrape, by worker slot",
+                                  ["worker", "statistic"]);
+
+// the event loop delay is sampled by a timer inside node, we only read it back when we're scraped
+const eventLoopDelay = monitorEventLoopDelay({resolution: EVENT_LOOP_RESOLUTION_MS});
+eventLoopDelay.enable();
+
+// define the needed functions in the module's exports
+module.exports = {
+
+    // records a finished request, route is the template it matched (e.g. /sets/:id) so ids don't each get their own series
+    observeRequest : (method, route, status, durationSeconds, requestBytes, responseBytes) => {
+        observe(requestDuration, [method, route, status], durationSeconds);
+        observe(requestSize, [method, route], requestBytes);
+        observe(responseSize, [method, route], responseBytes);
+    },
+
+    // records how many requests of a route class are running and waiting right now, called by Admission.middleware.js whenever that changes
+    setAdmissionLoad : (routeClass, inFlight, queueDepth) => {
+        admissionInFlight.series.set(routeClass, {labelValues: [routeClass], value: inFlight});
+        admissionQueueDepth.series.set(routeClass, {labelValues: [routeClass], value: queueDepth});
+    },
+
+    observeAdmissionWait : (routeClass, waitSeconds) => {
+        observe(admissionWait, [routeClass], waitSeconds);
+    },
+
+    // reason is "queue_full" or "queue_timeout"
+    countAdmissionRejection : (routeClass, reason) => {
+        increment(admissionRejections, [routeClass, reason], 1);
+    },
+
+    // times every command the db client sends, called by initDB.js with a client connected with monitorCommands
+    // the driver's command events see everything mongoose does, including cursors (e.g. GET /sets/:id/cards) that query middleware can't time
+    monitorCommands : (client) => {
+        client.on("commandStarted", (event) => {
+            // most commands name their collection as the command's value, getMore names it separately
+            const collection = event.commandName === "getMore" ? event.command.collection : event.command[event.commandName];
+            runningCommands.set(event.requestId, {model: typeof collection === "string" ? modelFor(collection) : "none", operation: event.commandName});
+        });
+        client.on("commandSucceeded", (event) => {
+            const command = runningCommands.get(event.requestId);
+            if (command !== undefined) {
+                runningCommands.delete(event.requestId);
+                observe(commandDuration, [command.model, command.operation], event.duration / 1000);
+            }
+        });
+        client.on("commandFailed", (event) => {
+            const command = runningCommands.get(event.requestId);
+            if (command !== undefined) {
+                runningCommands.delete(event.requestId);
+                observe(commandDuration, [command.model, command.operation], event.duration / 1000);
+                increment(commandFailures, [command.model, command.operation], 1);
+            }
+        });
+    },
+
+    // resolves to every metric in Prometheus' text format. In cluster mode this includes every worker's numbers, not only this one's
+    render : async () => {
+        if (!cluster.isWorker || !process.connected) {
+            return formatMetrics([takeSnapshot()]);
+        }
+        const snapshots = await new Promise((resolve) => {
+            const snapshotId = nextSnapshotId++;
+            pendingSnapshots.set(snapshotId, resolve);
+            process.send({type: "metrics-request", snapshotId: snapshotId, timeoutMs: SNAPSHOT_TIMEOUT_MS});
+        });
+        return formatMetrics(snapshots);
+    }
+}
+
+// in cluster mode the primary collects every worker's snapshot when one of them is scraped (see cluster.js)
+if (cluster.isWorker) {
+    process.on("message", (message) => {
+        if (message === null || typeof message !== "object") {
+            return;
+        }
+        if (message.type === "metrics-snapshot-request") {
+            process.send({type: "metrics-snapshot", collectionId: message.collectionId, snapshot: takeSnapshot()});
+        } else if (message.type === "metrics-response" && pendingSnapshots.has(message.snapshotId)) {
+            pendingSnapshots.get(message.snapshotId)(message.snapshots);
+            pendingSnapshots.delete(message.snapshotId);
+        }
+    });
+}
+
+function defineMetric(name, type, help, labelNames, buckets) {
+    const metric = {name: name, type: type, help: help, labelNames: labelNames, buckets: buckets, series: new Map()};
+    metrics.set(name, metric);
+    return metric;
+}
+
+// this function adds a value to a histogram, labelValues are in the order of the metric's labelNames
+function observe(metric, labelValues, value) {
+    const key = labelValues.join("\u0000");
+    let series = metric.series.get(key);
+    if (series === undefined) {
+        series = {labelValues: labelValues, bucketCounts: new Array(metric.buckets.length).fill(0), sum: 0, count: 0};
+        metric.series.set(key, series);
+    }
+    // only the first bucket the value fits in is counted here, the counts are made cumulative when they're formatted
+    for (let i = 0; i < metric.buckets.length; i++) {
+        if (value <= metric.buckets[i]) {
+            series.bucketCounts[i]++;
+            break;
+        }
+    }
+    series.sum += value;
+    series.count++;
+}
+
+function increment(metric, labelValues, amount) {
+    const key = labelValues.join("\u0000");
+    let series = metric.series.get(key);
+    if (series === undefined) {
+        series = {labelValues: labelValues, value: 0};
+        metric.series.set(key, series);
+    }
+    series.value += amount;
+}
+
+// this function returns the name metrics label a collection's commands with, the collection's model if it has one
+function modelFor(collection) {
+    let model = collectionModels.get(collection);
+    if (model === undefined) {
+        const owner = Object.values(mongoose.models).find((candidate) => candidate.collection.collectionName === collection);
+        model = owner === undefined ? collection : owner.modelName;
+        collectionModels.set(collection, model);
+    }
+    return model;
+}
+
+// this function copies this process's metrics into plain objects that can be sent to another process and merged with other snapshots
+// the event loop statistics cover the time since the last snapshot, so they start over afterwards
+function takeSnapshot() {
+    const worker = String(Config.workerSlot);
+    for (const [statistic, nanoseconds] of [["min", eventLoopDelay.min], ["max", eventLoopDelay.max], ["mean", eventLoopDelay.mean],
+                                            ["p50", eventLoopDelay.percentile(50)], ["p90", eventLoopDelay.percentile(90)], ["p99", eventLoopDelay.percentile(99)]]) {
+        // the delays node measures include the sampling interval itself, only what's on top of that is lag
+        const lagSeconds = Number.isFinite(nanoseconds) ? Math.max(0, nanoseconds / 1e6 - EVENT_LOOP_RESOLUTION_MS) / 1000 : 0;
+        eventLoopLag.series.set(`${worker}\u0000${statistic}`, {labelValues: [worker, statistic], value: lagSeconds});
+    }
+    eventLoopDelay.reset();
+    let snapshot = {};
+    for (const metric of metrics.values()) {
+        snapshot[metric.name] = [...metric.series.values()];
+    }
+    return snapshot;
+}
+
+// this function formats snapshots in Prometheus' text format, adding up the numbers of series that have the same labels in different snapshots
+function formatMetrics(snapshots) {
+    let lines = [];
+    for (const metric of metrics.values()) {
+        let merged = new Map();
+        for (const snapshot of snapshots) {
+            for (const series of snapshot[metric.name] || []) {
+                const key = series.labelValues.join("\u0000");
+                const existing = merged.get(key);
+                if (existing === undefined) {
+                    merged.set(key, structuredClone(series));
+                } else if (metric.type === "histogram") {
+                    existing.bucketCounts = existing.bucketCounts.map((count, i) => count + series.bucketCounts[i]);
+                    existing.sum += series.sum;
+                    existing.count += series.count;
+                } else {
+                    existing.value += series.value;
+                }
+            }
+        }
+        lines.push(`# HELP ${metric.name} ${metric.help}`, `# TYPE ${metric.name} ${metric.type}`);
+        for (const series of merged.values()) {
+            const labels = metric.labelNames.map((labelName, i) => `${labelName}="${escapeLabelValue(series.labelValues[i])}"`).join(",");
+            if (metric.type !== "histogram") {
+                lines.push(`${metric.name}{${labels}} ${series.value}`);
+                continue;
+            }
+            let cumulativeCount = 0;
+            for (let i = 0; i < metric.buckets.length; i++) {
+                cumulativeCount += series.bucketCounts[i];
+                lines.push(`${metric.name}_bucket{${labels},le="${metric.buckets[i]}"} ${cumulativeCount}`);
+            }
+            lines.push(`${metric.name}_bucket{${labels},le="+Inf"} ${series.count}`);
+            lines.push(`${metric.name}_sum{${labels}} ${series.sum}`);
+            lines.push(`${metric.name}_count{${labels}} ${series.count}`);
+        }
+    }
+    return lines.join("\n") + "\n";
+}
+
+function escapeLabelValue(value) {
+    return String(value).replace(/\\/g, "\\\\").replace(/\n/g, "\\n").replace(/"/g, '\\"');
+}
@@ -0,0 +1,122 @@
+const mongoose = require("mongoose");
+const Flashcard = require("../Models/Flashcard.model");
+const StudySet = require("../Models/StudySet.model");
+const MediaService = require("./Media.service");
+
+const DEFAULT_BATCH_SIZE = 500; // the most cards or files we look at (and remove) with each query
+// cards are created before they're added to a set and files are stored before they're attached to a card,
+// so anything younger than this may just be in the middle of being added and is left alone
+const DEFAULT_MIN_AGE_MS = 60 * 60 * 1000;
+
+let collectionRunning = false; // stops a scheduled collection from starting while the previous one is still going
+
+// define the needed functions in the module's exports
+module.exports = {
+
+    // removes flashcards that no study set references and stored files that no flashcard references
+    // resolves to a report of how many of each were removed and how many bytes that reclaimed. With dryRun nothing is removed, the report says what would be
+    collectOrphans : async ({batchSize = DEFAULT_BATCH_SIZE, minAgeMs = DEFAULT_MIN_AGE_MS, dryRun = false} = {}) => {
+        const cutoff = new Date(Date.now() - minAgeMs);
+        let report = {cardsRemoved: 0, cardBytes: 0, filesRemoved: 0, fileBytes: 0, dryRun: dryRun};
+        const countedFileIds = new Set(); // in a dry run the files of orphaned cards are still stored, so we make sure we only count them once
+        await collectOrphanedCards(batchSize, cutoff, dryRun, report, countedFileIds);
+        await collectOrphanedFiles(batchSize, cutoff, dryRun, report, countedFileIds);
+        return report;
+    },
+
+    // runs collectOrphans every intervalMs in the background, skipping a run if the previous one hasn't finished
+    scheduleOrphanCollection : (intervalMs) => {
+        const timer = setInterval(() => {
+            if (collectionRunning) {
+                return;
+            }
+            collectionRunning = true;
+            module.exports.collectOrphans().then((report) => {
+                console.log(`orphan collection removed ${report.cardsRemoved} cards (${report.cardBytes} bytes) and ${report.filesRemoved} files (${report.fileBytes} bytes)`);
+            }).catch((error) => console.log(error.message)).finally(() => {
+                collectionRunning = false;
+            });
+        }, intervalMs);
+        timer.unref(); // a pending collection shouldn't keep the process alive
+        return timer;
+    }
+}
+
+// walks every flashcard older than cutoff in _id order, removing the ones that aren't in any study set along with their files
+async function collectOrphanedCards(batchSize, cutoff, dryRun, report, countedFileIds) {
+    const cutoffId = mongoose.Types.ObjectId.createFromTime(Math.floor(cutoff.getTime() / 1000)); // an objectid's first bytes are its creation time
+    let lastId = null;
+    while (true) {
+        const idFilter = lastId === null ? {$lt: cutoffId} : {$gt: lastId, $lt: cutoffId};
+        const batch = await Flashcard.aggregate([
+            {$match: {_id: idFilter}},
+            {$sort: {_id: 1}},
+            {$limit: batchSize},
+            {$project: {file: {fileId: 1, size: 1, optimized: {fileId: 1, size: 1}, thumbnail: {fileId: 1, size: 1}}, documentSize: {$bsonSize: "$$ROOT"}}}
+        ]);
+        if (batch.length === 0) {
+            return;
+        }
+        lastId = batch[batch.length - 1]._id;
+
+        const batchIds = batch.map((card) => card._id);
+        // the multikey index on StudySet.cards answers this without scanning every set
+        const referencedCards = await StudySet.aggregate([
+            {$match: {cards: {$in: batchIds}}},
+            {$unwind: "$cards"},
+            {$match: {cards: {$in: batchIds}}},
+            {$group: {_id: "$cards"}}
+        ]);
+        const referencedIds = new Set(referencedCards.map((card) => card._id.toString()));
+        const orphanedCards = batch.filter((card) => !referencedIds.has(card._id.toString()));
+        if (orphanedCards.length === 0) {
+            continue;
+        }
+        if (!dryRun) {
+            await Flashcard.deleteMany({_id: {$in: orphanedCards.map((card) => card._id)}});
+            await Promise.all(orphanedCards.map((card) => MediaService.deleteCardFile(card.file)));
+        }
+        for (let i = 0; i < orphanedCards.length; i++) {
+            report.cardsRemoved++;
+            report.cardBytes += orphanedCards[i].documentSize;
+            const file = orphanedCards[i].file;
+            if (file === undefined) {
+                continue;
+            }
+            // the card's file and the media optimizer's copies of it
+            for (const storedFile of [file, file.optimized, file.thumbnail]) {
+                if (storedFile !== undefined && storedFile.fileId !== undefined) {
+                    report.filesRemoved++;
+                    report.fileBytes += storedFile.size || 0;
+                    countedFileIds.add(storedFile.fileId.toString());
+                }
+            }
+        }
+    }
+}
+
+// walks every stored file uploaded before cutoff, removing the ones that no flashcard references
+async function collectOrphanedFiles(batchSize, cutoff, dryRun, report, countedFileIds) {
+    let lastId = null;
+    while (true) {
+        const batch = await MediaService.listStoredFiles(lastId, batchSize, cutoff);
+        if (batch.length === 0) {
+            return;
+        }
+        lastId = batch[batch.length - 1]._id;
+
+        const batchIds = batch.map((file) => file._id);
+        // a stored file is either a card's file or one of the media optimizer's copies of it
+        const referencingCards = await Flashcard.find({$or: [{"file.fileId": {$in: batchIds}}, {"file.optimized.fileId": {$in: batchIds}}, {"file.thumbnail.fileId": {$in: batchIds}}]},
+                                                      {"file.fileId": 1, "file.optimized.fileId": 1, "file.thumbnail.fileId": 1}).lean();
+        const referencedIds = new Set(referencingCards.flatMap((card) => MediaService.cardFileIds(card.file).map((fileId) => fileId.toString())));
+        const orphanedFiles = batch.filter((file) => !referencedIds.has(file._id.toString()) && !countedFileIds.has(file._id.toString()));
+        if (!dryRun) {
+            await Promise.all(orphanedFiles.map((file) => MediaService.deleteFile(file._id)));
+        }
+        for (let i = 0; i < orphanedFiles.length; i++) {
+            report.filesRemoved++;
+            report.fileBytes += orphanedFiles[i].length;
+        }
+    }
+}
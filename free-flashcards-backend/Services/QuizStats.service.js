@@ -0,0 +1,78 @@
+const RECENT_SCORE_COUNT = 10; // how many of a set's latest scores are kept on the set itself
+const MOVING_AVERAGE_WEIGHT = 0.2; // how much each new score moves the exponential moving average
+
+// Works out a study set's quiz aggregates. Storing the attempts themselves is up to the repository (see Repositories/Repository.js)
+
+module.exports = {
+
+    // returns the update the Mongo repository applies to add one score to a set's quizStats, so the db does the arithmetic in a single atomic step
+    buildStatsUpdate : buildStatsUpdate,
+
+    // returns a set's quizStats with one more score added, the same arithmetic as buildStatsUpdate for stats that are kept in memory
+    addScore : (stats, score) => {
+        const attemptCount = (stats?.attemptCount ?? 0) + 1;
+        const totalScore = (stats?.totalScore ?? 0) + score;
+        return {
+            attemptCount: attemptCount,
+            totalScore: totalScore,
+            meanScore: totalScore / attemptCount,
+            bestScore: Math.max(stats?.bestScore ?? score, score),
+            recentScores: [...(stats?.recentScores ?? []), score].slice(-RECENT_SCORE_COUNT),
+            // the first attempt starts the moving average at its own score
+            movingAverage: MOVING_AVERAGE_WEIGHT * score + (1 - MOVING_AVERAGE_WEIGHT) * (stats?.movingAverage ?? score)
+        };
+    },
+
+    // folds a list of scores (oldest first) into existing stats, used to bring quiz scores stored on the set into the aggregates
+    // the result matches what recording each score in order would give, except the moving average which weights the existing stats as the most recent
+    foldScores : (stats, scores) => {
+        let folded = {
+            attemptCount: (stats?.attemptCount ?? 0) + scores.length,
+            totalScore: (stats?.totalScore ?? 0) + scores.reduce((total, score) => total + score, 0),
+            bestScore: stats?.bestScore ?? null,
+            recentScores: [...scores, ...(stats?.recentScores ?? [])].slice(-RECENT_SCORE_COUNT),
+            movingAverage: null
+        };
+        let movingAverage = null;
+        for (let i = 0; i < scores.length; i++) {
+            folded.bestScore = folded.bestScore === null ? scores[i] : Math.max(folded.bestScore, scores[i]);
+            movingAverage = movingAverage === null ? scores[i] : MOVING_AVERAGE_WEIGHT * scores[i] + (1 - MOVING_AVERAGE_WEIGHT) * movingAverage;
+        }
+        const existingAverage = stats?.movingAverage ?? null;
+        folded.movingAverage = existingAverage !== null ? existingAverage : movingAverage;
+        folded.meanScore = folded.attemptCount === 0 ? null : folded.totalScore / folded.attemptCount;
+        return folded;
+    },
+
+    describeStats : describeStats
+}
+
+// this function builds the pipeline update that adds one score to a set's quizStats
+// each $ifNull covers sets that were created before quizStats existed
+function buildStatsUpdate(score) {
+    const stats = "$quizStats";
+    return [
+        {$set: { // every expression in this stage reads the stats as they were before this attempt
+            __v: {$add: [{$ifNull: ["$__v", 0]}, 1]}, // the set's version is part of its ETag, so it changes with its stats
+            "quizStats.attemptCount": {$add: [{$ifNull: [`${stats}.attemptCount`, 0]}, 1]},
+            "quizStats.totalScore": {$add: [{$ifNull: [`${stats}.totalScore`, 0]}, score]},
+            "quizStats.bestScore": {$max: [{$ifNull: [`${stats}.bestScore`, score]}, score]},
+            "quizStats.recentScores": {$slice: [{$concatArrays: [{$ifNull: [`${stats}.recentScores`, []]}, [score]]}, -RECENT_SCORE_COUNT]},
+            // the first attempt starts the moving average at its own score
+            "quizStats.movingAverage": {$add: [{$multiply: [MOVING_AVERAGE_WEIGHT, score]},
+                                               {$multiply: [1 - MOVING_AVERAGE_WEIGHT, {$ifNull: [`${stats}.movingAverage`, score]}]}]}
+        }},
+        {$set: {"quizStats.meanScore": {$divide: ["$quizStats.totalScore", "$quizStats.attemptCount"]}}}
+    ];
+}
+
+// this function gives the stats we send to clients, filling in a set that has never been quizzed
+function describeStats(stats) {
+    return {
+        attemptCount: stats?.attemptCount ?? 0,
+        meanScore: stats?.meanScore ?? null,
+        bestScore: stats?.bestScore ?? null,
+        recentScores: stats?.recentScores ?? [],
+        movingAverage: stats?.movingAverage ?? null
+    };
+}
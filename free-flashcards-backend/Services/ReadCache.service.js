@@ -0,0 +1,178 @@
+// An in-process LRU cache of serialized GET responses for study sets and flashcards, bounded by the total size of the cached bodies
+// Keys are namespaced by what they hold: "set:<id>", "card:<id>" and "sets:<query>" for pages of GET /sets
+// every write path invalidates the keys it affects, so a cached body is always the document as of its last write
+// in cluster mode each worker has its own cache, so invalidations are passed on to the other workers through the primary (see cluster.js)
+const cluster = require("cluster");
+const Compression = require("../Middleware/Compression.middleware");
+
+const DEFAULT_MAX_BYTES = 16 * 1024 * 1024; // READ_CACHE_MAX_BYTES in the .env file overrides this, 0 turns the cache off
+// scripts (e.g. Scripts/migrateEmbeddedFiles.js) write to the db from another process where we can't invalidate, so entries expire after this long
+const DEFAULT_MAX_AGE_MS = 5 * 60 * 1000;
+
+const configuredMaxBytes = parseInt(process.env.READ_CACHE_MAX_BYTES);
+const maxBytes = Number.isInteger(configuredMaxBytes) && configuredMaxBytes >= 0 ? configuredMaxBytes : DEFAULT_MAX_BYTES;
+const configuredMaxAge = parseInt(process.env.READ_CACHE_MAX_AGE_MS);
+const maxAgeMs = configuredMaxAge > 0 ? configuredMaxAge : DEFAULT_MAX_AGE_MS;
+const INVALIDATION_MESSAGE = "read-cache-invalidation";
+
+let entries = new Map(); // key -> {key, body, bodyBytes, etag, encodedBodies, size, storedAt}. A Map iterates in insertion order, so re-inserting on every hit keeps the least recently used entry first
+let cachedBytes = 0;
+// bumped by every invalidation. A read that started before an invalidation may have fetched the old document, so it isn't cached
+let generation = 0;
+let counters = {}; // namespace -> {hits, misses}
+let evictions = 0;
+
+// define the needed functions in the module's exports
+module.exports = {
+
+    // returns the cached entry ({body, etag}) for key, or undefined if it isn't cached
+    get : (key) => {
+        const entry = entries.get(key);
+        const namespaceCounters = getCounters(key);
+        if (entry === undefined || Date.now() - entry.storedAt > maxAgeMs) {
+            if (entry !== undefined) {
+                removeEntry(key);
+            }
+            namespaceCounters.misses++;
+            return undefined;
+        }
+        namespaceCounters.hits++;
+        entries.delete(key); // moving the entry to the most recently used end
+        entries.set(key, entry);
+        return entry;
+    },
+
+    // returns a token to pass to set once the document has been read, call it before reading from the db
+    startRead : () => {
+        return generation;
+    },
+
+    // caches body under key unless something was invalidated since readToken was taken, and returns the entry to send either way
+    set : (key, readToken, body, etag) => {
+        const bodyBytes = Buffer.byteLength(body);
+        // encodedBodies holds the body compressed with each encoding it has been sent with, so hits don't compress it again
+        const entry = {key: key, body: body, bodyBytes: bodyBytes, etag: etag, encodedBodies: {}, size: bodyBytes + key.length, storedAt: Date.now()};
+        if (readToken !== generation || entry.size > maxBytes) {
+            return entry;
+        }
+        removeEntry(key);
+        entries.set(key, entry);
+        cachedBytes += entry.size;
+        evictToFit();
+        return entry;
+    },
+
+    // removes the cached entries for every key given, in every worker
+    invalidate : (...keys) => {
+        invalidateKeys(keys);
+        sendToOtherWorkers({keys: keys});
+    },
+
+    // removes every cached entry whose key starts with prefix, e.g. every page of GET /sets, in every worker
+    invalidatePrefix : (prefix) => {
+        invalidateKeyPrefix(prefix);
+        sendToOtherWorkers({prefix: prefix});
+    },
+
+    // sends a cached entry as a json response, or a 304 if the client already has this version of it
+    // the body is compressed the same way the Compression middleware would, but only once per encoding for as long as the entry is cached
+    sendEntry : (request, response, entry) => {
+        response.set("ETag", entry.etag);
+        response.set("Cache-Control", "no-cache"); // the document can change at any time, so clients must check back with us before reusing it
+        if (request.fresh) { // request.fresh compares If-None-Match against the ETag we set
+            response.status(304).end();
+            return;
+        }
+        response.type("json");
+        response.vary("Accept-Encoding");
+        const encoding = entry.bodyBytes >= Compression.COMPRESSION_THRESHOLD ? Compression.negotiateEncoding(request) : null;
+        if (encoding === null) {
+            response.send(entry.body);
+            return;
+        }
+        if (entry.encodedBodies[encoding] === undefined) {
+            const encodedBody = Compression.compressBody(Buffer.from(entry.body), encoding);
+            entry.encodedBodies[encoding] = encodedBody;
+            if (entries.get(entry.key) === entry) { // the compressed copy counts towards the cache's size too
+                entry.size += encodedBody.length;
+                cachedBytes += encodedBody.length;
+                evictToFit();
+            }
+        }
+        response.set("Content-Encoding", encoding);
+        response.send(entry.encodedBodies[encoding]);
+    },
+
+    // reports how well the cache is doing so its size can be tuned, hit rates are per namespace
+    getStats : () => {
+        let namespaces = {};
+        for (const [namespace, {hits, misses}] of Object.entries(counters)) {
+            namespaces[namespace] = {hits: hits, misses: misses, hitRate: hits + misses === 0 ? null : hits / (hits + misses)};
+        }
+        return {entries: entries.size, bytes: cachedBytes, maxBytes: maxBytes, maxAgeMs: maxAgeMs, evictions: evictions, namespaces: namespaces};
+    }
+}
+
+// invalidations made by other workers
+if (cluster.isWorker) {
+    process.on("message", (message) => {
+        if (message === null || typeof message !== "object" || message.type !== INVALIDATION_MESSAGE) {
+            return;
+        }
+        if (message.keys !== undefined) {
+            invalidateKeys(message.keys);
+        } else {
+            invalidateKeyPrefix(message.prefix);
+        }
+    });
+}
+
+function invalidateKeys(keys) {
+    generation++;
+    for (const key of keys) {
+        removeEntry(key);
+    }
+}
+
+function invalidateKeyPrefix(prefix) {
+    generation++;
+    for (const key of [...entries.keys()]) {
+        if (key.startsWith(prefix)) {
+            removeEntry(key);
+        }
+    }
+}
+
+// this function asks the primary to relay an invalidation to every other worker, it does nothing when this process isn't a cluster worker
+function sendToOtherWorkers(invalidation) {
+    if (cluster.isWorker && process.connected) {
+        process.send({type: INVALIDATION_MESSAGE, relay: true, ...invalidation});
+    }
+}
+
+// this function evicts entries from the least recently used end until the cache fits inside its size bound
+function evictToFit() {
+    for (const [oldestKey] of entries) {
+        if (cachedBytes <= maxBytes) {
+            break;
+        }
+        removeEntry(oldestKey);
+        evictions++;
+    }
+}
+
+function removeEntry(key) {
+    const entry = entries.get(key);
+    if (entry !== undefined) {
+        cachedBytes -= entry.size;
+        entries.delete(key);
+    }
+}
+
+function getCounters(key) {
+    const namespace = key.slice(0, key.indexOf(":"));
+    if (counters[namespace] === undefined) {
+        counters[namespace] = {hits: 0, misses: 0};
+    }
+    return counters[namespace];
+}
@@ -0,0 +1,102 @@
+const mongoose = require("mongoose");
+const Flashcard = require("../Models/Flashcard.model");
+const StudySet = require("../Models/StudySet.model");
+
+// Builds a JSON serializer for each model from its schema once, when this module loads, rather than having JSON.stringify discover
+// every document's shape at runtime. Each serializer only writes the schema's fields, in schema order, and leaves out fields that are
+// never sent to clients: ones that are select: false (e.g. a card's embedded file data) and the version key, which clients get through the
+// ETag instead (see ReadCache.service.js). Lean documents are serialized as they are, hydrated ones are converted with toObject() first
+
+// define the needed functions in the module's exports
+module.exports = {
+
+    serializeCard : compileSerializer(Flashcard.schema),
+
+    serializeSet : compileSerializer(StudySet.schema),
+
+    // the body our error handler sends, {error: {status, message}}
+    serializeError : (status, message) => {
+        return `{"error":{"status":${Number(status)},"message":${JSON.stringify(String(message))}}}`;
+    },
+
+    compileSerializer : compileSerializer
+}
+
+// this function returns a function that turns a document of the given schema into a JSON string
+function compileSerializer(schema) {
+    // the schema's paths are dotted (e.g. "file.optimized.fileId"), so we rebuild them into a tree of nested fields
+    let root = {children: new Map(), schemaType: null};
+    const paths = Object.entries(schema.paths).filter(([path, schemaType]) => path !== schema.options.versionKey && schemaType.options.select !== false);
+    paths.sort(([first], [second]) => (second === "_id") - (first === "_id")); // _id is listed last in the schema but sent first
+    for (const [path, schemaType] of paths) {
+        let node = root;
+        for (const part of path.split(".")) {
+            if (!node.children.has(part)) {
+                node.children.set(part, {children: new Map(), schemaType: null});
+            }
+            node = node.children.get(part);
+        }
+        node.schemaType = schemaType;
+    }
+    const serializeRoot = compileNode(root);
+    return (document) => {
+        if (document instanceof mongoose.Document) {
+            document = document.toObject();
+        }
+        return serializeRoot(document);
+    };
+}
+
+// this function compiles a serializer for one node of the field tree, either an object of nested fields or a single typed value
+// serializers are only called for values that aren't undefined
+function compileNode(node) {
+    if (node.schemaType !== null) {
+        return compileValue(node.schemaType);
+    }
+    const fields = [...node.children].map(([name, child]) => ({name: name, prefix: `${JSON.stringify(name)}:`, serialize: compileNode(child)}));
+    return (object) => {
+        if (object === null || typeof object !== "object") { // data that doesn't match the schema is written as it is
+            return JSON.stringify(object);
+        }
+        let json = "";
+        for (let i = 0; i < fields.length; i++) {
+            const value = object[fields[i].name];
+            if (value === undefined) { // JSON.stringify leaves these out too
+                continue;
+            }
+            json += (json === "" ? "" : ",") + fields[i].prefix + fields[i].serialize(value);
+        }
+        return `{${json}}`;
+    };
+}
+
+// this function compiles a serializer for a single value of the given schema type
+function compileValue(schemaType) {
+    switch (schemaType.instance) {
+        case "String":
+            return (value) => value === null ? "null" : JSON.stringify(value);
+        case "Number":
+            return (value) => typeof value === "number" ? (Number.isFinite(value) ? String(value) : "null") : JSON.stringify(value ?? null);
+        case "Boolean":
+            return (value) => value === true ? "true" : value === false ? "false" : JSON.stringify(value ?? null);
+        case "ObjectId": // an objectid's hex string never needs escaping
+            return (value) => value instanceof mongoose.Types.ObjectId ? `"${value.toHexString()}"` : JSON.stringify(value ?? null);
+        case "Date":
+            return (value) => value instanceof Date ? JSON.stringify(value) : JSON.stringify(value ?? null);
+        case "Array": {
+            const serializeElement = compileValue(schemaType.caster);
+            return (value) => {
+                if (!Array.isArray(value)) {
+                    return JSON.stringify(value ?? null);
+                }
+                let json = "";
+                for (let i = 0; i < value.length; i++) {
+                    json += (i === 0 ? "" : ",") + serializeElement(value[i]);
+                }
+                return `[${json}]`;
+            };
+        }
+        default: // Buffers and anything else we don't compile a serializer for
+            return (value) => JSON.stringify(value ?? null);
+    }
+}
@@ -0,0 +1,55 @@
+const mongoose = require("mongoose");
+const Config = require("../config");
+
+let shuttingDown = false;
+
+// define the needed functions in the module's exports
+module.exports = {
+
+    // true once the process has been asked to stop
+    isShuttingDown : () => {
+        return shuttingDown;
+    },
+
+    // tells keep-alive clients to reconnect elsewhere once we're shutting down, so their connections don't hold the server open
+    closeConnectionsOnShutdown : () => (request, response, next) => {
+        if (shuttingDown) {
+            response.set("Connection", "close");
+        }
+        next();
+    },
+
+    // shuts the process down gracefully on SIGTERM or SIGINT: the server stops accepting connections, requests already in flight
+    // (including uploads) are allowed to finish, and then the db connection is closed
+    // if that takes longer than SHUTDOWN_TIMEOUT_MS the process exits anyway
+    handleShutdownSignals : (server) => {
+        const shutdown = (signal) => {
+            if (shuttingDown) { // e.g. ctrl-c in a terminal sends SIGINT to cluster.js and to every worker, and cluster.js sends them SIGTERM too
+                return;
+            }
+            shuttingDown = true;
+            console.log(`${signal} received, closing the server once its in-flight requests finish`);
+            const forcedExit = setTimeout(() => {
+                console.log(`in-flight requests didn't finish within ${Config.shutdownTimeoutMs} ms, exiting anyway`);
+                process.exit(1);
+            }, Config.shutdownTimeoutMs);
+            forcedExit.unref();
+
+            server.close(() => {
+                if (mongoose.connection.readyState !== mongoose.ConnectionStates.connected) {
+                    process.exit(0); // closing waits for a connection attempt to the db to time out, and there's nothing to flush
+                }
+                mongoose.connection.close().then(() => {
+                    console.log('Mongoose is disconnected due to app termination');
+                    process.exit(0);
+                }).catch((error) => {
+                    console.log(error.message);
+                    process.exit(1);
+                });
+            });
+            server.closeIdleConnections(); // keep-alive connections between requests would otherwise keep server.close waiting
+        };
+        process.on("SIGTERM", () => shutdown("SIGTERM"));
+        process.on("SIGINT", () => shutdown("SIGINT"));
+    }
+}
@@ -0,0 +1,37 @@
+const mongoose = require("mongoose");
+
+// transactions need a replica set, but the development setup is a standalone server. We find out which one we're talking to the first time we try
+let transactionsSupported = null;
+
+module.exports = {
+
+    // runs work(session) inside a transaction when the server supports them, otherwise runs work(undefined) with no session
+    // on a standalone server nothing is rolled back if work throws, so callers must still clean up their own writes on failure
+    runInTransaction : async (work) => {
+        if (transactionsSupported === false) {
+            return work(undefined);
+        }
+        const session = await mongoose.startSession();
+        try {
+            let result;
+            await session.withTransaction(async () => {
+                result = await work(session);
+            });
+            transactionsSupported = true;
+            return result;
+        } catch (error) {
+            if (transactionsSupported === null && isTransactionUnsupported(error)) { // the server rejected the transaction before anything was written
+                transactionsSupported = false;
+                return work(undefined);
+            }
+            throw error;
+        } finally {
+            await session.endSession();
+        }
+    }
+}
+
+// standalone servers reject the first write that carries a transaction number with an IllegalOperation error
+function isTransactionUnsupported(error) {
+    return error.code === 20 || (typeof error.message === "string" && error.message.includes("Transaction numbers are only allowed"));
+}
@@ -0,0 +1,713 @@
+// Reads and writes the media formats the optimizer works with. Everything here is synchronous and CPU bound, so it only runs inside
+// the media optimizer's worker threads (see Services/MediaOptimizer.service.js), never on the thread serving requests
+const zlib = require("zlib");
+
+const THUMBNAIL_SIZE = 160; // thumbnails fit inside a square this many pixels wide
+const MAX_PIXELS = 4096 * 4096; // a small compressed file can describe a huge image, so we refuse to decode anything bigger than this
+const PNG_SIGNATURE = Buffer.from([0x89, 0x50, 0x4E, 0x47, 0x0D, 0x0A, 0x1A, 0x0A]);
+// chunks that change how a PNG's colors are displayed, we copy these into anything we encode from the PNG so its colors stay the same
+const PNG_COLOR_CHUNKS = new Set(["gAMA", "cHRM", "sRGB", "iCCP"]);
+
+module.exports = {
+
+    THUMBNAIL_SIZE : THUMBNAIL_SIZE,
+
+    // works out everything the optimizer records about a file. It returns {width, height, duration, optimized, thumbnail}, where
+    // optimized is a smaller lossless copy of the file ({data, fileType}) and thumbnail a downscaled copy ({data, fileType, width, height})
+    // anything that doesn't apply to the file or that we can't work out is null
+    optimizeMedia : (data, fileType) => {
+        let result = {width: null, height: null, duration: null, optimized: null, thumbnail: null};
+        if (fileType.startsWith("audio/")) { // we can't re-encode audio losslessly into something smaller, so we only record its length
+            result.duration = readAudioDuration(data, fileType);
+            return result;
+        }
+
+        let image = null; // the decoded pixels, only for formats we can decode
+        let colorChunks = [];
+        let reencode = false;
+        if (fileType === "image/bmp") {
+            image = decodeBmp(data);
+            reencode = true; // BMPs are almost never compressed, so any PNG of them is smaller
+        } else if (fileType === "image/png") {
+            const decoded = decodePng(data);
+            if (decoded !== null) {
+                image = decoded.image;
+                colorChunks = decoded.colorChunks;
+                reencode = !decoded.animated; // re-encoding an animated PNG would only keep its first frame
+            }
+        }
+
+        const size = image !== null ? {width: image.width, height: image.height} : readImageSize(data, fileType);
+        if (size !== null) {
+            result.width = size.width;
+            result.height = size.height;
+        }
+        if (image === null) {
+            return result;
+        }
+        if (reencode) {
+            const encoded = encodePng(image, colorChunks);
+            if (encoded.length < data.length) { // a file that's already well compressed may not get any smaller
+                result.optimized = {data: encoded, fileType: "image/png"};
+            }
+        }
+        if (Math.max(image.width, image.height) > THUMBNAIL_SIZE) {
+            const thumbnail = scaleImage(image, THUMBNAIL_SIZE);
+            result.thumbnail = {data: encodePng(thumbnail, colorChunks), fileType: "image/png", width: thumbnail.width, height: thumbnail.height};
+        }
+        return result;
+    },
+
+    decodeBmp : decodeBmp,
+    decodePng : decodePng,
+    encodePng : encodePng,
+    scaleImage : scaleImage,
+    readAudioDuration : readAudioDuration
+}
+
+// ---------- images ----------
+// decoded images are {width, height, pixels}, where pixels holds 4 bytes (red, green, blue, alpha) per pixel starting from the top left
+
+// this function decodes an uncompressed BMP, it returns null for BMPs it doesn't support (e.g. run length encoded ones)
+function decodeBmp(data) {
+    if (data.length < 54 || data.toString("latin1", 0, 2) !== "BM") {
+        return null;
+    }
+    const pixelOffset = data.readUInt32LE(10);
+    const headerSize = data.readUInt32LE(14);
+    if (headerSize < 40) { // OS/2 BMPs have a smaller header we don't read
+        return null;
+    }
+    const width = data.readInt32LE(18);
+    const height = Math.abs(data.readInt32LE(22));
+    const topDown = data.readInt32LE(22) < 0; // rows are normally stored bottom up
+    const bitsPerPixel = data.readUInt16LE(28);
+    const compression = data.readUInt32LE(30);
+    if (width <= 0 || height === 0 || width * height > MAX_PIXELS) {
+        return null;
+    }
+
+    let masks = null; // red, green, blue and alpha bit masks for 16 and 32 bit pixels
+    let palette = null;
+    if (compression === 3 && (bitsPerPixel === 16 || bitsPerPixel === 32)) { // the masks follow the header fields we read above
+        if (data.length < 66) {
+            return null;
+        }
+        masks = [data.readUInt32LE(54), data.readUInt32LE(58), data.readUInt32LE(62), headerSize >= 56 ? data.readUInt32LE(66) : 0];
+    } else if (compression !== 0) {
+        return null;
+    } else if (bitsPerPixel === 16) {
+        masks = [0x7C00, 0x03E0, 0x001F, 0]; // 5 bits per channel
+    } else if (bitsPerPixel === 1 || bitsPerPixel === 4 || bitsPerPixel === 8) {
+        const colorCount = data.readUInt32LE(46) || (1 << bitsPerPixel);
+        const paletteOffset = 14 + headerSize;
+        if (paletteOffset + colorCount * 4 > data.length) {
+            return null;
+        }
+        palette = [];
+        for (let i = 0; i < colorCount; i++) { // each palette entry is blue, green, red and an unused byte
+            const entry = paletteOffset + i * 4;
+            palette.push([data[entry + 2], data[entry + 1], data[entry]]);
+        }
+    } else if (bitsPerPixel !== 24 && bitsPerPixel !== 32) {
+        return null;
+    }
+
+    const rowSize = Math.floor((bitsPerPixel * width + 31) / 32) * 4; // rows are padded to a multiple of 4 bytes
+    if (pixelOffset + rowSize * height > data.length) {
+        return null;
+    }
+    let pixels = Buffer.alloc(width * height * 4);
+    for (let y = 0; y < height; y++) {
+        const rowStart = pixelOffset + (topDown ? y : height - 1 - y) * rowSize;
+        for (let x = 0; x < width; x++) {
+            const target = (y * width + x) * 4;
+            if (palette !== null) {
+                const bitOffset = x * bitsPerPixel;
+                const index = (data[rowStart + (bitOffset >> 3)] >> (8 - bitsPerPixel - (bitOffset & 7))) & ((1 << bitsPerPixel) - 1);
+                const color = index < palette.length ? palette[index] : [0, 0, 0];
+                pixels[target] = color[0];
+                pixels[target + 1] = color[1];
+                pixels[target + 2] = color[2];
+                pixels[target + 3] = 255;
+            } else if (masks !== null) {
+                const value = bitsPerPixel === 16 ? data.readUInt16LE(rowStart + x * 2) : data.readUInt32LE(rowStart + x * 4);
+                pixels[target] = readMaskedChannel(value, masks[0]);
+                pixels[target + 1] = readMaskedChannel(value, masks[1]);
+                pixels[target + 2] = readMaskedChannel(value, masks[2]);
+                pixels[target + 3] = masks[3] === 0 ? 255 : readMaskedChannel(value, masks[3]);
+            } else { // 24 and 32 bit pixels are stored blue, green, red (and an unused byte)
+                const source = rowStart + x * (bitsPerPixel / 8);
+                pixels[target] = data[source + 2];
+                pixels[target + 1] = data[source + 1];
+                pixels[target + 2] = data[source];
+                pixels[target + 3] = 255;
+            }
+        }
+    }
+    return {width: width, height: height, pixels: pixels};
+}
+
+// this function scales the bits of value selected by mask to a 0-255 channel value
+function readMaskedChannel(value, mask) {
+    if (mask === 0) {
+        return 0;
+    }
+    let shift = 0;
+    while (((mask >>> shift) & 1) === 0) {
+        shift++;
+    }
+    const maximum = mask >>> shift;
+    return Math.round((((value & mask) >>> shift) * 255) / maximum);
+}
+
+// this function decodes a non-interlaced 8 bit PNG, it returns null for PNGs it doesn't support
+// it also returns the chunks describing the PNG's colors and whether the PNG is animated
+function decodePng(data) {
+    const chunks = readPngChunks(data);
+    if (chunks === null || chunks.length === 0 || chunks[0].type !== "IHDR") {
+        return null;
+    }
+    const header = chunks[0].data;
+    const width = header.readUInt32BE(0);
+    const height = header.readUInt32BE(4);
+    const bitDepth = header[8];
+    const colorType = header[9];
+    const interlaced = header[12] !== 0;
+    const channelCounts = {0: 1, 2: 3, 3: 1, 4: 2, 6: 4}; // grayscale, RGB, palette, grayscale + alpha, RGB + alpha
+    const channels = channelCounts[colorType];
+    // palette and grayscale PNGs can pack several pixels into a byte, 16 bit PNGs aren't supported
+    const validDepth = bitDepth === 8 || ((colorType === 0 || colorType === 3) && [1, 2, 4].includes(bitDepth));
+    if (!validDepth || interlaced || channels === undefined || width === 0 || height === 0 || width * height > MAX_PIXELS) {
+        return null;
+    }
+
+    let palette = null;
+    let transparency = null;
+    let compressedData = [];
+    let colorChunks = [];
+    let animated = false;
+    for (let i = 1; i < chunks.length; i++) {
+        const chunk = chunks[i];
+        if (chunk.type === "PLTE") {
+            palette = chunk.data;
+        } else if (chunk.type === "tRNS") {
+            transparency = chunk.data;
+        } else if (chunk.type === "IDAT") {
+            compressedData.push(chunk.data);
+        } else if (chunk.type === "acTL") {
+            animated = true;
+        } else if (PNG_COLOR_CHUNKS.has(chunk.type)) {
+            colorChunks.push(chunk);
+        }
+    }
+    if (colorType === 3 && palette === null) {
+        return null;
+    }
+
+    const rowSize = Math.ceil((width * channels * bitDepth) / 8);
+    let scanlines;
+    try { // limiting the output stops a tiny file from inflating into more memory than its dimensions allow
+        scanlines = zlib.inflateSync(Buffer.concat(compressedData), {maxOutputLength: (rowSize + 1) * height});
+    } catch (error) {
+        return null;
+    }
+    if (scanlines.length < (rowSize + 1) * height) {
+        return null;
+    }
+    let samples = unfilterScanlines(scanlines, rowSize, height, Math.max(1, (channels * bitDepth) / 8));
+    if (samples === null) {
+        return null;
+    }
+    if (bitDepth < 8) {
+        samples = unpackSamples(samples, width, height, rowSize, bitDepth, colorType === 0);
+    }
+
+    let pixels = Buffer.alloc(width * height * 4);
+    for (let i = 0; i < width * height; i++) {
+        const source = i * channels;
+        const target = i * 4;
+        if (colorType === 3) {
+            const index = samples[source];
+            pixels[target] = palette[index * 3] || 0;
+            pixels[target + 1] = palette[index * 3 + 1] || 0;
+            pixels[target + 2] = palette[index * 3 + 2] || 0;
+            pixels[target + 3] = transparency !== null && index < transparency.length ? transparency[index] : 255;
+        } else if (colorType === 0 || colorType === 4) {
+            pixels[target] = pixels[target + 1] = pixels[target + 2] = samples[source];
+            pixels[target + 3] = colorType === 4 ? samples[source + 1] : 255;
+            if (colorType === 0 && transparency !== null && transparency.length >= 2 && samples[source] === Math.round((transparency.readUInt16BE(0) * 255) / ((1 << bitDepth) - 1))) {
+                pixels[target + 3] = 0;
+            }
+        } else {
+            pixels[target] = samples[source];
+            pixels[target + 1] = samples[source + 1];
+            pixels[target + 2] = samples[source + 2];
+            pixels[target + 3] = colorType === 6 ? samples[source + 3] : 255;
+            if (colorType === 2 && transparency !== null && transparency.length >= 6 && samples[source] === transparency.readUInt16BE(0) &&
+                samples[source + 1] === transparency.readUInt16BE(2) && samples[source + 2] === transparency.readUInt16BE(4)) {
+                pixels[target + 3] = 0;
+            }
+        }
+    }
+    return {image: {width: width, height: height, pixels: pixels}, colorChunks: colorChunks, animated: animated};
+}
+
+// this function spreads samples packed several to a byte out to one byte each. Grayscale samples are scaled up to the 0-255 range
+// (palette indexes are left as they are)
+function unpackSamples(packed, width, height, rowSize, bitDepth, grayscale) {
+    let samples = Buffer.alloc(width * height);
+    const mask = (1 << bitDepth) - 1;
+    const pixelsPerByte = 8 / bitDepth;
+    for (let y = 0; y < height; y++) {
+        for (let x = 0; x < width; x++) {
+            const shift = 8 - bitDepth * (1 + (x % pixelsPerByte));
+            const value = (packed[y * rowSize + Math.floor(x / pixelsPerByte)] >> shift) & mask;
+            samples[y * width + x] = grayscale ? Math.round((value * 255) / mask) : value;
+        }
+    }
+    return samples;
+}
+
+// this function splits a PNG into its chunks ({type, data}), it returns null if the file isn't a well formed PNG
+function readPngChunks(data) {
+    if (data.length < 8 || !data.subarray(0, 8).equals(PNG_SIGNATURE)) {
+        return null;
+    }
+    let chunks = [];
+    let offset = 8;
+    while (offset + 12 <= data.length) {
+        const length = data.readUInt32BE(offset);
+        const type = data.toString("latin1", offset + 4, offset + 8);
+        if (offset + 12 + length > data.length) {
+            return null;
+        }
+        chunks.push({type: type, data: data.subarray(offset + 8, offset + 8 + length)});
+        offset += 12 + length; // length, type, data and crc
+        if (type === "IEND") {
+            break;
+        }
+    }
+    return chunks;
+}
+
+// this function reverses the per row filters of a PNG, returning the raw samples without each row's filter byte
+function unfilterScanlines(scanlines, rowSize, height, bytesPerPixel) {
+    let samples = Buffer.alloc(rowSize * height);
+    for (let y = 0; y < height; y++) {
+        const filter = scanlines[y * (rowSize + 1)];
+        const source = y * (rowSize + 1) + 1;
+        const row = y * rowSize;
+        const previousRow = row - rowSize;
+        for (let x = 0; x < rowSize; x++) {
+            const left = x >= bytesPerPixel ? samples[row + x - bytesPerPixel] : 0;
+            const up = y > 0 ? samples[previousRow + x] : 0;
+            const upLeft = y > 0 && x >= bytesPerPixel ? samples[previousRow + x - bytesPerPixel] : 0;
+            let predictor;
+            switch (filter) {
+                case 0: predictor = 0; break;
+                case 1: predictor = left; break;
+                case 2: predictor = up; break;
+                case 3: predictor = (left + up) >> 1; break;
+                case 4: predictor = paethPredictor(left, up, upLeft); break;
+                default: return null;
+            }
+            samples[row + x] = (scanlines[source + x] + predictor) & 0xFF;
+        }
+    }
+    return samples;
+}
+
+function paethPredictor(left, up, upLeft) {
+    const estimate = left + up - upLeft;
+    const leftDistance = Math.abs(estimate - left);
+    const upDistance = Math.abs(estimate - up);
+    const upLeftDistance = Math.abs(estimate - upLeft);
+    if (leftDistance <= upDistance && leftDistance <= upLeftDistance) {
+        return left;
+    }
+    return upDistance <= upLeftDistance ? up : upLeft;
+}
+
+// this function encodes an image as a PNG without losing any information, picking the smallest pixel format that can hold every color in it
+// extraChunks (e.g. a color profile) are written before the image data
+function encodePng(image, extraChunks = []) {
+    const { width, height, pixels } = image;
+    const palette = buildPalette(pixels);
+    let opaque = true;
+    for (let i = 3; i < pixels.length; i += 4) {
+        if (pixels[i] !== 255) {
+            opaque = false;
+            break;
+        }
+    }
+
+    let colorType;
+    let bitDepth = 8;
+    let rowSize;
+    let bytesPerPixel; // how far back the filters look for the "left" byte
+    let chunks = [];
+    let scanlines;
+    if (palette !== null) { // few enough colors that each pixel can be an index into a palette
+        colorType = 3;
+        bitDepth = palette.colors.length <= 2 ? 1 : palette.colors.length <= 4 ? 2 : palette.colors.length <= 16 ? 4 : 8;
+        rowSize = Math.ceil((width * bitDepth) / 8);
+        bytesPerPixel = 1;
+        let paletteData = Buffer.alloc(palette.colors.length * 3);
+        let transparency = [];
+        for (let i = 0; i < palette.colors.length; i++) {
+            const color = palette.colors[i];
+            paletteData[i * 3] = color >>> 24;
+            paletteData[i * 3 + 1] = (color >>> 16) & 0xFF;
+            paletteData[i * 3 + 2] = (color >>> 8) & 0xFF;
+            transparency.push(color & 0xFF);
+        }
+        chunks.push({type: "PLTE", data: paletteData});
+        if (!opaque) { // transparent colors are sorted first, so we can leave the trailing opaque entries out
+            const lastTransparent = transparency.findLastIndex((alpha) => alpha !== 255);
+            chunks.push({type: "tRNS", data: Buffer.from(transparency.slice(0, lastTransparent + 1))});
+        }
+        let packed = Buffer.alloc(rowSize * height);
+        const pixelsPerByte = 8 / bitDepth;
+        for (let y = 0; y < height; y++) {
+            for (let x = 0; x < width; x++) {
+                const index = palette.indexes[y * width + x];
+                const shift = 8 - bitDepth * (1 + (x % pixelsPerByte));
+                packed[y * rowSize + Math.floor(x / pixelsPerByte)] |= index << shift;
+            }
+        }
+        scanlines = filterScanlines(packed, rowSize, height, bytesPerPixel, false); // filters rarely help indexed images
+    } else {
+        colorType = opaque ? 2 : 6;
+        const channels = opaque ? 3 : 4;
+        rowSize = width * channels;
+        bytesPerPixel = channels;
+        let samples = pixels;
+        if (opaque) { // dropping the alpha channel
+            samples = Buffer.alloc(width * height * 3);
+            for (let i = 0, j = 0; i < pixels.length; i += 4, j += 3) {
+                samples[j] = pixels[i];
+                samples[j + 1] = pixels[i + 1];
+                samples[j + 2] = pixels[i + 2];
+            }
+        }
+        scanlines = filterScanlines(samples, rowSize, height, bytesPerPixel, true);
+    }
+
+    let header = Buffer.alloc(13);
+    header.writeUInt32BE(width, 0);
+    header.writeUInt32BE(height, 4);
+    header[8] = bitDepth;
+    header[9] = colorType; // compression, filter and interlace methods are all 0
+    const colorChunks = extraChunks.filter((chunk) => PNG_COLOR_CHUNKS.has(chunk.type));
+    const allChunks = [{type: "IHDR", data: header}, ...colorChunks, ...chunks,
+                       {type: "IDAT", data: zlib.deflateSync(scanlines, {level: 9, memLevel: 9})}, {type: "IEND", data: Buffer.alloc(0)}];
+    return Buffer.concat([PNG_SIGNATURE, ...allChunks.map(writePngChunk)]);
+}
+
+// this function returns the image's colors ({colors, indexes}) if there are at most 256 of them, otherwise null
+// colors are packed as RGBA integers, with every transparent color before the opaque ones
+function buildPalette(pixels) {
+    let colorIndexes = new Map();
+    for (let i = 0; i < pixels.length; i += 4) {
+        const color = pixels.readUInt32BE(i);
+        if (!colorIndexes.has(color)) {
+            if (colorIndexes.size === 256) {
+                return null;
+            }
+            colorIndexes.set(color, 0);
+        }
+    }
+    const colors = [...colorIndexes.keys()].sort((first, second) => ((first & 0xFF) === 255) - ((second & 0xFF) === 255));
+    colors.forEach((color, index) => colorIndexes.set(color, index));
+    let indexes = new Uint8Array(pixels.length / 4);
+    for (let i = 0; i < indexes.length; i++) {
+        indexes[i] = colorIndexes.get(pixels.readUInt32BE(i * 4));
+    }
+    return {colors: colors, indexes: indexes};
+}
+
+// this function adds a filter byte to every row. With adaptive set each row gets whichever filter leaves its bytes closest to 0, which
+// usually compresses best, otherwise every row is left unfiltered
+function filterScanlines(samples, rowSize, height, bytesPerPixel, adaptive) {
+    let scanlines = Buffer.alloc((rowSize + 1) * height);
+    let candidate = Buffer.alloc(rowSize);
+    for (let y = 0; y < height; y++) {
+        const row = y * rowSize;
+        const target = y * (rowSize + 1);
+        let bestFilter = 0;
+        let bestScore = Infinity;
+        const filters = adaptive ? [0, 1, 2, 3, 4] : [0];
+        for (let f = 0; f < filters.length; f++) {
+            let score = 0;
+            for (let x = 0; x < rowSize; x++) {
+                const left = x >= bytesPerPixel ? samples[row + x - bytesPerPixel] : 0;
+                const up = y > 0 ? samples[row - rowSize + x] : 0;
+                const upLeft = y > 0 && x >= bytesPerPixel ? samples[row - rowSize + x - bytesPerPixel] : 0;
+                let predictor = 0;
+                switch (filters[f]) {
+                    case 1: predictor = left; break;
+                    case 2: predictor = up; break;
+                    case 3: predictor = (left + up) >> 1; break;
+                    case 4: predictor = paethPredictor(left, up, upLeft); break;
+                }
+                const value = (samples[row + x] - predictor) & 0xFF;
+                candidate[x] = value;
+                score += value < 128 ? value : 256 - value;
+            }
+            if (score < bestScore) {
+                bestScore = score;
+                bestFilter = filters[f];
+                scanlines[target] = bestFilter;
+                candidate.copy(scanlines, target + 1);
+            }
+        }
+    }
+    return scanlines;
+}
+
+function writePngChunk(chunk) {
+    let output = Buffer.alloc(12 + chunk.data.length);
+    output.writeUInt32BE(chunk.data.length, 0);
+    output.write(chunk.type, 4, "latin1");
+    chunk.data.copy(output, 8);
+    output.writeUInt32BE(crc32(output.subarray(4, 8 + chunk.data.length)), 8 + chunk.data.length);
+    return output;
+}
+
+let crcTable = null;
+function crc32(bytes) {
+    if (crcTable === null) {
+        crcTable = new Int32Array(256);
+        for (let n = 0; n < 256; n++) {
+            let c = n;
+            for (let k = 0; k < 8; k++) {
+                c = c & 1 ? 0xEDB88320 ^ (c >>> 1) : c >>> 1;
+            }
+            crcTable[n] = c;
+        }
+    }
+    let crc = -1;
+    for (let i = 0; i < bytes.length; i++) {
+        crc = crcTable[(crc ^ bytes[i]) & 0xFF] ^ (crc >>> 8);
+    }
+    return (crc ^ -1) >>> 0;
+}
+
+// this function shrinks an image to fit inside a maxSize square, averaging every source pixel that falls inside each new pixel
+function scaleImage(image, maxSize) {
+    const scale = maxSize / Math.max(image.width, image.height);
+    const width = Math.max(1, Math.round(image.width * scale));
+    const height = Math.max(1, Math.round(image.height * scale));
+    let pixels = Buffer.alloc(width * height * 4);
+    for (let y = 0; y < height; y++) {
+        const top = Math.floor((y * image.height) / height);
+        const bottom = Math.max(top + 1, Math.floor(((y + 1) * image.height) / height));
+        for (let x = 0; x < width; x++) {
+            const left = Math.floor((x * image.width) / width);
+            const right = Math.max(left + 1, Math.floor(((x + 1) * image.width) / width));
+            // colors are weighted by their alpha so fully transparent pixels don't darken their neighbours
+            let red = 0, green = 0, blue = 0, alpha = 0, count = 0;
+            for (let sourceY = top; sourceY < bottom; sourceY++) {
+                for (let sourceX = left; sourceX < right; sourceX++) {
+                    const source = (sourceY * image.width + sourceX) * 4;
+                    const pixelAlpha = image.pixels[source + 3];
+                    red += image.pixels[source] * pixelAlpha;
+                    green += image.pixels[source + 1] * pixelAlpha;
+                    blue += image.pixels[source + 2] * pixelAlpha;
+                    alpha += pixelAlpha;
+                    count++;
+                }
+            }
+            const target = (y * width + x) * 4;
+            if (alpha > 0) {
+                pixels[target] = Math.round(red / alpha);
+                pixels[target + 1] = Math.round(green / alpha);
+                pixels[target + 2] = Math.round(blue / alpha);
+            }
+            pixels[target + 3] = Math.round(alpha / count);
+        }
+    }
+    return {width: width, height: height, pixels: pixels};
+}
+
+// this function reads an image's dimensions from its header without decoding it, it returns null for formats it can't read
+function readImageSize(data, fileType) {
+    try {
+        switch (fileType) {
+            case "image/png": // the IHDR chunk always comes first
+                return data.length >= 24 ? {width: data.readUInt32BE(16), height: data.readUInt32BE(20)} : null;
+            case "image/gif":
+                return data.length >= 10 ? {width: data.readUInt16LE(6), height: data.readUInt16LE(8)} : null;
+            case "image/bmp":
+                return data.length >= 26 ? {width: data.readInt32LE(18), height: Math.abs(data.readInt32LE(22))} : null;
+            case "image/jpeg":
+                return readJpegSize(data);
+            case "image/webp":
+                return readWebpSize(data);
+            default:
+                return null;
+        }
+    } catch (error) { // a truncated header
+        return null;
+    }
+}
+
+// this function finds the start of frame segment in a JPEG, which holds the image's dimensions
+function readJpegSize(data) {
+    let offset = 2;
+    while (offset + 9 <= data.length) {
+        if (data[offset] !== 0xFF) {
+            return null;
+        }
+        const marker = data[offset + 1];
+        if (marker === 0xFF) { // padding before a marker
+            offset++;
+            continue;
+        }
+        if (marker === 0x01 || (marker >= 0xD0 && marker <= 0xD8)) { // markers without a segment
+            offset += 2;
+            continue;
+        }
+        // every start of frame marker except the ones that share its range (huffman tables, arithmetic coding)
+        if (marker >= 0xC0 && marker <= 0xCF && marker !== 0xC4 && marker !== 0xC8 && marker !== 0xCC) {
+            return {width: data.readUInt16BE(offset + 7), height: data.readUInt16BE(offset + 5)};
+        }
+        offset += 2 + data.readUInt16BE(offset + 2);
+    }
+    return null;
+}
+
+function readWebpSize(data) {
+    const format = data.toString("latin1", 12, 16);
+    if (format === "VP8X") {
+        return {width: 1 + data.readUIntLE(24, 3), height: 1 + data.readUIntLE(27, 3)};
+    }
+    if (format === "VP8 ") {
+        return {width: data.readUInt16LE(26) & 0x3FFF, height: data.readUInt16LE(28) & 0x3FFF};
+    }
+    if (format === "VP8L") {
+        const bits = data.readUInt32LE(21);
+        return {width: (bits & 0x3FFF) + 1, height: ((bits >> 14) & 0x3FFF) + 1};
+    }
+    return null;
+}
+
+// ---------- audio ----------
+
+// this function returns an audio file's length in seconds, or null for formats it can't read
+function readAudioDuration(data, fileType) {
+    try {
+        switch (fileType) {
+            case "audio/wav":
+                return readWavDuration(data);
+            case "audio/mpeg":
+                return readMp3Duration(data);
+            case "audio/flac":
+                return readFlacDuration(data);
+            default:
+                return null;
+        }
+    } catch (error) { // a truncated header
+        return null;
+    }
+}
+
+// a WAV's length is the size of its sample data divided by how many bytes a second of audio takes
+function readWavDuration(data) {
+    let byteRate = null;
+    let offset = 12; // after "RIFF", the file size and "WAVE"
+    while (offset + 8 <= data.length) {
+        const chunkId = data.toString("latin1", offset, offset + 4);
+        const chunkSize = data.readUInt32LE(offset + 4);
+        if (chunkId === "fmt ") {
+            byteRate = data.readUInt32LE(offset + 16);
+        } else if (chunkId === "data") {
+            if (byteRate === null || byteRate === 0) {
+                return null;
+            }
+            const dataSize = Math.min(chunkSize, data.length - offset - 8); // recordings that were cut off can claim more data than they have
+            return dataSize / byteRate;
+        }
+        offset += 8 + chunkSize + (chunkSize % 2); // chunks are padded to an even length
+    }
+    return null;
+}
+
+// kbps for each bitrate index, by MPEG version and layer
+const MP3_BITRATES = {
+    "1-1": [0, 32, 64, 96, 128, 160, 192, 224, 256, 288, 320, 352, 384, 416, 448],
+    "1-2": [0, 32, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320, 384],
+    "1-3": [0, 32, 40, 48, 56, 64, 80, 96, 112, 128, 160, 192, 224, 256, 320],
+    "2-1": [0, 32, 48, 56, 64, 80, 96, 112, 128, 144, 160, 176, 192, 224, 256],
+    "2-2": [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160],
+    "2-3": [0, 8, 16, 24, 32, 40, 48, 56, 64, 80, 96, 112, 128, 144, 160]
+};
+const MP3_SAMPLE_RATES = {1: [44100, 48000, 32000], 2: [22050, 24000, 16000], 2.5: [11025, 12000, 8000]};
+
+// an mp3 is a series of frames that each hold a fixed number of samples, so we walk the frame headers and add up their samples
+// this works for variable bitrate files too, where the bitrate alone can't tell us the length
+function readMp3Duration(data) {
+    let offset = 0;
+    if (data.toString("latin1", 0, 3) === "ID3") { // skipping the tag at the start of the file, its size is stored 7 bits per byte
+        const tagSize = (data[6] << 21) | (data[7] << 14) | (data[8] << 7) | data[9];
+        offset = 10 + tagSize + (data[5] & 0x10 ? 10 : 0);
+    }
+    let duration = 0;
+    let framesFound = 0;
+    while (offset + 4 <= data.length) {
+        const frame = readMp3Frame(data, offset);
+        if (frame === null) {
+            if (framesFound > 0) { // the end of the audio, e.g. an ID3v1 tag
+                break;
+            }
+            offset++; // some encoders leave junk before the first frame
+            continue;
+        }
+        duration += frame.samples / frame.sampleRate;
+        framesFound++;
+        offset += frame.length;
+    }
+    return framesFound > 0 ? duration : null;
+}
+
+function readMp3Frame(data, offset) {
+    if (data[offset] !== 0xFF || (data[offset + 1] & 0xE0) !== 0xE0) {
+        return null;
+    }
+    const versionBits = (data[offset + 1] >> 3) & 3;
+    const layerBits = (data[offset + 1] >> 1) & 3;
+    const bitrateIndex = data[offset + 2] >> 4;
+    const sampleRateIndex = (data[offset + 2] >> 2) & 3;
+    const padding = (data[offset + 2] >> 1) & 1;
+    if (versionBits === 1 || layerBits === 0 || bitrateIndex === 0 || bitrateIndex === 15 || sampleRateIndex === 3) {
+        return null;
+    }
+    const version = versionBits === 3 ? 1 : versionBits === 2 ? 2 : 2.5;
+    const layer = 4 - layerBits;
+    const bitrate = MP3_BITRATES[`${version === 1 ? 1 : 2}-${layer}`][bitrateIndex] * 1000;
+    const sampleRate = MP3_SAMPLE_RATES[version][sampleRateIndex];
+    let samples;
+    let length;
+    if (layer === 1) {
+        samples = 384;
+        length = (Math.floor((12 * bitrate) / sampleRate) + padding) * 4;
+    } else {
+        samples = layer === 3 && version !== 1 ? 576 : 1152;
+        length = Math.floor(((samples / 8) * bitrate) / sampleRate) + padding;
+    }
+    return {samples: samples, sampleRate: sampleRate, length: length};
+}
+
+// a FLAC file starts with a STREAMINFO block holding its sample rate and total number of samples
+function readFlacDuration(data) {
+    if (data.length < 26 || (data[4] & 0x7F) !== 0) {
+        return null;
+    }
+    const sampleRate = (data[18] << 12) | (data[19] << 4) | (data[20] >> 4);
+    const totalSamples = (data[21] & 0x0F) * 2 ** 32 + data.readUInt32BE(22);
+    if (sampleRate === 0 || totalSamples === 0) { // the number of samples is allowed to be unknown
+        return null;
+    }
+    return totalSamples / sampleRate;
+}
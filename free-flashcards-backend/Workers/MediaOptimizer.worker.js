@@ -0,0 +1,14 @@
+// Runs inside one of the media optimizer's worker threads (see Services/MediaOptimizer.service.js)
+// each message is {taskId, data, fileType} and is answered with {taskId, result} or {taskId, error}
+const { parentPort } = require("worker_threads");
+const MediaCodecs = require("./MediaCodecs");
+
+parentPort.on("message", ({taskId, data, fileType}) => {
+    try {
+        // data arrives as a Uint8Array, wrapping it lets the codecs use Buffer's read helpers without copying it
+        const result = MediaCodecs.optimizeMedia(Buffer.from(data.buffer, data.byteOffset, data.byteLength), fileType);
+        parentPort.postMessage({taskId: taskId, result: result});
+    } catch (error) {
+        parentPort.postMessage({taskId: taskId, error: error.message});
+    }
+});
@@ -1,25 +1,44 @@
+const cluster = require("cluster");
 const express = require("express");
 const createError = require("http-errors");
-const dotenv = require("dotenv").config();
+const Config = require("./config"); // loads the .env file, so it comes before anything that reads settings from it
 const cors = require("cors");
-const fileUpload = require("express-fileupload");
-
-console.log(dotenv.parsed);
+const { compressResponses } = require("./Middleware/Compression.middleware");
+const { recordRequestMetrics } = require("./Middleware/Metrics.middleware");
+const Serializer = require("./Services/Serializer.service");
+const Shutdown = require("./Services/Shutdown.service");
+const Metrics = require("./Services/Metrics.service");
 
 const app = express();
+app.use(recordRequestMetrics()); // first, so the time spent in every other middleware counts towards the request
+app.use(Shutdown.closeConnectionsOnShutdown());
 app.use(express.json()); // this allows us to do request.body and send request.body (which are jsons)
 app.use(express.urlencoded({extended: true}));
 
-app.use(cors({origin: 'http://localhost:3000'}));
+app.use(cors({origin: 'http://localhost:3000', exposedHeaders: ['ETag']})); // the frontend revalidates what it has cached with the ETags we send
+
+app.use(compressResponses()); // json responses are compressed when the client accepts it, files are left as they are
 
-app.use(fileUpload());
+// multipart bodies are only parsed on the routes that take files, by the StreamUpload middleware
 
-const launchArgs = process.argv; // 3rd argument will be 'production' or 'test', indicating which port we should launch on and which collection we should connect to
+const launchArgs = process.argv; // 3rd argument will be 'production', 'test' or 'memory', indicating which port we should launch on and which collection we should connect to
 
-require("./initDB")(launchArgs[2]); // running the arrow function in initDB to initialize the db
+// running the arrow function in initDB to initialize the db, we only start listening once it's ready (see the bottom of this file)
+// in cluster mode the primary has already synced the indexes before starting the workers
+const dbReady = require("./initDB")(launchArgs[2], {syncIndexes: !cluster.isWorker, warmPool: true});
+
+// setting ORPHAN_COLLECTION_INTERVAL_MS in the .env file periodically removes cards and files nothing references anymore (see Scripts/collectOrphans.js)
+// in cluster mode only one worker runs it. The collector works on the db directly, and in memory mode nothing outlives the process anyway
+const orphanCollectionInterval = parseInt(process.env.ORPHAN_COLLECTION_INTERVAL_MS);
+if (orphanCollectionInterval > 0 && Config.workerSlot === 0 && !Config.isInMemory(launchArgs[2])) {
+    require("./Services/OrphanCollector.service").scheduleOrphanCollection(orphanCollectionInterval);
+}
 
 const FlashcardRoute = require("./Routes/Flashcard.route");
 const StudySetRoute = require("./Routes/StudySet.route");
+const ReadCache = require("./Services/ReadCache.service");
+const Admission = require("./Middleware/Admission.middleware");
+const Repository = require("./Repositories/Repository");
 
 app.use('/cards', FlashcardRoute);
 app.use('/sets', StudySetRoute);
@@ -28,6 +47,43 @@ app.get('/', (request, response, next) => {
     response.send("Home page");
 });
 
+// liveness: answers as long as the process is running and its event loop isn't stuck
+app.get('/healthz', (request, response, next) => {
+    response.send({status: "ok"});
+});
+
+// readiness: whether this process should be sent traffic, which stops once it loses the db or starts shutting down
+app.get('/readyz', (request, response, next) => {
+    if (Shutdown.isShuttingDown()) {
+        next(createError(503, "Server is shutting down"));
+        return;
+    }
+    if (!Repository.isReady()) {
+        next(createError(503, "Database is not connected"));
+        return;
+    }
+    response.send({status: "ready", backend: Repository.getBackendName()}); // "mongo" or "memory", so tests know which metrics to expect
+});
+
+// request latencies and sizes by route, db command timings and event loop lag in Prometheus' text format
+app.get('/metrics', (request, response, next) => {
+    Metrics.render().then((text) => {
+        response.type("text/plain; version=0.0.4");
+        response.send(text);
+    }).catch(next);
+});
+
+// hit and miss counts for the read cache in front of GET /sets and GET /cards/:id, for sizing it with READ_CACHE_MAX_BYTES
+app.get('/cache/stats', (request, response, next) => {
+    response.send(ReadCache.getStats());
+});
+
+// each route class's limits, in-flight and queued requests, and how many requests it has turned away, for tuning the ADMISSION_* settings
+// the health checks, metrics and stats routes aren't limited, so they keep answering while the server is shedding load
+app.get('/admission/stats', (request, response, next) => {
+    response.send(Admission.getStats());
+});
+
 // this runs if the request type and path are not supported (e.g. a delete request on the home)
 // this is not the preferred way to handle errors
 app.use((request, response, next) => { 
@@ -42,23 +98,21 @@ app.use((request, response, next) => {
 // calling next(error) anywhere in our server code (including in the product route!) jumps to this error handler
 app.use((error, request, response, next) => {
     response.status(error.status || 500); // if error.status is null (not set) then an internal server error has occurred (code 500)
-    response.send({
-        error: {
-            status: error.status || 500,
-            message: error.message
-        }
-    })
+    response.type("json");
+    response.send(Serializer.serializeError(error.status || 500, error.message)); // {error: {status, message}}
 });
 
-let envPort;
-if (launchArgs[2] === "production") {
-    envPort = process.env.PRODUCTION_PORT;
-} else if (launchArgs[2] === "test") {
-    envPort = process.env.TEST_PORT;
-}
-const PORT = envPort || 3000; // if the provided .env file has no port then we default to 3000
-app.listen(PORT, () => {
-    console.log("Server started on port " + PORT);
+const PORT = Config.getPort(launchArgs[2]);
+// requests that arrived before the db was ready would only wait on mongoose's buffering, so we don't accept any until then
+// when this is a worker started by cluster.js, every worker listens on the same port and the primary process shares connections out between them
+dbReady.then(() => {
+    const server = app.listen(PORT, () => {
+        console.log("Server started on port " + PORT);
+    });
+    Shutdown.handleShutdownSignals(server);
+}).catch((error) => {
+    console.log(`could not start the server: ${error.message}`);
+    process.exit(1); // in cluster mode the primary starts a replacement, backing off while the db stays unreachable
 });
 
   
\ No newline at end of file
@@ -0,0 +1,137 @@
+// Runs the server on every core: this primary process starts CLUSTER_WORKERS copies of app.js (one per core by default), which all
+// listen on the same port, and shares incoming connections out between them
+// The db's indexes are synced before any worker starts. A worker that crashes is replaced. On SIGTERM or SIGINT every worker finishes its in-flight requests and closes its db connection
+// before the primary exits (see Services/Shutdown.service.js)
+//
+// usage: node cluster.js <production|test>
+// memory mode isn't supported, since each worker would keep its own separate copy of everything
+const cluster = require("cluster");
+const mongoose = require("mongoose");
+const Config = require("./config");
+
+const MIN_UPTIME_MS = 5000; // a worker that crashes sooner than this after starting is probably crashing on startup
+const MAX_RESTART_DELAY_MS = 30000;
+
+let workerSlots = new Map(); // worker id -> slot, from 0 to CLUSTER_WORKERS - 1
+let restartDelays = []; // slot -> how long to wait before restarting it, doubled each time its worker crashes on startup
+let shuttingDown = false;
+let metricsCollections = new Map(); // collectionId -> {requester, snapshotId, snapshots, waitingFor, timer}, for GET /metrics scrapes in progress
+let nextCollectionId = 0;
+
+// this function starts a worker for a slot, the worker runs app.js with the primary's launch arguments (see cluster.setupPrimary below)
+function startWorker(slot) {
+    const worker = cluster.fork({CLUSTER_WORKER_COUNT: Config.clusterWorkers, CLUSTER_WORKER_SLOT: slot});
+    worker.startedAt = Date.now();
+    workerSlots.set(worker.id, slot);
+    worker.on("message", (message) => {
+        if (message === null || typeof message !== "object") {
+            return;
+        }
+        if (message.relay === true) { // a worker that changes something other workers may have cached asks us to pass the message on to them (see ReadCache.service.js)
+            for (const other of Object.values(cluster.workers)) {
+                if (other !== worker && other.isConnected()) {
+                    other.send(message);
+                }
+            }
+        } else if (message.type === "metrics-request") { // a worker was scraped, so every worker's metrics are gathered for it (see Metrics.service.js)
+            collectMetrics(worker, message.snapshotId, message.timeoutMs);
+        } else if (message.type === "metrics-snapshot") {
+            const collection = metricsCollections.get(message.collectionId);
+            if (collection !== undefined) {
+                collection.snapshots.push(message.snapshot);
+                collection.waitingFor.delete(worker.id);
+                if (collection.waitingFor.size === 0) {
+                    finishMetricsCollection(message.collectionId);
+                }
+            }
+        }
+    });
+}
+
+// this function asks every worker for a snapshot of its metrics and sends them all to the worker that was scraped
+// a worker that doesn't answer within timeoutMs (e.g. it's stuck or restarting) is left out rather than holding up the scrape
+function collectMetrics(requester, snapshotId, timeoutMs) {
+    const collectionId = nextCollectionId++;
+    const workers = Object.values(cluster.workers).filter((worker) => worker.isConnected());
+    const collection = {requester: requester, snapshotId: snapshotId, snapshots: [], waitingFor: new Set(workers.map((worker) => worker.id))};
+    collection.timer = setTimeout(() => finishMetricsCollection(collectionId), timeoutMs);
+    metricsCollections.set(collectionId, collection);
+    for (const worker of workers) {
+        worker.send({type: "metrics-snapshot-request", collectionId: collectionId});
+    }
+}
+
+function finishMetricsCollection(collectionId) {
+    const collection = metricsCollections.get(collectionId);
+    metricsCollections.delete(collectionId);
+    clearTimeout(collection.timer);
+    if (collection.requester.isConnected()) {
+        collection.requester.send({type: "metrics-response", snapshotId: collection.snapshotId, snapshots: collection.snapshots});
+    }
+}
+
+cluster.setupPrimary({exec: `${__dirname}/app.js`, args: process.argv.slice(2)});
+
+cluster.on("exit", (worker, code, signal) => {
+    const slot = workerSlots.get(worker.id);
+    workerSlots.delete(worker.id);
+    if (shuttingDown) {
+        if (workerSlots.size === 0) {
+            console.log("every worker has stopped");
+            process.exit(0);
+        }
+        return;
+    }
+    console.log(`worker ${worker.process.pid} stopped (${signal || `exit code ${code}`}), starting a replacement`);
+    // restarting a worker that keeps crashing on startup straight away would just spin, so we back off
+    if (Date.now() - worker.startedAt < MIN_UPTIME_MS) {
+        restartDelays[slot] = Math.min(MAX_RESTART_DELAY_MS, (restartDelays[slot] || 500) * 2);
+    } else {
+        restartDelays[slot] = 0;
+    }
+    setTimeout(() => {
+        if (!shuttingDown) {
+            startWorker(slot);
+        }
+    }, restartDelays[slot]);
+});
+
+// every worker shuts itself down gracefully, we wait for them and give up once they've had longer than their own timeout
+const shutdown = (signal) => {
+    if (shuttingDown) {
+        return;
+    }
+    shuttingDown = true;
+    console.log(`${signal} received, stopping ${workerSlots.size} workers`);
+    for (const worker of Object.values(cluster.workers)) {
+        worker.process.kill("SIGTERM");
+    }
+    if (workerSlots.size === 0) {
+        process.exit(0);
+    }
+    setTimeout(() => {
+        console.log("workers didn't stop in time, exiting anyway");
+        process.exit(1);
+    }, Config.shutdownTimeoutMs + 5000).unref();
+};
+process.on("SIGTERM", () => shutdown("SIGTERM"));
+process.on("SIGINT", () => shutdown("SIGINT"));
+
+if (Config.isInMemory(process.argv[2])) {
+    console.log("memory mode can't be clustered, every worker would have its own data. Run it with 'node app.js memory' instead");
+    process.exit(1);
+}
+
+// the indexes are synced once here rather than by every worker, then the workers connect with their own pools
+require("./Models/Flashcard.model");
+require("./Models/StudySet.model");
+require("./Models/QuizAttempt.model");
+require("./initDB")(process.argv[2], {syncIndexes: true}).then(() => mongoose.connection.close()).then(() => {
+    console.log(`starting ${Config.clusterWorkers} workers`);
+    for (let slot = 0; slot < Config.clusterWorkers; slot++) {
+        startWorker(slot);
+    }
+}).catch((error) => {
+    console.log(`could not start the cluster: ${error.message}`);
+    process.exit(1);
+});
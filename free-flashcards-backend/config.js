@@ -0,0 +1,90 @@
+require("dotenv").config({path: `${__dirname}/.env`});
+const os = require("os");
+const cluster = require("cluster");
+
+// Settings shared by every process that runs the server: app.js on its own, each worker cluster.js starts, and the scripts
+// All of them come from the .env file, the launch mode ('production', 'test' or 'memory') picks which port and db are used
+// 'memory' keeps everything in the process's memory instead of a db (see Repositories/Repository.js) and listens on the test port
+
+const DEFAULT_PORT = 3000;
+// the mongodb driver opens up to 100 connections per process by default, so this is what a single process would get on its own
+const DEFAULT_MAX_CONNECTIONS = 100;
+const MIN_POOL_SIZE_PER_PROCESS = 5; // even with many workers, each one needs a few connections to run its requests in parallel
+const DEFAULT_MIN_POOL_SIZE = 2; // connections each process keeps open even when it's idle, so a burst of requests doesn't wait for new ones
+// the driver waits 30 seconds to find a server by default, long enough that requests pile up behind an unreachable db instead of failing
+const DEFAULT_SERVER_SELECTION_TIMEOUT_MS = 10000;
+const DEFAULT_CONNECT_TIMEOUT_MS = 10000;
+// the driver never times out a socket by default, so a db that stops answering would hold requests (and their connections) forever
+// this has to outlast our slowest operations, e.g. a migration script's batch or an orphan collection query
+const DEFAULT_SOCKET_TIMEOUT_MS = 60000;
+const DEFAULT_HEARTBEAT_FREQUENCY_MS = 10000; // how often the driver checks on each server, a shorter interval notices a failover sooner
+const DEFAULT_SHUTDOWN_TIMEOUT_MS = 30000; // long enough for a slow upload to finish
+
+// this function reads a positive integer from the .env file, falling back to defaultValue if it isn't set or isn't valid
+function readPositiveInt(name, defaultValue) {
+    const value = parseInt(process.env[name]);
+    return value > 0 ? value : defaultValue;
+}
+
+// cluster.js tells each worker how many workers there are and which one it is (see cluster.js), a process started on its own is the only one
+const processCount = cluster.isWorker ? readPositiveInt("CLUSTER_WORKER_COUNT", 1) : 1;
+
+// this function sizes this process's connection pool and sets the driver's timeouts
+function getConnectionOptions() {
+    const maxPoolSize = Math.max(MIN_POOL_SIZE_PER_PROCESS, Math.floor(readPositiveInt("MONGODB_MAX_CONNECTIONS", DEFAULT_MAX_CONNECTIONS) / processCount));
+    return {
+        maxPoolSize: maxPoolSize,
+        minPoolSize: Math.min(maxPoolSize, readPositiveInt("MONGODB_MIN_POOL_SIZE", DEFAULT_MIN_POOL_SIZE)),
+        serverSelectionTimeoutMS: readPositiveInt("MONGODB_SERVER_SELECTION_TIMEOUT_MS", DEFAULT_SERVER_SELECTION_TIMEOUT_MS),
+        connectTimeoutMS: readPositiveInt("MONGODB_CONNECT_TIMEOUT_MS", DEFAULT_CONNECT_TIMEOUT_MS),
+        socketTimeoutMS: readPositiveInt("MONGODB_SOCKET_TIMEOUT_MS", DEFAULT_SOCKET_TIMEOUT_MS),
+        heartbeatFrequencyMS: readPositiveInt("MONGODB_HEARTBEAT_FREQUENCY_MS", DEFAULT_HEARTBEAT_FREQUENCY_MS)
+    };
+}
+
+// define the needed settings in the module's exports
+module.exports = {
+
+    // how many worker processes cluster.js runs, CLUSTER_WORKERS in the .env file, one per core by default
+    clusterWorkers : readPositiveInt("CLUSTER_WORKERS", os.availableParallelism()),
+
+    // how many processes are serving requests, including this one
+    processCount : processCount,
+
+    // which of those processes this is, from 0. A restarted worker takes the place of the one it replaces, so work only one process
+    // should do (e.g. scheduled orphan collection) is given to slot 0
+    workerSlot : cluster.isWorker ? parseInt(process.env.CLUSTER_WORKER_SLOT) || 0 : 0,
+
+    // the options this process connects to the db with (see initDB.js), each of them can be set in the .env file:
+    // maxPoolSize is this process's share of MONGODB_MAX_CONNECTIONS, so adding workers doesn't multiply the load on the db
+    // minPoolSize is MONGODB_MIN_POOL_SIZE, the timeouts are MONGODB_SERVER_SELECTION_TIMEOUT_MS, MONGODB_CONNECT_TIMEOUT_MS and MONGODB_SOCKET_TIMEOUT_MS
+    // and heartbeatFrequencyMS is MONGODB_HEARTBEAT_FREQUENCY_MS
+    connectionOptions : getConnectionOptions(),
+
+    // how long a process waits for in-flight requests to finish when it's shutting down before it exits anyway, SHUTDOWN_TIMEOUT_MS in the .env file
+    shutdownTimeoutMs : readPositiveInt("SHUTDOWN_TIMEOUT_MS", DEFAULT_SHUTDOWN_TIMEOUT_MS),
+
+    // returns the port the server listens on in the given launch mode
+    getPort : (launchMode) => {
+        let envPort;
+        if (launchMode === "production") {
+            envPort = process.env.PRODUCTION_PORT;
+        } else if (launchMode === "test" || launchMode === "memory") { // the tests and benchmarks run against either one
+            envPort = process.env.TEST_PORT;
+        }
+        return envPort || DEFAULT_PORT; // if the provided .env file has no port then we default to 3000
+    },
+
+    // whether the given launch mode keeps everything in memory rather than connecting to a db
+    isInMemory : (launchMode) => launchMode === "memory",
+
+    // returns the URI of the db to connect to in the given launch mode
+    getConnectionURI : (launchMode) => {
+        if (launchMode === "production") {
+            return process.env.mongodbProductionURI;
+        } else if (launchMode === "test") {
+            return process.env.mongodbTestURI;
+        }
+        return undefined;
+    }
+}
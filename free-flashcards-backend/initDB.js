@@ -1,16 +1,38 @@
+const cluster = require("cluster");
 const mongoose = require("mongoose");
+const Config = require("./config");
+const Metrics = require("./Services/Metrics.service");
+const Repository = require("./Repositories/Repository");
 
-module.exports = (launchMode) => {
-    let connectionURI;
-    if (launchMode === "production") {
-        connectionURI = process.env.mongodbProductionURI;
-    } else if (launchMode === "test") {
-        connectionURI = process.env.mongodbTestURI;
+const POOL_CHECK_INTERVAL_MS = 50;
+
+// connects to the db for the given launch mode, resolving once it's ready to use and rejecting if the db can't be reached
+// with syncIndexes, the indexes in the db are made to match the models' schemas first (including dropping ones the schemas no longer have)
+// with warmPool, it also waits for the pool to open its minimum number of connections, so the first requests don't pay for setting them up
+// in memory mode there's no db, everything is stored by the in-memory repository instead and is gone once the process exits
+module.exports = async (launchMode, {syncIndexes = false, warmPool = false} = {}) => {
+    if (Config.isInMemory(launchMode)) {
+        Repository.useBackend("memory");
+        console.log("storing everything in memory, nothing is kept once the server stops");
+        return;
     }
+    const connectionURI = Config.getConnectionURI(launchMode);
+    // mongoose would otherwise build every model's indexes in the background once it connects. The server syncs them before it
+    // takes any traffic instead, and in cluster mode the primary syncs them once for all of its workers (see cluster.js)
+    // monitorCommands lets Metrics.service.js time every command we send
+    const options = {...Config.connectionOptions, autoIndex: !syncIndexes && !cluster.isWorker, monitorCommands: true};
     // connecting to a local instance of MongoDB contained in the URI in the .env file
-    mongoose.connect(connectionURI).then(() => {
-        console.log("connected to mongodb!")
-    }).catch(error => console.log(error.message)); 
+    // each process has its own pool, sized so all of the cluster's workers together stay within MONGODB_MAX_CONNECTIONS (see config.js)
+    const connecting = mongoose.connect(connectionURI, options);
+
+    // the pool starts opening connections as soon as the client exists, so we count them from here
+    const client = mongoose.connection.getClient();
+    Metrics.monitorCommands(client);
+    let openConnections = 0;
+    const countOpened = () => openConnections++;
+    const countClosed = () => openConnections--;
+    client.on("connectionReady", countOpened);
+    client.on("connectionClosed", countClosed);
 
     // fires every time mongoose connects, 'once' can be used to only run once
     mongoose.connection.on("connected", () => {
@@ -25,10 +47,31 @@ module.exports = (launchMode) => {
         console.log("Mongoose connection is disconnected");
     })
 
-    process.on('SIGINT',()=>{
-        mongoose.connection.close().then(()=>{
-            console.log('Mongoose is disconnected due to app termination');
-            process.exit(0);
-        });
-    });
-}
\ No newline at end of file
+    // the server closes the connection itself once it has finished its in-flight requests (see Services/Shutdown.service.js)
+
+    try {
+        await connecting;
+        console.log("connected to mongodb!");
+        if (syncIndexes) {
+            const dropped = await mongoose.syncIndexes();
+            for (const [modelName, droppedIndexes] of Object.entries(dropped)) {
+                if (droppedIndexes.length > 0) {
+                    console.log(`dropped indexes no longer in the ${modelName} schema: ${droppedIndexes.join(", ")}`);
+                }
+            }
+        }
+        if (warmPool) {
+            // the driver opens minPoolSize connections by itself, one after another, so this only waits for it to finish
+            const deadline = Date.now() + options.connectTimeoutMS;
+            while (openConnections < options.minPoolSize && Date.now() < deadline) {
+                await new Promise((resolve) => setTimeout(resolve, POOL_CHECK_INTERVAL_MS));
+            }
+            if (openConnections < options.minPoolSize) {
+                console.log(`only ${openConnections} of ${options.minPoolSize} db connections were open in time, starting anyway`);
+            }
+        }
+    } finally {
+        client.off("connectionReady", countOpened);
+        client.off("connectionClosed", countClosed);
+    }
+};
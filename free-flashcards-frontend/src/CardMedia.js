@@ -0,0 +1,27 @@
+import { useEffect, useState } from 'react';
+
+// Displays a flashcard's file straight from its Blob, which the browser reads itself rather than us copying its bytes into a base64 string
+// Each mounted CardMedia holds one object URL for its blob, which is revoked once it's unmounted or given a different blob, so the
+// browser can free the file as soon as no page is showing it (e.g. when the practice page releases the cards it has moved away from)
+export default function CardMedia({blob, fileType}) {
+
+    // {blob, url} for the object URL the effect below created, null until it has
+    const [objectURL, setObjectURL] = useState(null);
+
+    useEffect(() => {
+        const url = URL.createObjectURL(blob);
+        setObjectURL({blob: blob, url: url});
+        return () => URL.revokeObjectURL(url); // the element using it is gone (or about to use the new blob's URL)
+    }, [blob]);
+
+    if (objectURL === null || objectURL.blob !== blob) { // a URL made for a previous blob has already been revoked
+        return <></>
+    }
+    const mimetypeTokens = fileType.split("/"); // mimetypes are of the form {type}/{format} e.g. image/png
+    if (mimetypeTokens[0] === "image") {
+        return <img src={objectURL.url} alt="upload"/>
+    } else if (mimetypeTokens[0] === "audio") {
+        return <audio controls="controls" src={objectURL.url}/>
+    }
+    return <></>
+}
@@ -3,7 +3,7 @@ import './FreeFlashcards.css';
 import { useEffect, useState } from 'react';
 import { Route, Routes } from 'react-router-dom';
 import ViewStudySets from './pages/ViewStudySets/ViewStudySets.js';
-import axios from 'axios';
+import { readCachedResponse, revalidateResponse } from './data/flashcardCache.js';
 import StudySetEditor from './pages/StudySetEditor/StudySetEditor.js';
 import PracticeStudySet from './pages/PracticeStudySet/PracticeStudySet.js';
 import QuizStudySet from './pages/QuizStudySet/QuizStudySet.js';
@@ -18,9 +18,8 @@ export default function FlashcardApp() {
   useEffect(() => {
     // once we're sending the react application from the server we will be able to dynamically determine this (avoids the app breaking if we switch to https or a new domain name)
     const flashcardsUrl = `http://localhost:3001/sets`;  
-    axios.get(flashcardsUrl).then((response) => {
-      
-      const fetchedStudySets = response.data.study_sets;
+    // the sets we had last time are shown straight away, and replaced once the API tells us they've changed
+    fetchAllStudySets(flashcardsUrl, (fetchedStudySets) => {
       setStudySets(fetchedStudySets.map(studySet => {
         return {id: studySet._id, cardIds: studySet.cards, title: studySet.title}
       }))
@@ -63,3 +62,36 @@ export default function FlashcardApp() {
   </div>
 }
 
+// the API returns study sets a page at a time, so we follow each page's next_page cursor until we have every set
+// onStudySets is called with the cached sets if we have every page of them, and again with the API's sets if any page has changed
+// pages are revalidated with their ETags, so refreshing sets that haven't changed only costs a 304 per page
+async function fetchAllStudySets(setsUrl, onStudySets) {
+  const cachedStudySets = await readAllStudySets(setsUrl, readCachedResponse);
+  if (cachedStudySets !== null) {
+    onStudySets(cachedStudySets);
+  }
+  let anyPageChanged = cachedStudySets === null;
+  const fetchedStudySets = await readAllStudySets(setsUrl, async (url, params) => {
+    const {data, changed} = await revalidateResponse(url, params);
+    anyPageChanged = anyPageChanged || changed;
+    return data;
+  });
+  if (anyPageChanged) {
+    onStudySets(fetchedStudySets);
+  }
+}
+
+// this function follows the pages of study sets through readPage(url, params), resolving to every set or null if a page is missing
+async function readAllStudySets(setsUrl, readPage) {
+  let studySets = [];
+  let after = undefined; // undefined parameters are left out of the request, so the first request gets the first page
+  do {
+    const page = await readPage(setsUrl, {fields: "title,cards", after: after}); // quiz scores aren't needed to list sets
+    if (page === undefined) {
+      return null;
+    }
+    studySets = studySets.concat(page.study_sets);
+    after = page.next_page;
+  } while (after !== null);
+  return studySets;
+}
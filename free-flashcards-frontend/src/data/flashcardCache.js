@@ -0,0 +1,169 @@
+import axios from 'axios';
+
+// This module keeps the API responses and card media the study pages use in IndexedDB, so they survive switching pages and reloading the app
+// Pages are handed what's cached straight away and then whatever the API says is current, so they can render before the network answers
+// Media is stored by card and file version, so a file is only downloaded again once it changes. The least recently used media is removed
+// once it takes up more than MEDIA_BUDGET_BYTES
+// If IndexedDB can't be used (e.g. some private browsing modes) everything still works, it just comes from the network every time
+
+const DATABASE_NAME = "free-flashcards";
+const DATABASE_VERSION = 1;
+const RESPONSE_STORE = "responses"; // {key, etag, data} for GET requests, keyed by url and parameters
+const MEDIA_STORE = "media"; // {key, cardId, blob, fileType, size, lastUsed} for card files, keyed by card id and file version
+const MEDIA_BUDGET_BYTES = 50 * 1024 * 1024;
+
+let databasePromise = null; // opened the first time the cache is used
+
+// this function fetches a GET url through the cache, calling onData with the cached response (if there is one) and then with the API's
+// response if it differs. It resolves to the current data once the API has answered
+export async function fetchWithCache(url, params, onData) {
+    const cached = await readCachedResponse(url, params);
+    if (cached !== undefined) {
+        onData(cached);
+    }
+    const {data, changed} = await revalidateResponse(url, params);
+    if (changed) {
+        onData(data);
+    }
+    return data;
+}
+
+// resolves to the cached response to a GET url, or undefined if we don't have one
+export async function readCachedResponse(url, params) {
+    const cached = await readRecord(RESPONSE_STORE, responseKey(url, params));
+    return cached === undefined ? undefined : cached.data;
+}
+
+// this function asks the API for a GET url's current response, resolving to {data, changed} where changed says whether it differs from the cached one
+// responses the API sent an ETag for are revalidated with If-None-Match, so an unchanged one costs a 304 with no body
+export async function revalidateResponse(url, params) {
+    const key = responseKey(url, params);
+    const cached = await readRecord(RESPONSE_STORE, key);
+    const headers = cached !== undefined && cached.etag !== undefined ? {"If-None-Match": cached.etag} : {};
+    const response = await axios.get(url, {params: params, headers: headers, validateStatus: (status) => status === 200 || status === 304});
+    if (response.status === 304) {
+        return {data: cached.data, changed: false};
+    }
+    writeRecord(RESPONSE_STORE, {key: key, etag: response.headers.etag, data: response.data});
+    return {data: response.data, changed: cached === undefined || JSON.stringify(cached.data) !== JSON.stringify(response.data)};
+}
+
+// this function resolves to the file attached to a card as {blob, fileType}, from the cache when we already have this version of it
+// fileType comes from the response, since the API sends the optimized copy of a file (which may be a different format) once there is one
+export async function fetchCardMedia(cardsUrl, card) {
+    // a card's file is only replaced along with its hash, and what the API serves for it only changes once it has been optimized
+    const key = `${card._id}:${card.file.hash}:${card.file.optimizedAt === undefined ? "original" : "optimized"}`;
+    const cached = await readRecord(MEDIA_STORE, key);
+    if (cached !== undefined) {
+        writeRecord(MEDIA_STORE, {...cached, lastUsed: Date.now()}); // keeps it from being the next thing evicted
+        return {blob: cached.blob, fileType: cached.fileType};
+    }
+    // passing the hash lets the browser cache this exact version of the file as well
+    const response = await axios.get(`${cardsUrl}${card._id}/file`, {responseType: "blob", params: {v: card.file.hash}});
+    const fileType = response.headers["content-type"];
+    await removeCardMedia(card._id); // older versions of the card's file will never be shown again
+    await writeRecord(MEDIA_STORE, {key: key, cardId: card._id, blob: response.data, fileType: fileType, size: response.data.size, lastUsed: Date.now()});
+    evictMedia();
+    return {blob: response.data, fileType: fileType};
+}
+
+// parameters that are undefined are left out of both the request and the key
+function responseKey(url, params) {
+    return `${url}?${JSON.stringify(params)}`;
+}
+
+// this function opens the cache's database, resolving to null if IndexedDB isn't available
+function openDatabase() {
+    if (databasePromise === null) {
+        databasePromise = new Promise((resolve) => {
+            if (typeof indexedDB === "undefined") {
+                resolve(null);
+                return;
+            }
+            const request = indexedDB.open(DATABASE_NAME, DATABASE_VERSION);
+            request.onupgradeneeded = () => {
+                const database = request.result;
+                database.createObjectStore(RESPONSE_STORE, {keyPath: "key"});
+                const mediaStore = database.createObjectStore(MEDIA_STORE, {keyPath: "key"});
+                mediaStore.createIndex("cardId", "cardId");
+                mediaStore.createIndex("lastUsed", "lastUsed");
+            };
+            request.onsuccess = () => resolve(request.result);
+            request.onerror = () => {
+                console.log(request.error);
+                resolve(null);
+            };
+        });
+    }
+    return databasePromise;
+}
+
+// this function runs work(store) in a transaction on the named store and resolves to what it returns once the transaction completes
+// failures are only logged, the cache is never the only copy of anything so the caller carries on as if it were empty
+async function runTransaction(storeName, mode, work) {
+    const database = await openDatabase();
+    if (database === null) {
+        return undefined;
+    }
+    return new Promise((resolve) => {
+        let result;
+        try {
+            const transaction = database.transaction(storeName, mode);
+            result = work(transaction.objectStore(storeName));
+            transaction.oncomplete = () => resolve(typeof result === "function" ? result() : result);
+            transaction.onerror = () => {
+                console.log(transaction.error);
+                resolve(undefined);
+            };
+            transaction.onabort = transaction.onerror;
+        } catch (error) { // e.g. the database was deleted while the app was open
+            console.log(error);
+            resolve(undefined);
+        }
+    });
+}
+
+// resolves to the record stored under key, or undefined if there isn't one
+function readRecord(storeName, key) {
+    return runTransaction(storeName, "readonly", (store) => {
+        const request = store.get(key);
+        return () => request.result; // only read once the transaction completes
+    });
+}
+
+function writeRecord(storeName, record) {
+    return runTransaction(storeName, "readwrite", (store) => {
+        store.put(record);
+    });
+}
+
+function removeCardMedia(cardId) {
+    return runTransaction(MEDIA_STORE, "readwrite", (store) => {
+        store.index("cardId").openKeyCursor(IDBKeyRange.only(cardId)).onsuccess = (event) => {
+            const cursor = event.target.result;
+            if (cursor !== null) {
+                store.delete(cursor.primaryKey);
+                cursor.continue();
+            }
+        };
+    });
+}
+
+// this function removes the least recently used media until what's left fits in MEDIA_BUDGET_BYTES
+// it walks the media from the most recently used, keeping files until the budget is used up and removing everything after that
+function evictMedia() {
+    let keptBytes = 0;
+    return runTransaction(MEDIA_STORE, "readwrite", (store) => {
+        store.index("lastUsed").openCursor(null, "prev").onsuccess = (event) => {
+            const cursor = event.target.result;
+            if (cursor === null) {
+                return;
+            }
+            keptBytes += cursor.value.size;
+            if (keptBytes > MEDIA_BUDGET_BYTES) {
+                cursor.delete();
+            }
+            cursor.continue();
+        };
+    });
+}
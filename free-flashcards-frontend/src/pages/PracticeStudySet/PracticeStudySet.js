@@ -1,48 +1,89 @@
-import { useEffect, useState } from 'react';
+import { useEffect, useRef, useState } from 'react';
 import { useParams } from 'react-router';
 import { Link } from 'react-router-dom';
-import axios from 'axios';
+import { fetchCardMedia, fetchWithCache } from '../../data/flashcardCache.js';
+import CardMedia from '../../CardMedia.js';
 
-export default function StudyFlashcards({studySets}) {
+// how many cards either side of the current one are loaded ahead of time, the set wraps around so both directions are one click away
+const DEFAULT_PREFETCH_DISTANCE = 3;
+const SET_URL = "http://localhost:3001/sets/"; // we append a set's id to get its card order
+const CARDS_URL = "http://localhost:3001/cards/"; // we append a card's id to get the card, and "/file" to get the raw contents of its file
+
+export default function StudyFlashcards({studySets, prefetchDistance = DEFAULT_PREFETCH_DISTANCE}) {
     
     // this holds the current card being studied
     const [currentCardIndex, setCurrentCardIndex] = useState(0); // a study set with no cards should never be saved, so this shouldn't cause an error
     // this boolean indicates whether the user is being prompted or seeing the card's answer
     const [onPromptSide, setOnPromptSide] = useState(true);
-    // this holds the study set - we need to be able to fetch the cards from the ids contained on the homepage, so we need to be able to update the set we are passed down
+    // this holds the study set, its cardIds are the set's card order
     const [studiedSet, setStudiedSet] = useState(getStudiedSet(useParams().id, studySets));
-    
-    // this hook to fetches the cards in the targeted study set ONLY when the component mounts
+    // the cards near the current one that have loaded, by id. Cards (and their files) are released once they're far behind us
+    const [loadedCards, setLoadedCards] = useState({});
+    // the ids of cards we've started loading, so moving back and forth doesn't request the same card twice
+    const requestedCardIdsRef = useRef(new Set());
+    // the ids of the cards close enough to the current one to be kept, so a card that finishes loading after we've moved far away from it isn't kept
+    const keptCardIdsRef = useRef(new Set());
+
+    // the homepage's copy of the set's card order is used straight away, and the set's current order replaces it once the API answers
     useEffect(() => { 
-        const cardsUrl = "http://localhost:3001/cards/"; // just need to append a card's id to make this a get request
-        
         if (studiedSet === null || studiedSet === undefined) { // if the targeted study set doesn't exist we shouldnt be trying to fetch its cards
             return;
         }
-        Promise.all(
-            studiedSet.cardIds.map((cardId) => axios.get(`${cardsUrl}${cardId}`)) 
-        ).then((data) => { // letting all the promises resolve before continuing
-            let addedCards = data.map((card) => { // creating an array containing all the fetched card data from the API
-                if (card.data.file !== undefined) { // if the card contains a file
-                    let cardFile = card.data.file;
-                    return {prompt: card.data.prompt, response: card.data.response, userResponseType: card.data.userResponseType,
-                            fileJSON: {data: arrayBufferToBase64(cardFile.data.data), 
-                                       fileType: cardFile.fileType, partOfPrompt: cardFile.partOfPrompt}};
-                } 
-                return {prompt: card.data.prompt, response: card.data.response, userResponseType: card.data.userResponseType}
-            });
-            setStudiedSet({...studiedSet, cards: addedCards}); // adding the fetched card data to the study set
-            console.log(addedCards);
+        fetchWithCache(`${SET_URL}${studiedSet.id}`, {}, (set) => {
+            setStudiedSet((previousSet) => ({...previousSet, title: set.title, cardIds: set.cards}));
+            setCurrentCardIndex((index) => index < set.cards.length ? index : 0); // cards may have been removed from the set since the homepage loaded it
         }).catch((error) => {
             console.log(error);
-        })        
+        });
     // eslint-disable-next-line
-    }, []); // we only want to fetch & update the cards one time so we don't include a dependency array
+    }, []); // we only want to fetch the set's order one time so we don't include a dependency array
+
+    // this hook loads the cards within prefetchDistance of the current card (nearest first) and releases those more than twice as far away
+    // only these cards are ever requested, so how long the first card takes doesn't depend on how many cards the set has
+    useEffect(() => {
+        if (studiedSet === null || studiedSet === undefined || studiedSet.cardIds.length === 0) {
+            return;
+        }
+        const cardIds = studiedSet.cardIds;
+        const windowCardIds = getWindowCardIds(cardIds, currentCardIndex, prefetchDistance);
+        const keptCardIds = new Set(getWindowCardIds(cardIds, currentCardIndex, 2 * prefetchDistance));
+        keptCardIdsRef.current = keptCardIds;
+        requestedCardIdsRef.current = new Set([...requestedCardIdsRef.current].filter((cardId) => keptCardIds.has(cardId)));
+        setLoadedCards((previousCards) => { // releasing the cards we've moved far away from
+            const releasedCardIds = Object.keys(previousCards).filter((cardId) => !keptCardIds.has(cardId));
+            if (releasedCardIds.length === 0) {
+                return previousCards;
+            }
+            let keptCards = {...previousCards};
+            releasedCardIds.forEach((cardId) => delete keptCards[cardId]);
+            return keptCards;
+        });
+
+        for (const cardId of windowCardIds) {
+            if (requestedCardIdsRef.current.has(cardId)) {
+                continue;
+            }
+            requestedCardIdsRef.current.add(cardId);
+            // a card we've seen before (e.g. in quiz mode) is shown from the cache straight away, and replaced if the API's copy is different
+            fetchWithCache(`${CARDS_URL}${cardId}`, {}, (card) => {
+                loadCard(CARDS_URL, card).then((loadedCard) => {
+                    if (keptCardIdsRef.current.has(cardId)) {
+                        setLoadedCards((previousCards) => ({...previousCards, [cardId]: loadedCard}));
+                    }
+                }).catch((error) => {
+                    console.log(error);
+                });
+            }).catch((error) => {
+                console.log(error);
+                requestedCardIdsRef.current.delete(cardId); // so coming back to this card tries again
+            });
+        }
+    }, [studiedSet, currentCardIndex, prefetchDistance]);
     
     // this function is used to cycle through a set's flashcards, it is invoked when a user clicks the "back" button
     function decreaseCardIndex() {
         if (currentCardIndex === 0) { // avoiding making the index negative
-            setCurrentCardIndex(studiedSet.cards.length - 1); // going to the end of the set
+            setCurrentCardIndex(studiedSet.cardIds.length - 1); // going to the end of the set
         } else {
             setCurrentCardIndex(currentCardIndex - 1);
         }
@@ -50,12 +91,11 @@ export default function StudyFlashcards({studySets}) {
     }
     // this function is used to cycle through a set's flashcards, it is invoked when a user clicks the "forward" button
     function increaseCardIndex() {
-        setCurrentCardIndex((currentCardIndex + 1) % studiedSet.cards.length); // wrapping back to 0
+        setCurrentCardIndex((currentCardIndex + 1) % studiedSet.cardIds.length); // wrapping back to 0
         setOnPromptSide(true); // we should always start on the prompt side when we change cards
     }
     // this function handles producing the JSX for a flashcard and handles if the card contains a file or not
-    function getCardJSX() {
-        const currentCard = studiedSet.cards[currentCardIndex];
+    function getCardJSX(currentCard) {
         const standardJSX = <h2 className="flashcard-text">{onPromptSide ? currentCard.prompt : currentCard.response}</h2>
         if (currentCard.fileJSON === undefined) { // if the card doesn't have a file our job is easy
             return standardJSX;
@@ -64,10 +104,9 @@ export default function StudyFlashcards({studySets}) {
             return standardJSX;
         }
         // if we get here then there should be a file on the displayed side of the flashcard
-        const fileJSX = generateFileJSX(currentCard.fileJSON.fileType, currentCard.fileJSON.data);
         return <>
             {standardJSX}
-            {fileJSX}
+            <CardMedia blob={currentCard.fileJSON.blob} fileType={currentCard.fileJSON.fileType}/>
             <br/>
         </>
     }
@@ -76,18 +115,24 @@ export default function StudyFlashcards({studySets}) {
     // we will use this to stop the application from crashing if the targeted study set doesn't exist
     if (studiedSet === null || studiedSet === undefined) {
         pageContent = <h1>This study set doesn't seem to exist...</h1>
-    } else if (studiedSet.cards === undefined) { // this occurs if the cards are loading, we should have a special case if the set has no cards
+    } else if (studiedSet.cardIds.length === 0) {
+        pageContent = <h1 className="set-title">{studiedSet.title} has no cards to study</h1>
+    } else if (loadedCards[studiedSet.cardIds[currentCardIndex]] === undefined) { // this occurs while the current card is loading
         pageContent = <>
             <h1 className="set-title">Studying: {studiedSet.title}</h1>
             <div className="current-flashcard">
                 <button onClick={() => setOnPromptSide(!onPromptSide)} className="flip-flashcard">Flip</button>
             </div>
+        
+            <button onClick={decreaseCardIndex} className="flashcard-navigation">Back</button>
+            <button onClick={increaseCardIndex} className="flashcard-navigation">Next</button>
+            <br/>
         </>
     } else {
         pageContent = <>    
             <h1 className="set-title">Studying: {studiedSet.title}</h1>
             <div className="current-flashcard">
-                {getCardJSX()}
+                {getCardJSX(loadedCards[studiedSet.cardIds[currentCardIndex]])}
                 <button onClick={() => setOnPromptSide(!onPromptSide)} className="flip-flashcard">Flip</button>
             </div>
         
@@ -115,22 +160,23 @@ function getStudiedSet(id, studySets) {
     return null; // we can't find a matching id
 }
 
-// This method takes a file buffer from a request and converts it to a Base64 string to be displayed by our application
-function arrayBufferToBase64(buffer) {
-    let binary = '';
-    const bytes = new Uint8Array(buffer);
-    for (let i = 0; i < bytes.byteLength; i++) { // by constructing our array iteratively we avoid errors from the call stack being too large
-        binary += String.fromCharCode(bytes[i]);
+// this function returns the ids of the cards within distance of the card at index, nearest first. The set wraps around in both directions
+function getWindowCardIds(cardIds, index, distance) {
+    let windowCardIds = [cardIds[index]];
+    for (let offset = 1; offset <= distance && windowCardIds.length < cardIds.length; offset++) {
+        windowCardIds.push(cardIds[(index + offset) % cardIds.length]);
+        windowCardIds.push(cardIds[(index - offset + cardIds.length) % cardIds.length]);
     }
-    return window.btoa(binary);
+    return [...new Set(windowCardIds)]; // in a small set the two directions meet
 }
 
-// this function generates the JSX to display a file 
-function generateFileJSX(mimetype, fileString) {
-    const mimetypeTokens = mimetype.split("/"); // mimetypes are of the form {type}/{format} e.g. image/png 
-    if (mimetypeTokens[0] === "image") {
-        return <img src={`data:image/${mimetypeTokens[1]};base64,${fileString}`} alt="upload"/>
-    } else if (mimetypeTokens[0] === "audio") {
-        return <audio controls="controls" src={`data:audio/${mimetypeTokens[1]};base64,${fileString}`}/>
+// this function resolves to the data we need to display a card, including its file's contents if it has one
+async function loadCard(cardsUrl, card) {
+    if (card.file === undefined) { // if the card doesn't contain a file we already have everything we need
+        return {prompt: card.prompt, response: card.response, userResponseType: card.userResponseType};
     }
-}
\ No newline at end of file
+    // card JSON only describes the file, so we fetch its bytes separately (or take them from the cache if we have this version of the file)
+    const cardFile = await fetchCardMedia(cardsUrl, card);
+    return {prompt: card.prompt, response: card.response, userResponseType: card.userResponseType,
+            fileJSON: {blob: cardFile.blob, fileType: cardFile.fileType, partOfPrompt: card.file.partOfPrompt}}; // the server may send an optimized copy in a different format
+}
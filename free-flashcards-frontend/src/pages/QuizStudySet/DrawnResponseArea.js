@@ -1,80 +1,147 @@
 import { useEffect, useRef, useState } from 'react'
+import { addStrokePoint, applyStrokeStyle, drawDrawing, drawStrokeSegment } from './strokeDrawing.js';
 
-export default function DrawnResponseArea({setDrawnResponse}) {
+// The user's drawing is kept as a list of strokes (see strokeDrawing.js), which is what's passed to setDrawnResponse when a stroke ends
+// Drawing uses pointer events so a mouse, a finger or a pen all work. Each event's coalesced events are recorded as well, so fast strokes keep
+// every point the browser saw, and the new parts of a stroke are drawn at most once per animation frame rather than once per event
+export default function DrawnResponseArea({initialDrawing, setDrawnResponse}) {
 
     // this will hold our canvas so we can access and display it later
-    const canvasRef = useRef(null); 
-    
-    // this will hold information about how we draw on the canvas - text color, line style, etc - as well as our current action being performed
-    const contextRef = useRef(null); 
+    const canvasRef = useRef(null);
+
+    // this will hold information about how we draw on the canvas - text color, line style, etc
+    const contextRef = useRef(null);
+
+    // the strokes that make up the drawing, and the stroke being drawn right now (null when no pointer is down)
+    const strokesRef = useRef([]);
+    const activeStrokeRef = useRef(null);
+    // the pointer drawing the active stroke and where the canvas was on the page when it went down, other pointers are ignored until it's lifted
+    const activePointerRef = useRef(null);
+    // the index in the active stroke of the first point that hasn't been drawn yet, and the animation frame that will draw it
+    const undrawnIndexRef = useRef(0);
+    const frameRef = useRef(null);
 
-    const [isDrawing, setIsDrawing] = useState(false);
-    
     // this variable can be toggled when we need to reset the canvas
     const [reset, setReset] = useState(false);
 
+    // the drawing made the last time this question was mounted, which is drawn back onto the canvas once and then forgotten so a reset clears it
+    const initialDrawingRef = useRef(initialDrawing);
+
     // sets up the canvas when the component mounts and resets the canvas when the value of 'reset' is toggled
     useEffect(() => {
-        const canvas = canvasRef.current; 
-        canvas.width = window.innerWidth / 3; // innerWidth is the browser viewport width
-        canvas.height = window.innerWidth / 3; // the drawing area will be a square side length = 1/3rd the browser's height
-        canvas.style.width = `${window.innerWidth / 3}px`;
-        canvas.style.height = `${window.innerWidth / 3}px`;
+        const canvas = canvasRef.current;
+        const initialDrawing = initialDrawingRef.current;
+        // a drawing we're putting back keeps the size it was drawn at, so the strokes added to it line up with the ones it already has
+        const hasInitialDrawing = initialDrawing !== undefined && initialDrawing !== "";
+        canvas.width = hasInitialDrawing ? initialDrawing.width : window.innerWidth / 3; // innerWidth is the browser viewport width
+        canvas.height = hasInitialDrawing ? initialDrawing.height : window.innerWidth / 3; // the drawing area will be a square side length = 1/3rd the browser's height
+        canvas.style.width = `${canvas.width}px`;
+        canvas.style.height = `${canvas.height}px`;
 
         const context = canvas.getContext("2d"); // this allows us to draw on the canvas
-        context.lineCap = "round"; // line endings are round, this makes it look better
-        context.strokeStyle = "black"; // defining the color we draw in
-        context.lineWidth = 2; // defining how large the strokes are
-
+        applyStrokeStyle(context);
         contextRef.current = context;
-        setDrawnResponse(""); // when this functionality is invoked we shouldn't have an image to display, this ensures that reset will also clear the response image in the QuizStudySet component
+
+        strokesRef.current = [];
+        activeStrokeRef.current = null;
+        activePointerRef.current = null;
+        if (hasInitialDrawing) {
+            strokesRef.current = initialDrawing.strokes;
+            drawDrawing(context, initialDrawing);
+            initialDrawingRef.current = undefined;
+        }
 
         // by making this depend on the reset state variable, we reset our canvas and canvas context every time
         // the value of reset changes, allowing us to freely reset the drawing whenever we need to
-    }, [reset]); 
+    }, [reset]);
 
-    // invoked when the mouse is pressed, this begins a new path on the canvas
+    // a frame that's still waiting to draw when we're unmounted has nothing left to draw on
+    useEffect(() => {
+        return () => cancelAnimationFrame(frameRef.current);
+    }, []);
+
+    // clears the canvas, and the response in the QuizStudySet component along with it
+    function resetDrawing() {
+        cancelAnimationFrame(frameRef.current);
+        frameRef.current = null;
+        setReset(!reset);
+        setDrawnResponse("");
+    }
+
+    // invoked when a pointer is pressed on the canvas, this begins a new stroke
     function startDrawing(event) {
-        // getting the coordinates of the mouse when the event occurred
-        const {offsetX, offsetY} = event.nativeEvent;       
+        if (activePointerRef.current !== null || (event.pointerType === "mouse" && event.button !== 0)) { // only the left mouse button draws
+            return;
+        }
+        event.preventDefault();
+        canvasRef.current.setPointerCapture(event.pointerId); // we keep getting this pointer's events if it strays off the canvas mid-stroke
+        const bounds = canvasRef.current.getBoundingClientRect();
+        activePointerRef.current = {id: event.pointerId, left: bounds.left, top: bounds.top};
+        activeStrokeRef.current = [];
+        undrawnIndexRef.current = 0;
+        addStrokePoint(activeStrokeRef.current, event.clientX - bounds.left, event.clientY - bounds.top);
+        requestDraw();
+    }
 
-        contextRef.current.beginPath(); // begins drawing a new path
-        contextRef.current.moveTo(offsetX, offsetY); // moves the path to the position of the mouse
-        setIsDrawing(true);
+    // This function records the points a pointer passes through as it's dragged across the canvas
+    function draw(event) {
+        const pointer = activePointerRef.current;
+        if (pointer === null || event.pointerId !== pointer.id) { // we only want to draw on the canvas while the pointer that started the stroke is down
+            return;
+        }
+        // the browser may merge several moves into one event, the coalesced events are the points it merged
+        const nativeEvent = event.nativeEvent;
+        const coalescedEvents = typeof nativeEvent.getCoalescedEvents === "function" ? nativeEvent.getCoalescedEvents() : [];
+        for (const pointerEvent of coalescedEvents.length > 0 ? coalescedEvents : [nativeEvent]) {
+            addStrokePoint(activeStrokeRef.current, pointerEvent.clientX - pointer.left, pointerEvent.clientY - pointer.top);
+        }
+        requestDraw();
     }
 
-    // invoked when the mouse is released, this stops the path currently being drawn on the canvas
-    function stopDrawing() {
-        contextRef.current.closePath(); // ends the current path being drawn
-        setIsDrawing(false);
+    // invoked when the pointer is lifted (or the browser takes it over, e.g. for a gesture), this ends the stroke and saves the drawing
+    function stopDrawing(event) {
+        const pointer = activePointerRef.current;
+        if (pointer === null || event.pointerId !== pointer.id) {
+            return;
+        }
+        cancelAnimationFrame(frameRef.current);
+        drawPendingPoints(); // anything still waiting for a frame is drawn now
+        strokesRef.current = [...strokesRef.current, activeStrokeRef.current];
+        activeStrokeRef.current = null;
+        activePointerRef.current = null;
+        // once we stop drawing we want to save our changes. Finished strokes are never changed, so the strokes array is all that's copied
+        setDrawnResponse({width: canvasRef.current.width, height: canvasRef.current.height, strokes: strokesRef.current});
+    }
 
-        // once we stop drawing we want to save our changes - this exports a data url that can be used to display our response
-        const canvasDataURL = canvasRef.current.toDataURL();
-        setDrawnResponse(canvasDataURL);
+    // this function makes sure the active stroke's new points are drawn in the next animation frame
+    function requestDraw() {
+        if (frameRef.current === null) {
+            frameRef.current = requestAnimationFrame(drawPendingPoints);
+        }
     }
 
-    // This function draws on the canvas as the user drags the mouse
-    function draw(event) {
-        if (!isDrawing) { // we only want to draw on the canvas if we are drawing (ie mouse is down)
+    // this function draws the part of the active stroke that hasn't been drawn yet, starting from the last point that has
+    // so each frame only strokes the new segments, instead of the whole path so far
+    function drawPendingPoints() {
+        frameRef.current = null;
+        const stroke = activeStrokeRef.current;
+        if (stroke === null || undrawnIndexRef.current >= stroke.length) {
             return;
         }
-        // getting the coordinates of the mouse when the event occurred
-        const {offsetX, offsetY} = event.nativeEvent;
-        
-        // drawing a line to the target mouse coordinates
-        contextRef.current.lineTo(offsetX, offsetY);
-        contextRef.current.stroke();
+        drawStrokeSegment(contextRef.current, stroke, Math.max(undrawnIndexRef.current - 2, 0));
+        undrawnIndexRef.current = stroke.length;
     }
 
     return <>
         <canvas
-            onMouseDown={startDrawing}
-            onMouseUp={stopDrawing}
-            onMouseMove={draw}
+            onPointerDown={startDrawing}
+            onPointerMove={draw}
+            onPointerUp={stopDrawing}
+            onPointerCancel={stopDrawing}
             ref={canvasRef}
             className="drawing-canvas"
         />
         <br/>
-        <button onClick={() => setReset(!reset)}>Reset</button>
+        <button onClick={resetDrawing}>Reset</button>
     </>
-}
\ No newline at end of file
+}
@@ -0,0 +1,42 @@
+import { useEffect, useState } from 'react';
+import { applyStrokeStyle, drawDrawing, isDrawingBlank } from './strokeDrawing.js';
+
+// Shows a drawn response as an image. The drawing's strokes are only encoded into a PNG here, once it has to be displayed
+// the image is kept as a Blob behind an object URL, which is revoked when this is unmounted or given a different drawing
+export default function DrawnResponseImage({drawing}) {
+
+    // {drawing, url} for the image the effect below encoded, null until it has
+    const [image, setImage] = useState(null);
+
+    useEffect(() => {
+        if (isDrawingBlank(drawing)) {
+            return;
+        }
+        let url = null;
+        let unmounted = false;
+        const canvas = document.createElement("canvas"); // never added to the page, it's only used to encode the image
+        canvas.width = drawing.width;
+        canvas.height = drawing.height;
+        const context = canvas.getContext("2d");
+        applyStrokeStyle(context);
+        drawDrawing(context, drawing);
+        canvas.toBlob((blob) => { // toBlob encodes off the main thread where it can, unlike toDataURL
+            if (unmounted || blob === null) {
+                return;
+            }
+            url = URL.createObjectURL(blob);
+            setImage({drawing: drawing, url: url});
+        }, "image/png");
+        return () => {
+            unmounted = true;
+            if (url !== null) {
+                URL.revokeObjectURL(url);
+            }
+        };
+    }, [drawing]);
+
+    if (image === null || image.drawing !== drawing) { // an image made for a previous drawing has already been revoked
+        return <></>
+    }
+    return <img src={image.url} alt="User Drawn Response"/>
+}
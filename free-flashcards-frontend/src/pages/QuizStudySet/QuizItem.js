@@ -1,7 +1,10 @@
+import { memo } from 'react';
 import RecordResponse from './RecordResponse';
 import DrawnResponseArea from './DrawnResponseArea';
+import CardMedia from '../../CardMedia.js';
 
-export default function QuizItem({quizzedFlashcard, updateQuizResponse}) {
+// initialResponse is whatever the user had answered the last time this question was mounted, it's only read when the question mounts
+function QuizItem({quizzedFlashcard, initialResponse, updateQuizResponse}) {
 
     // this function updates the user's response to the question contained by this component 
     function handleResponseChange(event) {
@@ -21,7 +24,7 @@ export default function QuizItem({quizzedFlashcard, updateQuizResponse}) {
     } else {
         promptJSX = <>
             <h3 className="quiz-question">{quizzedFlashcard.prompt}</h3>
-            {generateFileJSX(quizzedFlashcard.fileJSON.fileType, quizzedFlashcard.fileJSON.data,)}<br/>
+            <CardMedia blob={quizzedFlashcard.fileJSON.blob} fileType={quizzedFlashcard.fileJSON.fileType}/><br/>
         </>
     }
 
@@ -30,26 +33,20 @@ export default function QuizItem({quizzedFlashcard, updateQuizResponse}) {
     if (quizzedFlashcard.userResponseType === "text") {
         responseJSX = <>
             <label htmlFor={quizzedFlashcard.id}>Response: </label>
-            <input type="text" name="response" id={quizzedFlashcard.id} onChange={handleResponseChange}/>
+            <input type="text" name="response" id={quizzedFlashcard.id} defaultValue={initialResponse} onChange={handleResponseChange}/>
         </>
     } else if (quizzedFlashcard.userResponseType === "recorded") {
-        responseJSX = <RecordResponse setAudioData={handleFileResponse}/>
+        responseJSX = <RecordResponse initialAudioURL={initialResponse} setAudioData={handleFileResponse}/>
     } else if (quizzedFlashcard.userResponseType === "drawn") {
-        responseJSX = <DrawnResponseArea setDrawnResponse={handleFileResponse}/>
+        responseJSX = <DrawnResponseArea initialDrawing={initialResponse} setDrawnResponse={handleFileResponse}/>
     }
     
-    return <div className="quiz-question-container" key={quizzedFlashcard.id}>
+    return <div className="quiz-question-container">
         {promptJSX}
         {responseJSX}
     </div>
 }
 
-// this function generates the JSX to display a file 
-function generateFileJSX(mimetype, fileString) {
-    const mimetypeTokens = mimetype.split("/"); // mimetypes are of the form {type}/{format} e.g. image/png 
-    if (mimetypeTokens[0] === "image") {
-        return <img src={`data:image/${mimetypeTokens[1]};base64,${fileString}`} alt="upload"/>
-    } else if (mimetypeTokens[0] === "audio") {
-        return <audio controls="controls" src={`data:audio/${mimetypeTokens[1]};base64,${fileString}`}/>
-    }
-}
\ No newline at end of file
+// a question only re-renders when the props it was given change, not every time the quiz does
+export default memo(QuizItem);
+
@@ -0,0 +1,24 @@
+import { memo, useEffect, useRef } from 'react';
+import QuizItem from './QuizItem';
+
+// Holds one question's place in the quiz. The question itself is only mounted while it's near the viewport (isNearby), otherwise the slot
+// is an empty box of placeholderHeight so the page keeps its length and the scrollbar doesn't jump
+// the slot is watched by the quiz's IntersectionObserver, which is how QuizStudySet knows which questions are near the viewport
+function QuizQuestionSlot({observer, quizzedFlashcard, questionNumber, isNearby, placeholderHeight, initialResponse, updateQuizResponse}) {
+
+    const slotRef = useRef(null);
+
+    useEffect(() => {
+        const slot = slotRef.current;
+        observer.observe(slot);
+        return () => observer.unobserve(slot);
+    }, [observer]);
+
+    return <div className="quiz-question-slot" data-card-id={quizzedFlashcard.id} ref={slotRef} style={isNearby ? undefined : {height: `${placeholderHeight}px`}}>
+        <h1 className="quiz-question-number">{questionNumber}</h1>
+        {isNearby ? <QuizItem quizzedFlashcard={quizzedFlashcard} initialResponse={initialResponse} updateQuizResponse={updateQuizResponse}/> : <></>}
+    </div>
+}
+
+// a slot only re-renders when one of its own props changes, so typing in one question never re-renders the others
+export default memo(QuizQuestionSlot);
@@ -1,3 +1,6 @@
+import CardMedia from '../../CardMedia.js';
+import DrawnResponseImage from './DrawnResponseImage';
+
 export default function QuizResultItem({quizzedFlashcard, quizResponse, answers, updateCorrectness}) {
 
     // this function handles a change to the buttons that allow a user to manually mark their answers
@@ -15,7 +18,7 @@ export default function QuizResultItem({quizzedFlashcard, quizResponse, answers,
     } else {
         displayedPromptJSX = <>
             <h4>Prompt: {quizzedFlashcard.prompt}</h4>
-            {generateFileJSX(quizzedFlashcard.fileJSON.fileType, quizzedFlashcard.fileJSON.data)}
+            <CardMedia blob={quizzedFlashcard.fileJSON.blob} fileType={quizzedFlashcard.fileJSON.fileType}/>
         </>
     }
 
@@ -24,7 +27,7 @@ export default function QuizResultItem({quizzedFlashcard, quizResponse, answers,
     if (quizzedFlashcard.userResponseType === "drawn") { // we need to know if our response data contains some sort of file
         displayedUserResponseJSX = <>
             <h4>Your response: </h4>
-            <img src={quizResponse.responseData} alt="User Drawn Response"/>
+            <DrawnResponseImage drawing={quizResponse.responseData}/>
         </>
     } else if (quizzedFlashcard.userResponseType === "recorded") {
         displayedUserResponseJSX = <>
@@ -44,7 +47,7 @@ export default function QuizResultItem({quizzedFlashcard, quizResponse, answers,
     } else {
         displayedCardResponseJSX = <>
             <h4>Intended Response: {quizzedFlashcard.response}</h4>
-            {generateFileJSX(quizzedFlashcard.fileJSON.fileType, quizzedFlashcard.fileJSON.data)}
+            <CardMedia blob={quizzedFlashcard.fileJSON.blob} fileType={quizzedFlashcard.fileJSON.fileType}/>
         </>
     }
 
@@ -91,13 +94,3 @@ function findMatchingAnswer(id, answers) {
     }
     return undefined;
 }
-
-// this function generates the needed JSX for a file using its mimetype and a base64 file string
-function generateFileJSX(mimetype, fileString) {
-    const mimetypeTokens = mimetype.split("/"); // mimetypes are of the form {type}/{format} e.g. image/png 
-    if (mimetypeTokens[0] === "image") {
-        return <img src={`data:image/${mimetypeTokens[1]};base64,${fileString}`} alt="upload"/>
-    } else if (mimetypeTokens[0] === "audio") {
-        return <audio controls="controls" src={`data:audio/${mimetypeTokens[1]};base64,${fileString}`}/>
-    }
-}
\ No newline at end of file
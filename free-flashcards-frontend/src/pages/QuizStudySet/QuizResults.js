@@ -1,4 +1,4 @@
-import { useRef } from 'react';
+import { Fragment, useRef } from 'react';
 import { useParams } from 'react-router';
 import axios from 'axios';
 import QuizResultItem from './QuizResultItem';
@@ -48,17 +48,17 @@ export default function QuizResults({responses, quizzedSet}) {
     let displayedResponses = [];
     for (let i = 0; i < responses.length; i++) {
         const matchingCard = quizzedSet.cards[i];
-        displayedResponses.push({questionNumber: (i + 1), 
+        displayedResponses.push({questionNumber: (i + 1), id: matchingCard.id,
                                 questionContent: <QuizResultItem quizzedFlashcard={matchingCard} quizResponse={responses[i]} updateCorrectness={updateCorrectness} answers={answersRef.current}/>});
     }
 
     return <>
         <h1>Quiz Results</h1>
         {displayedResponses.map((response) => {
-            return <>
-                <h1 className="quiz-question-number" key={response.questionNumber}>{response.questionNumber}</h1>
+            return <Fragment key={response.id}>
+                <h1 className="quiz-question-number">{response.questionNumber}</h1>
                 {response.questionContent}
-            </>
+            </Fragment>
         })}
         <br/>
         <button className="submit-quiz-result-button" onClick={submitResults}>Submit Results</button>
@@ -1,87 +1,114 @@
-import { useEffect, useState } from 'react';
+import { useCallback, useEffect, useRef, useState } from 'react';
 import { useParams } from 'react-router';
-import axios from 'axios';
-import QuizItem from './QuizItem';
+import { fetchCardMedia, fetchWithCache } from '../../data/flashcardCache.js';
+import QuizQuestionSlot from './QuizQuestionSlot';
 import QuizResults from './QuizResults';
+import { isDrawingBlank } from './strokeDrawing.js';
+
+// questions are mounted while they're within this many pixels of the viewport, so they're ready before they scroll into view
+const NEARBY_MARGIN_PX = 1500;
+// the height we give a question we haven't measured yet. Once a question has been mounted its real height is used instead
+const ESTIMATED_QUESTION_HEIGHT_PX = 250;
 
 export default function QuizStudySet({studySets}) {
 
     const [quizzedStudySet, setQuizzedStudySet] = useState(getStudiedSet(useParams().id, studySets));
 
-    // this is updated by the QuizItem elements
-    const [quizResponses, setQuizResponses] = useState([]);
+    // the user's responses by card id, written by the QuizItem elements. Nothing on the page is drawn from these while the quiz is being
+    // taken (a question only reads its response back when it's mounted again), so answering a question doesn't re-render anything
+    const quizResponsesRef = useRef(new Map());
 
-    // this is used to indicate if we are looking at quiz results or not
+    // this holds the responses we're showing results for, it is null until the quiz is submitted
     // TOOD: update the URL to display /results
         // we might be able to accomplish this with the Router module, but we can't define it on the homepage because we need quiz responses
-    const [quizSubmitted, setQuizSubmitted] = useState(false);
+    const [submittedResponses, setSubmittedResponses] = useState(null);
+
+    // the ids of the cards whose questions are near the viewport, and the heights of the questions that were mounted and then scrolled away from
+    const [nearbyCardIds, setNearbyCardIds] = useState(new Set());
+    const questionHeightsRef = useRef(new Map());
+    // one observer watches every question's slot. It's created on the first render and kept, so the slots never have to observe a new one
+    const [observer] = useState(() => new IntersectionObserver((entries) => {
+        setNearbyCardIds((previousCardIds) => {
+            let cardIds = new Set(previousCardIds);
+            for (const entry of entries) {
+                const cardId = entry.target.dataset.cardId;
+                if (entry.isIntersecting) {
+                    cardIds.add(cardId);
+                } else if (cardIds.delete(cardId)) { // it's still mounted, so this is its real height
+                    questionHeightsRef.current.set(cardId, entry.boundingClientRect.height);
+                }
+            }
+            return cardIds.size === previousCardIds.size && [...cardIds].every((cardId) => previousCardIds.has(cardId)) ? previousCardIds : cardIds;
+        });
+    }, {rootMargin: `${NEARBY_MARGIN_PX}px 0px`}));
+
+    useEffect(() => {
+        return () => observer.disconnect();
+    }, [observer]);
     
     useEffect(() => { // we need to fetch the cards in the targeted study set
-        const cardsUrl = "http://localhost:3001/cards/"; // just need to append a card's id to make this a get request URL
-        
         if (quizzedStudySet === null || quizzedStudySet === undefined) { // if the targeted study set doesn't exist we shouldnt be trying to fetch its cards
             return;
         }
-        Promise.all(
-            quizzedStudySet.cardIds.map((cardId) => axios.get(`${cardsUrl}${cardId}`)) 
-        ).then((data) => { // letting all the promises resolve before continuing
-            let addedCards = data.map((card) => { // creating an array containing all the fetched card data from the API
-                if (card.data.file !== undefined) { // if the card contains a file
-                    let cardFile = card.data.file;
-                    return {prompt: card.data.prompt, response: card.data.response, userResponseType: card.data.userResponseType, id: card.data._id,
-                            fileJSON: {data: arrayBufferToBase64(cardFile.data.data), 
-                                       fileType: cardFile.fileType, partOfPrompt: cardFile.partOfPrompt}};
-                } 
-                return {prompt: card.data.prompt, response: card.data.response, userResponseType: card.data.userResponseType, id: card.data._id}
+        const setCardsUrl = `http://localhost:3001/sets/${quizzedStudySet.id}/cards`; // returns every card in the set in one request
+        const cardsUrl = "http://localhost:3001/cards/"; // we append a card's id and "/file" to get the raw contents of its file
+        let latestLoad = 0; // the cached cards and the API's cards can both be loading at once, only the last ones asked for are kept
+        // the cards we cached last time (e.g. in practice mode) are shown straight away, and replaced if the API's cards are different
+        // responses are kept by card id, so anything already answered is kept when the cards are refreshed
+        fetchWithCache(setCardsUrl, {}, (setCards) => {
+            const load = ++latestLoad;
+            Promise.all(setCards.cards.map((card) => loadCard(cardsUrl, card))).then((addedCards) => { // letting all the file requests resolve before continuing
+                if (load !== latestLoad) {
+                    return;
+                }
+                setQuizzedStudySet({...quizzedStudySet, cards: addedCards}); // adding the fetched card data to the study set
+            }).catch((error) => {
+                console.log(error);
             });
-            setQuizzedStudySet({...quizzedStudySet, cards: addedCards}); // adding the fetched card data to the study set
-            setQuizResponses(addedCards.map((card) => {
-                return {id: card.id, userResponseType: card.userResponseType, responseData: ""};
-            }));
         }).catch((error) => {
             console.log(error);
         })        
     // eslint-disable-next-line
     }, []); // we only want to fetch & update the cards one time so we don't include a dependency array
 
-    // this method is used by QuizItem components to write their response contents to the quizResponses array
-    function updateQuizResponse(flashcardId, newResponseValue) {
-        setQuizResponses(quizResponses.map((response) => {
-            return response.id === flashcardId ? {...response, responseData: newResponseValue}: response
-        }));
-    }
+    // this method is used by QuizItem components to write their response contents, it never changes so it doesn't re-render them
+    const updateQuizResponse = useCallback((flashcardId, newResponseValue) => {
+        quizResponsesRef.current.set(flashcardId, newResponseValue);
+    }, []);
 
     // invoked by the 'submit' button at the bottom of the page
     function submitQuiz() {
+        // the responses in the quiz's order, a question that was never answered has a blank response
+        const quizResponses = quizzedStudySet.cards.map((card) => {
+            const responseData = quizResponsesRef.current.get(card.id);
+            return {id: card.id, userResponseType: card.userResponseType, responseData: responseData === undefined ? "" : responseData};
+        });
         // validate that all submissions have an answer - no "" data or whitespace-only responses
         if (!validateQuizResponses(quizResponses)) {
             alert("You didn't answer every question - please finish the quiz before submitting! If you refreshed the page, you may need to re-enter your responses");
             return;
         }
-        setQuizSubmitted(true);
+        setSubmittedResponses(quizResponses);
     }
 
-    let quizQuestions = []; // this contains an array of QuizItem components that we will then display
-    if (quizzedStudySet.cards !== null && quizzedStudySet.cards !== undefined) {
-        quizQuestions = quizzedStudySet.cards.map((card) => <QuizItem quizzedFlashcard={card} updateQuizResponse={updateQuizResponse}/>);
+    if (submittedResponses !== null) {
+        return <QuizResults responses={submittedResponses} quizzedSet={quizzedStudySet}/>
     }
-    for (let i = 0; i < quizQuestions.length; i++) { // adding question numbers to the array makes it easier to display them as part of the question
-        quizQuestions[i] = {questionContent: quizQuestions[i], questionNumber: i+1};
+    let quizQuestions = []; // this contains a slot for every question, only the ones near the viewport have their QuizItem mounted
+    if (quizzedStudySet !== null && quizzedStudySet.cards !== null && quizzedStudySet.cards !== undefined) {
+        quizQuestions = quizzedStudySet.cards.map((card, index) => {
+            const placeholderHeight = questionHeightsRef.current.get(card.id);
+            return <QuizQuestionSlot key={card.id} observer={observer} quizzedFlashcard={card} questionNumber={index + 1} 
+                                     isNearby={nearbyCardIds.has(card.id)} 
+                                     placeholderHeight={placeholderHeight === undefined ? ESTIMATED_QUESTION_HEIGHT_PX : placeholderHeight}
+                                     initialResponse={quizResponsesRef.current.get(card.id)} updateQuizResponse={updateQuizResponse}/>
+        });
     }
-    // this contains the JSX if a user is taking the quiz. Different content is displayed on a submission
-    const quizContent = <>
+    return <>
         <h1>Quiz</h1>
-        {quizQuestions.map((question) => {
-            return <>
-                <h1 className="quiz-question-number" key={question.questionNumber}>{question.questionNumber}</h1>{question.questionContent}
-            </>
-        })}
+        {quizQuestions}
         <button className="submit-quiz-button" onClick={submitQuiz}>Submit</button>
     </>
-    return <>
-        {quizSubmitted ? <QuizResults responses={quizResponses} quizzedSet={quizzedStudySet}/> : 
-                         quizContent}
-    </>
 
 }
 
@@ -98,21 +125,26 @@ function getStudiedSet(id, studySets) {
     return null; // we can't find a matching id
 }
 
-// This method takes a file buffer from a request and converts it to a Base64 string to be displayed by our application
-function arrayBufferToBase64(buffer) {
-    let binary = '';
-    const bytes = new Uint8Array(buffer);
-    for (let i = 0; i < bytes.byteLength; i++) { // by constructing our array iteratively we avoid errors from the call stack being too large
-        binary += String.fromCharCode(bytes[i]);
+// this function resolves to the data we need to quiz a card, including its file's contents if it has one
+async function loadCard(cardsUrl, card) {
+    if (card.file === undefined) { // if the card doesn't contain a file we already have everything we need
+        return {prompt: card.prompt, response: card.response, userResponseType: card.userResponseType, id: card._id};
     }
-    return window.btoa(binary);
+    // card JSON only describes the file, so we fetch its bytes separately (or take them from the cache if we have this version of the file)
+    const cardFile = await fetchCardMedia(cardsUrl, card);
+    return {prompt: card.prompt, response: card.response, userResponseType: card.userResponseType, id: card._id,
+            fileJSON: {blob: cardFile.blob, fileType: cardFile.fileType, partOfPrompt: card.file.partOfPrompt}}; // the server may send an optimized copy in a different format
 }
 
 // this function verifies that all the responses a user entered are valid. At the moment this only verifies that they don't contain only whitespace and aren't blank
 function validateQuizResponses(quizResponses) {
     for (let i = 0; i < quizResponses.length; i++) { 
         let quizResponse = quizResponses[i].responseData;
-        if (quizResponse.trim() === "") { // at the moment we only need to verify that the quiz response contains some non-whitespace characters
+        if (quizResponses[i].userResponseType === "drawn") { // drawn responses are strokes rather than text, they just need to have some
+            if (isDrawingBlank(quizResponse)) {
+                return false;
+            }
+        } else if (quizResponse.trim() === "") { // at the moment we only need to verify that the quiz response contains some non-whitespace characters
             return false;
         }
     }
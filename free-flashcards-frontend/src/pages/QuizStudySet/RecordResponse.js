@@ -1,10 +1,11 @@
 import { useRef, useState } from 'react';
 
-export default function RecordResponse({setAudioData}) {
+export default function RecordResponse({initialAudioURL, setAudioData}) {
 
     const [isRecording, setIsRecording] = useState(false);
     // this will contain a local website URL to the audio we record which will allow us to access it later
-    const [audioURL, setAudioURL] = useState(null);
+    // it starts as the recording made the last time this question was mounted, if there was one
+    const [audioURL, setAudioURL] = useState(initialAudioURL === undefined ? null : initialAudioURL);
     // these will contain the object that records audio and the data it produces, these do not need to update the application's appearance so we use useRef
     const mediaRecorder = useRef(null);
     const audioData = useRef([]);
@@ -21,6 +22,9 @@ export default function RecordResponse({setAudioData}) {
         // creating a new audio URL for the recorded data and storing it
         const audioBlob = new Blob(audioData.current, { type: 'audio/wav' });
         const url = URL.createObjectURL(audioBlob);
+        if (audioURL !== null) { // a new recording replaces the last one in the quiz's responses, so nothing can play the old one any more
+            URL.revokeObjectURL(audioURL);
+        }
         setAudioURL(url);
         setAudioData(url);
         
@@ -0,0 +1,56 @@
+// Drawn responses are stored as the strokes that made them rather than as an image: {width, height, strokes}
+// width and height are the size of the canvas they were drawn on, and each stroke is a flat array of whole-pixel points [x0, y0, x1, y1, ...]
+// points are rounded to the nearest pixel and a point on the same pixel as the one before it is dropped, so a drawing stays a few KB
+// A drawing is only turned into an image when one is needed (see DrawnResponseImage.js)
+
+// the style every stroke is drawn in, on the response canvas and when the drawing is turned into an image
+export function applyStrokeStyle(context) {
+    context.lineCap = "round"; // line endings are round, this makes it look better
+    context.lineJoin = "round"; // so do the corners between the parts of a stroke that were drawn in different frames
+    context.strokeStyle = "black"; // defining the color we draw in
+    context.lineWidth = 2; // defining how large the strokes are
+}
+
+// this function adds a point to a stroke, returning whether it was added (false if it's on the same pixel as the stroke's last point)
+export function addStrokePoint(stroke, x, y) {
+    const roundedX = Math.round(x);
+    const roundedY = Math.round(y);
+    if (stroke.length >= 2 && stroke[stroke.length - 2] === roundedX && stroke[stroke.length - 1] === roundedY) {
+        return false;
+    }
+    stroke.push(roundedX, roundedY);
+    return true;
+}
+
+// this function draws the part of a stroke from the point at fromIndex (an index into its flat array of coordinates) to its end
+// a stroke that's a single point is drawn as a dot, so a tap on the canvas still leaves a mark
+export function drawStrokeSegment(context, stroke, fromIndex) {
+    if (stroke.length === 2) {
+        context.beginPath();
+        context.arc(stroke[0], stroke[1], context.lineWidth / 2, 0, 2 * Math.PI);
+        context.fillStyle = context.strokeStyle;
+        context.fill();
+        return;
+    }
+    context.beginPath();
+    context.moveTo(stroke[fromIndex], stroke[fromIndex + 1]);
+    for (let i = fromIndex + 2; i < stroke.length; i += 2) {
+        context.lineTo(stroke[i], stroke[i + 1]);
+    }
+    context.stroke();
+}
+
+// this function draws a whole drawing onto a canvas context, scaling it if the canvas isn't the size it was drawn on
+export function drawDrawing(context, drawing) {
+    context.save();
+    context.scale(context.canvas.width / drawing.width, context.canvas.height / drawing.height);
+    for (const stroke of drawing.strokes) {
+        drawStrokeSegment(context, stroke, 0);
+    }
+    context.restore();
+}
+
+// a blank drawn response is "" (nothing has been drawn since the question was mounted or reset) or a drawing with no strokes
+export function isDrawingBlank(drawing) {
+    return drawing === "" || drawing === undefined || drawing.strokes.length === 0;
+}
@@ -1,22 +1,44 @@
 import requests
+from requests.adapters import HTTPAdapter
+import json
 
 """
 This file provides methods to make HTTP calls to the application API when we execute our backend tests
 Each method requires an expected status code when making the request, which defaults to 200 OK
+Every call goes through one keep-alive session, so a test file reuses a few connections instead of opening a new one for every request
+It also provides fixtures that create the sets and cards a test uses through the API and delete them once the test finishes
+    Tests only touch records they created themselves, so they can run in any order and in parallel (e.g. "python -m pytest -n auto" with pytest-xdist)
+The API can be launched with "npm test" against the test db, or with "npm run test-memory" to keep everything in memory without a db
 """
 
+API_URL = "http://localhost:3002"
+
+# the pool is as large as the most threads a test sends requests from at once, otherwise the extra connections are closed after every request
+session = requests.Session()
+session.mount("http://", HTTPAdapter(pool_maxsize=50))
+
 # For API calls using GET, request parameters and header default to empty
 def get_rest_call(test, url, request_parameters = {}, request_header = {}, expected_code = 200):
-    response = requests.get(url, request_parameters, headers = request_header)
+    response = session.get(url, params = request_parameters, headers = request_header)
 
     # this assertEqual relies on the calling test method passing itself to this method
     test.assertEqual(expected_code, response.status_code,
                      f"Response code to {url} GET was {response.status_code} instead of {expected_code}")
     return response.json()
 
+# For API calls using GET that return raw bytes instead of a json (e.g. a card's file), request parameters and header default to empty
+# This returns the whole response so the calling test can inspect its headers and content
+def get_raw_rest_call(test, url, request_parameters = {}, request_header = {}, expected_code = 200):
+    response = session.get(url, params = request_parameters, headers = request_header)
+
+    # this assertEqual relies on the calling test method passing itself to this method
+    test.assertEqual(expected_code, response.status_code,
+                     f"Response code to {url} GET was {response.status_code} instead of {expected_code}")
+    return response
+
 # For API calls using POST, request parameters and header default to empty
 def post_rest_call(test, url, request_parameters = {}, request_header = {}, attached_files = {}, expected_code = 200):
-    response = requests.post(url, request_parameters, headers = request_header, files = attached_files)
+    response = session.post(url, request_parameters, headers = request_header, files = attached_files)
 
      # this assertEqual relies on the calling test method passing itself to this method
     test.assertEqual(expected_code, response.status_code,
@@ -25,7 +47,7 @@ def post_rest_call(test, url, request_parameters = {}, request_header = {}, atta
 
 # For API calls using PUT, request parameters and header default to empty
 def put_rest_call(test, url, request_parameters = {}, request_header = {}, attached_files = {}, expected_code = 200):
-    response = requests.put(url, request_parameters, headers = request_header, files = attached_files)
+    response = session.put(url, request_parameters, headers = request_header, files = attached_files)
 
      # this assertEqual relies on the calling test method passing itself to this method
     test.assertEqual(expected_code, response.status_code,
@@ -34,10 +56,26 @@ def put_rest_call(test, url, request_parameters = {}, request_header = {}, attac
 
 # For API calls using DELETE, request parameters and header default to empty
 def delete_rest_call(test, url, request_header = {}, expected_code = 200):
-    response = requests.delete(url, headers = request_header)
+    response = session.delete(url, headers = request_header)
 
      # this assertEqual relies on the calling test method passing itself to this method
     test.assertEqual(expected_code, response.status_code,
                      f"Response code to {url} DELETE was {response.status_code} instead of {expected_code}")
     return response.json()
 
+
+# This creates a study set for a single test and deletes it (along with its cards and their files) once the test finishes, even if the test fails
+# card_bodies are created with the set in the same request, and the file for the card at index i can be attached as "file-i"
+def create_study_set(test, title = "Test fixture", card_bodies = None, attached_files = {}):
+    created_set_body = {"title": title}
+    if card_bodies is not None:
+        created_set_body["cards"] = json.dumps(card_bodies)
+    created_set = post_rest_call(test, f"{API_URL}/sets", request_parameters=created_set_body, attached_files=attached_files)
+    test.addCleanup(delete_fixture, f"{API_URL}/sets/{created_set["_id"]}")
+    return created_set
+
+# The test may have already deleted its fixture itself, so a 404 is fine here
+def delete_fixture(url):
+    response = session.delete(url)
+    if response.status_code not in (200, 404):
+        raise AssertionError(f"Response code to {url} DELETE was {response.status_code} while cleaning up a test fixture")
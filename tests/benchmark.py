@@ -0,0 +1,278 @@
+"""
+This module load tests the API by running simulated users against it concurrently, and reports the throughput and latency of every route they use
+It uses the same routes as the tests in this directory but isn't a test module itself, so unittest doesn't pick it up
+Before executing this file, launch the API with "npm test" (or "npm run test-cluster") in the free-flashcards-backend directory
+    "npm run test-memory" runs it without a db, which takes the db out of the numbers and leaves only the server's own costs
+    Every set the benchmark creates is deleted again, including the deck it studies, so it doesn't rely on any data in the test db
+
+Usage (from the tests directory):
+    python benchmark.py [--workloads browse,study,quiz,create,upload] [--concurrency 10] [--duration 20] [--warmup 2] [--output results.json]
+                        [--baseline baseline.json] [--threshold 0.2] [--save-baseline baseline.json]
+With --baseline the results are compared against a previous run's, and the exit code is 1 if any route got slower (its p95 latency grew by more
+than the threshold), handled fewer requests per second (by more than the threshold), or started failing
+"""
+
+import argparse
+import asyncio
+import json
+import math
+import os
+import random
+import sys
+import time
+import aiohttp
+from api_calls_helper import API_URL
+
+FILES_DIRECTORY = os.path.join(os.path.dirname(os.path.abspath(__file__)), "files")
+# files the API accepts, with the type we send them as
+MEDIA_FILES = [("CantinaBand3.wav", "audio/wav"), ("jpeg-home.jpg", "image/jpeg"), ("t-rex-roar.mp3", "audio/mpeg"),
+               ("test_bmp.bmp", "image/bmp"), ("test_gif.gif", "image/gif")]
+DECK_SIZE = 50 # cards in the deck the study and quiz workloads use, every fifth one has a file
+CREATED_DECK_SIZE = 20 # cards in each deck the create workload makes
+BROWSED_PAGES = 3 # how many pages of GET /sets a browsing user looks through before opening a set
+
+
+class CallFailed(Exception):
+    # Raised when a call gets an unexpected response code, which ends that user's current iteration of its workload
+    pass
+
+
+class Recorder:
+    """
+    Keeps the latency of every call made during a workload, grouped by the route's template (e.g. "GET /sets/:id") so different ids add up together
+    Calls made while recording is off (during the warmup) are made but not kept
+    """
+
+    def __init__(self):
+        self.latencies = {} # route -> list of seconds
+        self.errors = {} # route -> number of calls that got an unexpected response code or failed outright
+        self.recording = False
+
+    async def call(self, session, method, route, url, expected_code=200, **request_arguments):
+        # Makes a request and records how long it took to read the whole response, returning the response's json (or bytes if it isn't json)
+        start = time.perf_counter()
+        try:
+            async with session.request(method, url, **request_arguments) as response:
+                body = await response.read()
+                status = response.status
+                is_json = response.content_type == "application/json"
+        except (aiohttp.ClientError, asyncio.TimeoutError) as error: # a timed out call counts as a failed one, like a refused connection
+            self.record(route, None)
+            raise CallFailed(f"{route} failed: {error}") from error
+        self.record(route, time.perf_counter() - start if status == expected_code else None)
+        if status != expected_code:
+            raise CallFailed(f"{route} returned {status} instead of {expected_code}")
+        return json.loads(body) if is_json else body
+
+    def record(self, route, latency):
+        # latency is None for a failed call
+        if not self.recording:
+            return
+        self.latencies.setdefault(route, [])
+        self.errors.setdefault(route, 0)
+        if latency is None:
+            self.errors[route] += 1
+        else:
+            self.latencies[route].append(latency)
+
+
+# Each workload is one iteration of what a kind of user does, they are repeated by every simulated user until the workload's time is up
+
+async def browse_sets(session, recorder, deck):
+    # Pages through the study sets and opens one of them, like the home page does
+    url = f"{API_URL}/sets"
+    parameters = {"limit": 100}
+    seen_set_ids = []
+    for _ in range(BROWSED_PAGES):
+        page = await recorder.call(session, "GET", "GET /sets", url, params=parameters)
+        seen_set_ids.extend(study_set["_id"] for study_set in page["study_sets"])
+        if page["next_page"] is None:
+            break
+        parameters = {"limit": 100, "after": page["next_page"]}
+    opened_set_id = random.choice(seen_set_ids) if seen_set_ids else deck["set_id"]
+    await recorder.call(session, "GET", "GET /sets/:id", f"{API_URL}/sets/{opened_set_id}")
+
+async def study_deck(session, recorder, deck):
+    # Opens the deck, loads all of its cards and the files of the cards that have them, like the practice page does
+    await recorder.call(session, "GET", "GET /sets/:id", f"{API_URL}/sets/{deck["set_id"]}")
+    await recorder.call(session, "GET", "GET /sets/:id/cards", f"{API_URL}/sets/{deck["set_id"]}/cards")
+    for card_id in random.sample(deck["card_ids"], min(5, len(deck["card_ids"]))):
+        await recorder.call(session, "GET", "GET /cards/:id", f"{API_URL}/cards/{card_id}")
+    for card_id in deck["file_card_ids"]:
+        await recorder.call(session, "GET", "GET /cards/:id/file", f"{API_URL}/cards/{card_id}/file")
+
+async def take_quiz(session, recorder, deck):
+    # Loads the deck's cards, submits a score and checks the set's stats, like the quiz page does
+    await recorder.call(session, "GET", "GET /sets/:id/cards", f"{API_URL}/sets/{deck["set_id"]}/cards")
+    await recorder.call(session, "POST", "POST /sets/:id/quiz", f"{API_URL}/sets/{deck["set_id"]}/quiz",
+                        json={"addedQuizScore": round(random.random(), 2)})
+    await recorder.call(session, "GET", "GET /sets/:id/stats", f"{API_URL}/sets/{deck["set_id"]}/stats")
+
+async def create_deck(session, recorder, deck):
+    # Creates a whole deck in one request and deletes it again
+    created_card_bodies = [{"prompt": f"Prompt {i}", "response": f"Response {i}", "userResponseType": "text"} for i in range(CREATED_DECK_SIZE)]
+    created_set = await recorder.call(session, "POST", "POST /sets", f"{API_URL}/sets",
+                                      json={"title": "Benchmark deck", "cards": created_card_bodies})
+    await recorder.call(session, "DELETE", "DELETE /sets/:id", f"{API_URL}/sets/{created_set["_id"]}")
+
+async def upload_media(session, recorder, deck):
+    # Adds a card to a new set, attaches one of the files in tests/files to it, reads the file back and deletes the set
+    created_set = await recorder.call(session, "POST", "POST /sets", f"{API_URL}/sets", json={"title": "Benchmark upload"})
+    try:
+        updated_set = await recorder.call(session, "POST", "POST /sets/:id", f"{API_URL}/sets/{created_set["_id"]}",
+                                          json={"prompt": "Listen", "response": "Hear", "userResponseType": "text"})
+        card_id = updated_set["cards"][-1]
+        file_name, file_type = random.choice(MEDIA_FILES)
+        form = aiohttp.FormData()
+        form.add_field("partOfPrompt", "true")
+        form.add_field("file", read_media_file(file_name), filename="attachment", content_type=file_type)
+        await recorder.call(session, "POST", "POST /cards/:id/file", f"{API_URL}/cards/{card_id}/file", data=form)
+        await recorder.call(session, "GET", "GET /cards/:id/file", f"{API_URL}/cards/{card_id}/file")
+    finally:
+        await recorder.call(session, "DELETE", "DELETE /sets/:id", f"{API_URL}/sets/{created_set["_id"]}")
+
+WORKLOADS = {"browse": browse_sets, "study": study_deck, "quiz": take_quiz, "create": create_deck, "upload": upload_media}
+
+media_file_contents = {}
+def read_media_file(file_name):
+    # Files are read once and kept, so reading them from disk doesn't count towards the upload's latency
+    if file_name not in media_file_contents:
+        with open(os.path.join(FILES_DIRECTORY, file_name), "rb") as media_file:
+            media_file_contents[file_name] = media_file.read()
+    return media_file_contents[file_name]
+
+
+async def create_benchmark_deck(session):
+    # Creates the deck the study and quiz workloads use in one request, with a file on every fifth card
+    card_bodies = []
+    form = aiohttp.FormData()
+    for i in range(DECK_SIZE):
+        card_body = {"prompt": f"Benchmark prompt {i}", "response": f"Benchmark response {i}", "userResponseType": "text"}
+        if i % 5 == 0:
+            card_body["file"] = {"partOfPrompt": True}
+            file_name, file_type = MEDIA_FILES[(i // 5) % len(MEDIA_FILES)]
+            form.add_field(f"file-{i}", read_media_file(file_name), filename="attachment", content_type=file_type)
+        card_bodies.append(card_body)
+    form.add_field("title", "Benchmark study deck")
+    form.add_field("cards", json.dumps(card_bodies))
+    async with session.post(f"{API_URL}/sets", data=form) as response:
+        if response.status != 200:
+            raise CallFailed(f"could not create the benchmark deck, POST /sets returned {response.status}")
+        created_set = await response.json()
+    return {"set_id": created_set["_id"], "card_ids": created_set["cards"], "file_card_ids": created_set["cards"][::5]}
+
+async def run_workload(session, workload, deck, concurrency, duration, warmup):
+    # Runs concurrency simulated users through the workload for warmup + duration seconds, only recording calls after the warmup
+    recorder = Recorder()
+    iterations = 0
+    failures = []
+    deadline = time.perf_counter() + warmup + duration
+
+    async def simulated_user():
+        nonlocal iterations
+        while time.perf_counter() < deadline:
+            try:
+                await workload(session, recorder, deck)
+                if recorder.recording:
+                    iterations += 1
+            except CallFailed as error:
+                failures.append(str(error))
+
+    users = [asyncio.create_task(simulated_user()) for _ in range(concurrency)]
+    await asyncio.sleep(warmup)
+    recorder.recording = True
+    started = time.perf_counter()
+    await asyncio.gather(*users)
+    elapsed = time.perf_counter() - started
+    return {"elapsed_seconds": round(elapsed, 3), "iterations": iterations, "failures": failures[:10],
+            "routes": {route: summarize(recorder.latencies[route], recorder.errors[route], elapsed) for route in sorted(recorder.latencies)}}
+
+def summarize(latencies, errors, elapsed):
+    # Describes one route's calls during a workload, latencies are in seconds and reported in milliseconds
+    ordered = sorted(latencies)
+    return {"requests": len(ordered), "errors": errors, "throughput_rps": round(len(ordered) / elapsed, 2) if elapsed > 0 else 0,
+            "mean_ms": round(1000 * sum(ordered) / len(ordered), 2) if ordered else None,
+            "p50_ms": percentile(ordered, 50), "p95_ms": percentile(ordered, 95), "p99_ms": percentile(ordered, 99),
+            "max_ms": round(1000 * ordered[-1], 2) if ordered else None}
+
+def percentile(ordered, rank):
+    # The nearest-rank percentile of an already sorted list of seconds, in milliseconds
+    if not ordered:
+        return None
+    index = max(0, math.ceil(rank / 100 * len(ordered)) - 1)
+    return round(1000 * ordered[index], 2)
+
+def compare_to_baseline(results, baseline, threshold):
+    # Returns a description of every route that regressed since the baseline run, routes only one of the runs used are skipped
+    regressions = []
+    for workload_name, workload in results["workloads"].items():
+        baseline_routes = baseline.get("workloads", {}).get(workload_name, {}).get("routes", {})
+        for route, current in workload["routes"].items():
+            previous = baseline_routes.get(route)
+            if previous is None:
+                continue
+            if current["p95_ms"] is not None and previous["p95_ms"] is not None and current["p95_ms"] > previous["p95_ms"] * (1 + threshold):
+                regressions.append(f"{workload_name} {route}: p95 went from {previous["p95_ms"]} ms to {current["p95_ms"]} ms")
+            if current["throughput_rps"] < previous["throughput_rps"] * (1 - threshold):
+                regressions.append(f"{workload_name} {route}: throughput went from {previous["throughput_rps"]} to {current["throughput_rps"]} requests/s")
+            if current["errors"] > 0 and previous["errors"] == 0:
+                regressions.append(f"{workload_name} {route}: {current["errors"]} calls failed, none did in the baseline")
+    return regressions
+
+async def run_benchmark(workload_names, concurrency, duration, warmup):
+    connector = aiohttp.TCPConnector(limit=concurrency) # every simulated user keeps its own connection open, like a browser would
+    async with aiohttp.ClientSession(connector=connector) as session:
+        deck = await create_benchmark_deck(session)
+        try:
+            results = {"api_url": API_URL, "concurrency": concurrency, "duration_seconds": duration, "warmup_seconds": warmup,
+                       "started_at": time.strftime("%Y-%m-%dT%H:%M:%S%z"), "workloads": {}}
+            for workload_name in workload_names:
+                print(f"running {workload_name} with {concurrency} users for {duration} s", file=sys.stderr)
+                results["workloads"][workload_name] = await run_workload(session, WORKLOADS[workload_name], deck, concurrency, duration, warmup)
+            return results
+        finally:
+            async with session.delete(f"{API_URL}/sets/{deck["set_id"]}"):
+                pass
+
+def parse_arguments(arguments):
+    parser = argparse.ArgumentParser(description="Load tests the free-flashcards API and reports throughput and latency per route as JSON")
+    parser.add_argument("--workloads", default=",".join(WORKLOADS), help=f"comma separated workloads to run, from {", ".join(WORKLOADS)}")
+    parser.add_argument("--concurrency", type=int, default=10, help="simulated users running each workload at once")
+    parser.add_argument("--duration", type=float, default=20, help="seconds each workload is recorded for")
+    parser.add_argument("--warmup", type=float, default=2, help="seconds each workload runs before recording starts")
+    parser.add_argument("--output", help="file to write the results to, they're printed if this isn't given")
+    parser.add_argument("--baseline", help="results of an earlier run to compare against")
+    parser.add_argument("--threshold", type=float, default=0.2, help="fraction a route's p95 latency or throughput can get worse by before it counts as a regression")
+    parser.add_argument("--save-baseline", help="file to also write the results to, for later runs to compare against")
+    parsed = parser.parse_args(arguments)
+    parsed.workloads = [name.strip() for name in parsed.workloads.split(",") if name.strip() != ""]
+    unknown_workloads = [name for name in parsed.workloads if name not in WORKLOADS]
+    if unknown_workloads:
+        parser.error(f"unknown workloads: {", ".join(unknown_workloads)}")
+    return parsed
+
+def main(arguments):
+    options = parse_arguments(arguments)
+    results = asyncio.run(run_benchmark(options.workloads, options.concurrency, options.duration, options.warmup))
+    regressions = []
+    if options.baseline is not None:
+        with open(options.baseline) as baseline_file:
+            regressions = compare_to_baseline(results, json.load(baseline_file), options.threshold)
+        results["regressions"] = regressions
+
+    report = json.dumps(results, indent=2)
+    if options.output is not None:
+        with open(options.output, "w") as output_file:
+            output_file.write(report)
+    else:
+        print(report)
+    if options.save_baseline is not None:
+        with open(options.save_baseline, "w") as baseline_file:
+            baseline_file.write(report)
+
+    for regression in regressions:
+        print(f"regression: {regression}", file=sys.stderr)
+    return 1 if regressions else 0
+
+if __name__ == "__main__":
+    sys.exit(main(sys.argv[1:]))
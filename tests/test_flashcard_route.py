@@ -3,6 +3,9 @@ from api_calls_helper import *
 import json
 import binascii
 import base64
+import hashlib
+import os
+import time
 
 class FlashcardRouteTests(unittest.TestCase):
 
@@ -11,7 +14,7 @@ class FlashcardRouteTests(unittest.TestCase):
     Note that POST and DELETE requests for flashcards are accessed through the StudySet route because they require modifying the array of objectIDs in the set, so we aren't testing that functionality here
     Before executing this file, launch the API with "npm test" in the free-flashcards-backend directory 
         Note: using "npm start" will not work because the production environment uses a different port from the testing environment since we should avoid mixing test and production data 
-    There are several hard-coded object ids in this file. These should vary based on the values in your testing database.
+    Every test creates the cards it uses in a set of its own and deletes the set afterwards, so the tests don't rely on any data in the test db
     """
 
     def setUp(self): 
@@ -19,8 +22,13 @@ class FlashcardRouteTests(unittest.TestCase):
 
         self.nonexistent_id = "66cfd27b38e5367fabb70f8d" # this is a valid format but doesn't match any flashcard db entries
         self.invalid_id = "invalid" # this is not a valid objectid format
-        self.file_card_id = "66edb6a0debf1f33640321e6" # This is the objectid of the card we are going to modify by adding files to 
-        self.put_card_id = "66ecf15ffd9b0d57db2ad364" # This is the objectid of the card we modify with PUT requests
+
+        # The cards this test uses are created in a new set that is deleted (with the cards) once the test finishes
+        created_card_bodies = [{"prompt": "Hello", "response": "Can you hear me", "userResponseType": "text"}, # This card is only read
+                               {"prompt": "Listen", "response": "Look", "userResponseType": "text"}, # This is the card we modify by adding files to
+                               {"prompt": "Before", "response": "After", "userResponseType": "text"}] # This is the card we modify with PUT requests
+        fixture_set = create_study_set(self, title="Flashcard route tests", card_bodies=created_card_bodies)
+        self.read_card_id, self.file_card_id, self.put_card_id = fixture_set["cards"]
 
         # Defining the file paths for files we may use multiple times so we only need to change them here if they change
         self.wav_file_path = "./files/CantinaBand3.wav" 
@@ -53,10 +61,9 @@ class FlashcardRouteTests(unittest.TestCase):
     def test_get_card_exists(self):
         # This method tests getting a card where the id matches an id existing in the db
 
-        request_objectid = "66eceaca1120acdb2fca8ef8" # NOTE: This id is based on test data that was MANUALLY PLACED into the db - it will vary if run in a different environment
-        get_result = get_rest_call(self, f"http://localhost:3002/cards/{request_objectid}")
+        get_result = get_rest_call(self, f"http://localhost:3002/cards/{self.read_card_id}")
         
-        # NOTE: The expected values being checked in these assertions were manually placed in the test db - it will vary if run in a different environment
+        # The expected values being checked in these assertions are the ones the card was created with in setUp
         self.assertEqual("Hello", get_result["prompt"], 
                          f"Expected prompt 'Hello' but instead got '{get_result["prompt"]}'")
         self.assertEqual("Can you hear me", get_result["response"], 
@@ -64,6 +71,37 @@ class FlashcardRouteTests(unittest.TestCase):
         self.assertEqual("text", get_result["userResponseType"], 
                          f"Expected user response type of 'text' but instead got '{get_result["userResponseType"]}'")
     
+    def test_get_card_no_version_key(self):
+        # This method tests that a card's version is only sent through its ETag and not in its body
+
+        get_result = get_raw_rest_call(self, f"http://localhost:3002/cards/{self.put_card_id}")
+        self.assertFalse("__v" in get_result.json(), "Expected the card to not include its version key")
+        self.assertTrue("ETag" in get_result.headers, "Expected the card to be sent with an ETag")
+
+    def test_get_card_not_modified(self):
+        # This method tests that sending back the ETag of a card we already have means the card isn't sent again
+
+        get_result = get_raw_rest_call(self, f"http://localhost:3002/cards/{self.put_card_id}")
+        etag = get_result.headers["ETag"]
+        cached_result = get_raw_rest_call(self, f"http://localhost:3002/cards/{self.put_card_id}", 
+                                          request_header={"If-None-Match": etag}, expected_code=304)
+        self.assertEqual(b"", cached_result.content, "Expected a 304 response to not contain the card")
+
+    def test_get_card_etag_changes_after_update(self):
+        # This method tests that changing a card gives it a new ETag, so a client holding the old version gets the new one
+
+        get_result = get_raw_rest_call(self, f"http://localhost:3002/cards/{self.put_card_id}")
+        etag = get_result.headers["ETag"]
+
+        updated_card_body = {"prompt": "cached", "response": "then edited", "userResponseType": "text"}
+        header = {"Content-Type": "application/json"} # This header results in the string being interpreted as a JSON
+        put_rest_call(self, f"http://localhost:3002/cards/{self.put_card_id}", request_parameters=json.dumps(updated_card_body), request_header=header)
+
+        updated_result = get_raw_rest_call(self, f"http://localhost:3002/cards/{self.put_card_id}", request_header={"If-None-Match": etag})
+        self.assertNotEqual(etag, updated_result.headers["ETag"], "Expected the card's ETag to change after it was updated")
+        self.assertEqual(updated_card_body["prompt"], updated_result.json()["prompt"],
+                         f"Expected prompt of '{updated_card_body["prompt"]}' but instead got '{updated_result.json()["prompt"]}'")
+
     def test_put_card_not_exists(self):
         # This method tests attempting to make a PUT request with an id not present in the db    
         # This should give a different response code than an invalidly formatted id 
@@ -183,6 +221,22 @@ class FlashcardRouteTests(unittest.TestCase):
         with open(self.wav_file_path, "rb") as attached_file: # rb lets us read the file in binary format
             file = {"file": attached_file}
             put_rest_call(self, f"http://localhost:3002/cards/{self.put_card_id}", attached_files=file, expected_code=422)
+
+    def test_put_card_update_operator(self):
+        # This method tests attempting to make a PUT request that uses an update operator to remove the card's file reference
+        # Only the card's prompt, response and userResponseType can be changed through the cards/:id PUT route
+
+        updated_card_string = json.dumps({"$unset": {"file": 1}})
+        header = {"Content-Type": "application/json"}
+        put_rest_call(self, f"http://localhost:3002/cards/{self.put_card_id}", request_parameters=updated_card_string, request_header=header, expected_code=422)
+
+    def test_put_card_file_reference(self):
+        # This method tests attempting to make a PUT request that points the card at another stored file
+        # Two cards sharing a file would lose it when either of them was deleted, so this should produce an error
+
+        updated_card_string = json.dumps({"prompt": "seems I've been", "file.fileId": self.nonexistent_id})
+        header = {"Content-Type": "application/json"}
+        put_rest_call(self, f"http://localhost:3002/cards/{self.put_card_id}", request_parameters=updated_card_string, request_header=header, expected_code=422)
     
     def test_add_file_to_card_doesnt_exist(self):
         # This method tests attempting to add a file to a card with an id that doesn't exist in the db
@@ -226,8 +280,8 @@ class FlashcardRouteTests(unittest.TestCase):
                              f"Expected id of '{self.file_card_id}' but instead got '{post_result["_id"]}'")
 
             # Our POST appears to have worked, but we want to verify that the file was actually uploaded to the card
-            get_result = get_rest_call(self, f"http://localhost:3002/cards/{self.file_card_id}")
-            compare_file_to_response(self, self.wav_file_path, get_result["file"]["data"]["data"])
+            get_result = get_raw_rest_call(self, f"http://localhost:3002/cards/{self.file_card_id}/file")
+            compare_file_to_response(self, self.wav_file_path, get_result.content)
     
     def test_add_file_to_card_jpg(self):
         # This method tests attempting to add a .jpg file to a card with an id that exists in the db
@@ -243,8 +297,8 @@ class FlashcardRouteTests(unittest.TestCase):
                              f"Expected id of '{self.file_card_id}' but instead got '{post_result["_id"]}'")
 
             # Our POST appears to have worked, but we want to verify that the file was actually uploaded to the card
-            get_result = get_rest_call(self, f"http://localhost:3002/cards/{self.file_card_id}")
-            compare_file_to_response(self, self.jpg_file_path, get_result["file"]["data"]["data"])
+            get_result = get_raw_rest_call(self, f"http://localhost:3002/cards/{self.file_card_id}/file")
+            compare_file_to_response(self, self.jpg_file_path, get_result.content)
 
     def test_add_file_to_card_mp3(self):
         # This method tests attempting to add a .mp3 file to a card with an id that exists in the db
@@ -260,8 +314,8 @@ class FlashcardRouteTests(unittest.TestCase):
                              f"Expected id of '{self.file_card_id}' but instead got '{post_result["_id"]}'")
 
             # Our POST appears to have worked, but we want to verify that the file was actually uploaded to the card
-            get_result = get_rest_call(self, f"http://localhost:3002/cards/{self.file_card_id}")
-            compare_file_to_response(self, self.mp3_file_path, get_result["file"]["data"]["data"])
+            get_result = get_raw_rest_call(self, f"http://localhost:3002/cards/{self.file_card_id}/file")
+            compare_file_to_response(self, self.mp3_file_path, get_result.content)
 
     def test_add_file_to_card_bmp(self):
         # This method tests attempting to add a .bmp file to a card with an id that exists in the db
@@ -277,8 +331,9 @@ class FlashcardRouteTests(unittest.TestCase):
                              f"Expected id of '{self.file_card_id}' but instead got '{post_result["_id"]}'")
 
             # Our POST appears to have worked, but we want to verify that the file was actually uploaded to the card
-            get_result = get_rest_call(self, f"http://localhost:3002/cards/{self.file_card_id}")
-            compare_file_to_response(self, self.bmp_file_path, get_result["file"]["data"]["data"])
+            # bmp files are served as an optimized png by default, so we ask for the file as it was uploaded
+            get_result = get_raw_rest_call(self, f"http://localhost:3002/cards/{self.file_card_id}/file", request_parameters={"variant": "original"})
+            compare_file_to_response(self, self.bmp_file_path, get_result.content)
 
     def test_add_file_to_card_gif(self):
         # This method tests attempting to add a .gif file to a card with an id that exists in the db
@@ -294,8 +349,8 @@ class FlashcardRouteTests(unittest.TestCase):
                              f"Expected id of '{self.file_card_id}' but instead got '{post_result["_id"]}'")
 
             # Our POST appears to have worked, but we want to verify that the file was actually uploaded to the card
-            get_result = get_rest_call(self, f"http://localhost:3002/cards/{self.file_card_id}")
-            compare_file_to_response(self, self.gif_file_path, get_result["file"]["data"]["data"])
+            get_result = get_raw_rest_call(self, f"http://localhost:3002/cards/{self.file_card_id}/file")
+            compare_file_to_response(self, self.gif_file_path, get_result.content)
 
     def test_add_file_to_card_svg(self):
         # This method tests attempting to add a .svg file to a card with an id that exists in the db
@@ -311,8 +366,12 @@ class FlashcardRouteTests(unittest.TestCase):
                              f"Expected id of '{self.file_card_id}' but instead got '{post_result["_id"]}'")
 
             # Our POST appears to have worked, but we want to verify that the file was actually uploaded to the card
-            get_result = get_rest_call(self, f"http://localhost:3002/cards/{self.file_card_id}")
-            compare_file_to_response(self, self.svg_file_path, get_result["file"]["data"]["data"])
+            get_result = get_raw_rest_call(self, f"http://localhost:3002/cards/{self.file_card_id}/file")
+            compare_file_to_response(self, self.svg_file_path, get_result.content)
+            # an SVG can contain scripts, so it must never be run as a page on the API's origin
+            self.assertEqual("sandbox", get_result.headers.get("Content-Security-Policy"), "Expected the SVG to be sent with a sandbox policy")
+            self.assertEqual("attachment", get_result.headers.get("Content-Disposition"), "Expected the SVG to be sent as an attachment")
+            self.assertEqual("nosniff", get_result.headers.get("X-Content-Type-Options"), "Expected browsers to be told not to sniff the file's type")
 
     def test_add_file_to_card_too_large(self):
         # This method tests attempting to add a file with a size > 0.5 mb to a card with an id that exists in the db
@@ -328,6 +387,20 @@ class FlashcardRouteTests(unittest.TestCase):
             self.assertEqual(expected_add_file_422_message, post_response["error"]["message"],
                              f"Expected 422 status message of '{expected_add_file_422_message}' but instead got '{post_response["error"]["message"]}'")
 
+    def test_add_file_to_card_too_many_fields(self):
+        # This method tests attempting to add a file to a card in a request padded out with many text fields
+        # Every text field is held in memory until the route runs, so the number of them a request can have is capped
+
+        with open(self.wav_file_path, "rb") as attached_file:
+            file = {"file": ("attachment", attached_file, "audio/wav")}
+            body = {"partOfPrompt": "true", **{f"padding-{i}": "x" for i in range(50)}}
+
+            post_response = post_rest_call(self, f"http://localhost:3002/cards/{self.file_card_id}/file",
+                              attached_files=file, request_parameters=body, expected_code=413)
+            expected_add_file_413_message = "Too many fields in the request"
+            self.assertEqual(expected_add_file_413_message, post_response["error"]["message"],
+                             f"Expected 413 status message of '{expected_add_file_413_message}' but instead got '{post_response["error"]["message"]}'")
+
     def test_add_file_to_card_pdf(self):
          # This method tests attempting to add a .pdf file to a card with an id that exists in the db
          # A pdf is just one instance of a file with an invalid mimetype, but it is the most likely to be confused with an image type
@@ -356,6 +429,33 @@ class FlashcardRouteTests(unittest.TestCase):
             self.assertEqual(expected_add_file_415_message, post_response["error"]["message"],
                              f"Expected 415 status message of '{expected_add_file_415_message}' but instead got '{post_response["error"]["message"]}'")
 
+    def test_add_file_to_card_mislabeled_pdf(self):
+        # This method tests attempting to add a .pdf file that the client claims is an image
+        # The server works out a file's type from its contents, so this should be rejected the same way as a correctly labeled pdf
+
+        with open(self.pdf_file_path, "rb") as attached_file:
+            file = {"file": ("attachment", attached_file, "image/jpeg")}
+            body = {"partOfPrompt": "true"} # we need to include this or the request format is invalid
+
+            post_response = post_rest_call(self, f"http://localhost:3002/cards/{self.file_card_id}/file",
+                              attached_files=file, request_parameters=body, expected_code=415)
+            expected_add_file_415_message = "Attached files must be image or audio files and cannot be PDFs" # We need to verify this 415 error is caused by the attached file being a PDF
+            self.assertEqual(expected_add_file_415_message, post_response["error"]["message"],
+                             f"Expected 415 status message of '{expected_add_file_415_message}' but instead got '{post_response["error"]["message"]}'")
+
+    def test_add_file_to_card_mislabeled_wav(self):
+        # This method tests adding a .wav file that the client claims is an image. The stored file type should come from the file's contents
+
+        with open(self.wav_file_path, "rb") as attached_file:
+            file = {"file": ("attachment", attached_file, "image/png")}
+            body = {"partOfPrompt": "true"} # we need to include this or the request format is invalid
+            post_rest_call(self, f"http://localhost:3002/cards/{self.file_card_id}/file", attached_files=file, request_parameters=body)
+
+        get_result = get_rest_call(self, f"http://localhost:3002/cards/{self.file_card_id}")
+        self.assertEqual("audio/wav", get_result["file"]["fileType"],
+                         f"Expected file type of 'audio/wav' but instead got '{get_result["file"]["fileType"]}'")
+        compare_file_to_metadata(self, self.wav_file_path, get_result["file"])
+
     def test_add_file_to_card_no_part_of_prompt(self):
         # This method attempts adding a file to a card without indicating whether it is part of the card's prompt or not
         # This is invalid because users must indicate if an attached file is part of a prompt or part of a response
@@ -379,6 +479,140 @@ class FlashcardRouteTests(unittest.TestCase):
         self.assertEqual(expected_add_file_400_message, post_response["error"]["message"],
                          f"Expected 400 status message of '{expected_add_file_400_message}' but instead got '{post_response["error"]["message"]}'")
 
+    def test_get_card_file_metadata(self):
+        # This method tests that a card's json only describes its file and doesn't contain the file's contents
+
+        with open(self.jpg_file_path, "rb") as attached_file:
+            file = {"file": ("attachment", attached_file, "image/jpeg")}
+            body = {"partOfPrompt": "true"} # we need to include this or the request format is invalid
+            post_rest_call(self, f"http://localhost:3002/cards/{self.file_card_id}/file", attached_files=file, request_parameters=body)
+
+        get_result = get_rest_call(self, f"http://localhost:3002/cards/{self.file_card_id}")
+        with self.assertRaises(KeyError): # the file's contents are only sent through the cards/:id/file GET route
+            get_result["file"]["data"]
+        self.assertEqual("image/jpeg", get_result["file"]["fileType"],
+                         f"Expected file type of 'image/jpeg' but instead got '{get_result["file"]["fileType"]}'")
+        compare_file_to_metadata(self, self.jpg_file_path, get_result["file"])
+
+    def test_get_card_file_doesnt_exist(self):
+        # This method tests attempting to get the file of a card with an id that doesn't exist in the db
+        # This should give a different response code than an invalidly formatted id
+
+        get_response = get_rest_call(self, f"http://localhost:3002/cards/{self.nonexistent_id}/file", expected_code=404)
+        expected_get_file_404_message = "Flashcard does not exist" # We need to verify that the 404 was caused by the card not existing and not using the wrong URL
+        self.assertEqual(expected_get_file_404_message, get_response["error"]["message"],
+                         f"Expected 404 status message of '{expected_get_file_404_message}' but instead got '{get_response["error"]["message"]}'")
+
+    def test_get_card_file_invalid_id(self):
+        # This method tests attempting to get the file of a card with an id that is incorrectly formatted
+        # This should give a different response code than a validly formatted id that doesn't exist
+
+        get_rest_call(self, f"http://localhost:3002/cards/{self.invalid_id}/file", expected_code=400)
+        # the assertion that the provided id is invalid (400 response) is done inside the get_rest_call method
+
+    def test_get_card_file_no_file(self):
+        # This method tests attempting to get the file of a card that exists in the db but doesn't have a file
+
+        get_response = get_rest_call(self, f"http://localhost:3002/cards/{self.put_card_id}/file", expected_code=404)
+        expected_get_file_404_message = "Flashcard has no file" # a card without a file gives a different 404 message than a card that doesn't exist
+        self.assertEqual(expected_get_file_404_message, get_response["error"]["message"],
+                         f"Expected 404 status message of '{expected_get_file_404_message}' but instead got '{get_response["error"]["message"]}'")
+
+    def test_get_card_file_caching_headers(self):
+        # This method tests that a card's file is sent with its type and an ETag, and that sending the ETag back means the file isn't sent again
+
+        with open(self.mp3_file_path, "rb") as attached_file:
+            file = {"file": ("attachment", attached_file, "audio/mp3")}
+            body = {"partOfPrompt": "true"} # we need to include this or the request format is invalid
+            post_rest_call(self, f"http://localhost:3002/cards/{self.file_card_id}/file", attached_files=file, request_parameters=body)
+
+        get_result = get_raw_rest_call(self, f"http://localhost:3002/cards/{self.file_card_id}/file")
+        # The file's type comes from its contents rather than the type the client sent, and mp3 files are audio/mpeg
+        self.assertEqual("audio/mpeg", get_result.headers["Content-Type"].split(";")[0],
+                         f"Expected content type of 'audio/mpeg' but instead got '{get_result.headers["Content-Type"]}'")
+        self.assertEqual("bytes", get_result.headers["Accept-Ranges"], "Expected the file route to accept byte ranges")
+        etag = get_result.headers["ETag"]
+
+        # Sending the ETag we received back to the API tells it we already have this file
+        cached_result = get_raw_rest_call(self, f"http://localhost:3002/cards/{self.file_card_id}/file", 
+                                          request_header={"If-None-Match": etag}, expected_code=304)
+        self.assertEqual(b"", cached_result.content, "Expected a 304 response to not contain the file")
+
+    def test_get_card_file_range(self):
+        # This method tests requesting only part of a card's file, which is how browsers seek through audio
+
+        with open(self.wav_file_path, "rb") as attached_file:
+            file = {"file": ("attachment", attached_file, "audio/wav")}
+            body = {"partOfPrompt": "true"} # we need to include this or the request format is invalid
+            post_rest_call(self, f"http://localhost:3002/cards/{self.file_card_id}/file", attached_files=file, request_parameters=body)
+
+        file_size = os.path.getsize(self.wav_file_path)
+        get_result = get_raw_rest_call(self, f"http://localhost:3002/cards/{self.file_card_id}/file", 
+                                       request_header={"Range": "bytes=100-199"}, expected_code=206)
+        self.assertEqual(f"bytes 100-199/{file_size}", get_result.headers["Content-Range"],
+                         f"Expected content range of 'bytes 100-199/{file_size}' but instead got '{get_result.headers["Content-Range"]}'")
+        with open(self.wav_file_path, "rb") as local_file:
+            self.assertEqual(local_file.read()[100:200], get_result.content, "The returned range does not match the same bytes of the locally stored file")
+
+        # A range starting past the end of the file can't be satisfied
+        get_raw_rest_call(self, f"http://localhost:3002/cards/{self.file_card_id}/file", 
+                          request_header={"Range": f"bytes={file_size + 10}-"}, expected_code=416)
+
+    def test_get_card_file_optimized(self):
+        # This method tests that once a bmp is optimized the card serves a smaller png by default, while the original stays available unchanged
+
+        with open(self.bmp_file_path, "rb") as attached_file:
+            file = {"file": ("attachment", attached_file, "image/bmp")}
+            body = {"partOfPrompt": "true"} # we need to include this or the request format is invalid
+            post_rest_call(self, f"http://localhost:3002/cards/{self.file_card_id}/file", attached_files=file, request_parameters=body)
+
+        card_file = wait_for_file_optimization(self, self.file_card_id)
+        self.assertEqual(200, card_file["width"], f"Expected a width of 200 but instead got {card_file["width"]}")
+        self.assertEqual(200, card_file["height"], f"Expected a height of 200 but instead got {card_file["height"]}")
+
+        get_result = get_raw_rest_call(self, f"http://localhost:3002/cards/{self.file_card_id}/file")
+        self.assertEqual("image/png", get_result.headers["Content-Type"].split(";")[0],
+                         f"Expected content type of 'image/png' but instead got '{get_result.headers["Content-Type"]}'")
+        self.assertLess(len(get_result.content), os.path.getsize(self.bmp_file_path), "Expected the optimized file to be smaller than the original")
+
+        original_result = get_raw_rest_call(self, f"http://localhost:3002/cards/{self.file_card_id}/file", request_parameters={"variant": "original"})
+        with open(self.bmp_file_path, "rb") as local_file:
+            self.assertEqual(local_file.read(), original_result.content, "The original file does not match the locally stored copy of this file")
+
+        thumbnail_result = get_raw_rest_call(self, f"http://localhost:3002/cards/{self.file_card_id}/file", request_parameters={"variant": "thumbnail"})
+        self.assertEqual("image/png", thumbnail_result.headers["Content-Type"].split(";")[0],
+                         f"Expected thumbnail content type of 'image/png' but instead got '{thumbnail_result.headers["Content-Type"]}'")
+        self.assertEqual(b"\x89PNG", thumbnail_result.content[:4], "Expected the thumbnail to be a png")
+
+    def test_get_card_file_audio_duration(self):
+        # This method tests that optimizing an audio file records its length and leaves the file itself unchanged
+
+        with open(self.wav_file_path, "rb") as attached_file:
+            file = {"file": ("attachment", attached_file, "audio/wav")}
+            body = {"partOfPrompt": "true"} # we need to include this or the request format is invalid
+            post_rest_call(self, f"http://localhost:3002/cards/{self.file_card_id}/file", attached_files=file, request_parameters=body)
+
+        card_file = wait_for_file_optimization(self, self.file_card_id)
+        self.assertAlmostEqual(3, card_file["duration"], places=1, msg=f"Expected a duration of about 3 seconds but instead got {card_file["duration"]}")
+        get_result = get_raw_rest_call(self, f"http://localhost:3002/cards/{self.file_card_id}/file")
+        compare_file_to_response(self, self.wav_file_path, get_result.content)
+
+        # audio files don't get thumbnails
+        get_response = get_rest_call(self, f"http://localhost:3002/cards/{self.file_card_id}/file", request_parameters={"variant": "thumbnail"}, 
+                                     expected_code=404)
+        expected_get_file_404_message = "Flashcard file has no thumbnail"
+        self.assertEqual(expected_get_file_404_message, get_response["error"]["message"],
+                         f"Expected 404 status message of '{expected_get_file_404_message}' but instead got '{get_response["error"]["message"]}'")
+
+    def test_get_card_file_invalid_variant(self):
+        # This method tests requesting a copy of a card's file that the API doesn't make
+
+        get_response = get_rest_call(self, f"http://localhost:3002/cards/{self.file_card_id}/file", request_parameters={"variant": "huge"}, 
+                                     expected_code=400)
+        expected_get_file_400_message = "Invalid file variant"
+        self.assertEqual(expected_get_file_400_message, get_response["error"]["message"],
+                         f"Expected 400 status message of '{expected_get_file_400_message}' but instead got '{get_response["error"]["message"]}'")
+
     def test_delete_file_from_card_doesnt_exist(self):
         # This method tests attempting to delete a file from a card with an id that doesn't exist in the db
         # This should give a different response code than an invalidly formatted id
@@ -414,7 +648,8 @@ class FlashcardRouteTests(unittest.TestCase):
         with self.assertRaises(KeyError): # a file field should not exist in the get responses
             get_response["file"]
 
-        compare_file_to_response(self, self.svg_file_path, delete_response["data"]["data"])
+        # The deletion response describes the removed file rather than sending its contents back
+        compare_file_to_metadata(self, self.svg_file_path, delete_response)
     
     def test_delete_file_from_card_no_file(self):
         # This method tests attempting to delete a file from a card with an id that exists in the db but doesn't have a file
@@ -431,7 +666,7 @@ def compare_file_to_response(test, file_path, response_file_data, checked_bytes=
     Args:
         test: a method in a TestCase class
         file_path (str): the path to the file being compared
-        response_file_data (array): this is an array of binary data returned as part of a GET request to a DB entry that contains a file
+        response_file_data (bytes): the raw contents of a file returned by a GET request to the cards/:id/file route
         checked_bytes (int): --OPTIONAL-- This defines how many bytes are compared. We don't want or need to compare the entire file
     """
     with open(file_path, "rb") as local_file:
@@ -439,3 +674,36 @@ def compare_file_to_response(test, file_path, response_file_data, checked_bytes=
         request_binary_string = bytes(response_file_data)
         request_base64_string = base64.b64encode(request_binary_string)[:checked_bytes]
         test.assertEqual(file_base64_contents, request_base64_string, "The file contents of the received file do not match the locally stored copy of this file")
+
+def wait_for_file_optimization(test, card_id, timeout_seconds=10):
+    """
+    This method waits for the API to finish optimizing a card's file, which happens in the background after the file is attached
+    Args:
+        test: a method in a TestCase class
+        card_id (str): the id of the card whose file was just attached
+        timeout_seconds (int): --OPTIONAL-- how long to wait before failing the test
+    Returns:
+        dict: the card's file field once it has been optimized
+    """
+    deadline = time.time() + timeout_seconds
+    while time.time() < deadline:
+        card_file = get_rest_call(test, f"http://localhost:3002/cards/{card_id}")["file"]
+        if "optimizedAt" in card_file:
+            return card_file
+        time.sleep(0.2)
+    test.fail(f"The file of card {card_id} was not optimized within {timeout_seconds} seconds")
+
+def compare_file_to_metadata(test, file_path, file_metadata):
+    """
+    This method compares a locally stored file passed through the file_path with the description of a file contained in a response
+    Args:
+        test: a method in a TestCase class
+        file_path (str): the path to the file being compared
+        file_metadata (dict): the file field of a card, containing the file's size in bytes and its sha256 hash
+    """
+    with open(file_path, "rb") as local_file:
+        local_file_contents = local_file.read()
+        test.assertEqual(len(local_file_contents), file_metadata["size"],
+                         f"Expected file size of {len(local_file_contents)} but instead got {file_metadata["size"]}")
+        test.assertEqual(hashlib.sha256(local_file_contents).hexdigest(), file_metadata["hash"], 
+                         "The hash of the received file does not match the hash of the locally stored copy of this file")
@@ -0,0 +1,45 @@
+import unittest
+from api_calls_helper import *
+
+class HealthRouteTests(unittest.TestCase):
+
+    """
+    This module tests the endpoints that report whether the API is alive and ready to take traffic, and how it is performing
+    Before executing this file, launch the API with "npm test" in the free-flashcards-backend directory
+    """
+
+    def test_healthz(self):
+        # This method tests that the API reports itself alive
+
+        get_result = get_rest_call(self, "http://localhost:3002/healthz")
+        self.assertEqual("ok", get_result["status"], f"Expected status 'ok' but instead got '{get_result["status"]}'")
+
+    def test_readyz(self):
+        # This method tests that the API reports itself ready, since it only starts listening once it's connected to the db
+
+        get_result = get_rest_call(self, "http://localhost:3002/readyz")
+        self.assertEqual("ready", get_result["status"], f"Expected status 'ready' but instead got '{get_result["status"]}'")
+
+    def test_metrics(self):
+        # This method tests that requests are recorded by the route template they matched rather than by their url
+
+        get_raw_rest_call(self, "http://localhost:3002/sets/66cfd27b38e5367fabb70f8d", expected_code=404) # a set that doesn't exist
+        metrics_result = get_raw_rest_call(self, "http://localhost:3002/metrics")
+        self.assertTrue(metrics_result.headers["Content-Type"].startswith("text/plain"),
+                        f"Expected the metrics as plain text but instead got '{metrics_result.headers["Content-Type"]}'")
+        self.assertIn('route="/sets/:id",status="404"', metrics_result.text, "Expected the request to be recorded under the route template /sets/:id")
+        self.assertNotIn("66cfd27b38e5367fabb70f8d", metrics_result.text, "Expected the set id to not appear in the metrics")
+        self.assertIn("http_request_duration_seconds_count", metrics_result.text, "Expected request durations to be recorded")
+        if get_rest_call(self, "http://localhost:3002/readyz")["backend"] == "mongo": # only the db backend sends commands to time
+            self.assertIn("mongodb_command_duration_seconds_count", metrics_result.text, "Expected db commands to be timed")
+
+    def test_admission_stats(self):
+        # This method tests that each route class reports its limits and counts the requests it admitted
+
+        get_raw_rest_call(self, "http://localhost:3002/sets/66cfd27b38e5367fabb70f8d", expected_code=404) # a read that got past admission control
+        stats_result = get_rest_call(self, "http://localhost:3002/admission/stats")
+        self.assertIn("read", stats_result, "Expected the read route class to be reported")
+        self.assertGreater(stats_result["read"]["admitted"], 0, "Expected the read to be counted as admitted")
+        for route_class in ["upload", "set-delete"]: # the expensive routes have their own limits, so they can't hold up reads
+            self.assertIn(route_class, stats_result, f"Expected the {route_class} route class to be reported")
+            self.assertIn("rejected", stats_result[route_class], f"Expected the {route_class} route class to report its rejections")
@@ -1,6 +1,7 @@
 import unittest
 from api_calls_helper import *
 import json
+from concurrent.futures import ThreadPoolExecutor
 
 class StudySetRouteTests(unittest.TestCase):
 
@@ -8,25 +9,63 @@ class StudySetRouteTests(unittest.TestCase):
         self.id_doesnt_exist = "66ecea881120acdb2fca8ef9" # Study set id that doesn't exist in the db
         self.id_invalid = "invalid" # This is not a valid format for an object id
 
-        self.tested_set_id = "66ecea881120acdb2fca8ef3" # id for the set we modify & access, but we do not delete this
-        self.unmodified_set_id = "66ef2fcda9385af3ff0545bf" # This set is not modified and exists to verify that getting all study sets successfully returns multiple sets
+        # Both sets are created for each test and deleted (along with their cards) once it finishes, so tests never see each other's changes
+        created_card_bodies = [{"prompt": f"Prompt {i}", "response": f"Response {i}", "userResponseType": "text"} for i in range(3)]
+        self.tested_set_id = create_study_set(self, title="Study set route tests", card_bodies=created_card_bodies)["_id"] # id for the set we modify & access
+        self.unmodified_set_id = create_study_set(self, title="don't modify me")["_id"] # This set is not modified and exists to verify that getting all study sets successfully returns multiple sets
 
     def test_study_set_get_all(self):
         # This method tests getting all the study sets in the test DB since the system is currently only designed for 1 user
 
-        get_response = get_rest_call(self, "http://localhost:3002/sets")
         contains_tested_set = False
         contains_unmodified_set = False
-        # Looping through all the returned study sets seems wrong and could cause problems if the test data set gets very large
-        # However, since the returned data is a list of dictionaries and the order the information is returned in is not guaranteed, a loop seems necessary
-        for study_set in get_response["study_sets"]:
-            if (study_set["_id"] == self.tested_set_id):
-                contains_tested_set = True
-            elif (study_set["_id"] == self.unmodified_set_id):
-                contains_unmodified_set = True
+        # Sets are returned a page at a time, so we follow each page's next_page cursor until we've seen every set
+        page_parameters = {}
+        while True:
+            get_response = get_rest_call(self, "http://localhost:3002/sets", request_parameters=page_parameters)
+            for study_set in get_response["study_sets"]:
+                if (study_set["_id"] == self.tested_set_id):
+                    contains_tested_set = True
+                elif (study_set["_id"] == self.unmodified_set_id):
+                    contains_unmodified_set = True
+            if get_response["next_page"] is None:
+                break
+            page_parameters = {"after": get_response["next_page"]}
         self.assertTrue(contains_tested_set, "The response did not contain the id of the study set being modified by tests")
         self.assertTrue(contains_unmodified_set, "The response did not contain the id of the study set not being modified by tests")
     
+    def test_study_set_get_all_paginated(self):
+        # This method tests that getting all study sets respects the requested page size and that following next_page doesn't repeat any sets
+
+        first_page = get_rest_call(self, "http://localhost:3002/sets", request_parameters={"limit": 1})
+        self.assertEqual(1, len(first_page["study_sets"]),
+                         f"Expected 1 study set in the page but instead got {len(first_page["study_sets"])}")
+        self.assertGreaterEqual(first_page["total_count"], 2, "Expected the total count to include both sets created in setUp")
+        self.assertEqual(first_page["study_sets"][0]["_id"], first_page["next_page"], "Expected the next page cursor to be the last set in the page")
+
+        second_page = get_rest_call(self, "http://localhost:3002/sets", request_parameters={"limit": 1, "after": first_page["next_page"]})
+        self.assertNotEqual(first_page["study_sets"][0]["_id"], second_page["study_sets"][0]["_id"], "Expected the second page to start after the first page")
+
+    def test_study_set_get_all_fields(self):
+        # This method tests that getting all study sets only returns the requested fields, and leaves quiz history out by default
+
+        get_response = get_rest_call(self, "http://localhost:3002/sets", request_parameters={"fields": "title"})
+        for study_set in get_response["study_sets"]:
+            self.assertTrue("title" in study_set, "Expected listed sets to contain the requested title field")
+            self.assertFalse("cards" in study_set, "Expected listed sets to leave out fields that weren't requested")
+
+        default_response = get_rest_call(self, "http://localhost:3002/sets")
+        for study_set in default_response["study_sets"]:
+            self.assertFalse("quizScores" in study_set, "Expected listed sets to leave out quiz scores by default")
+
+    def test_study_set_get_all_invalid_parameters(self):
+        # This method tests that invalid page sizes, cursors and fields are rejected
+
+        get_rest_call(self, "http://localhost:3002/sets", request_parameters={"limit": 0}, expected_code=400)
+        get_rest_call(self, "http://localhost:3002/sets", request_parameters={"limit": "many"}, expected_code=400)
+        get_rest_call(self, "http://localhost:3002/sets", request_parameters={"after": self.id_invalid}, expected_code=400)
+        get_rest_call(self, "http://localhost:3002/sets", request_parameters={"fields": "notAField"}, expected_code=400)
+    
     def test_create_study_set(self):
         # This method tests that we can create a study set by providing the title of the newly created set
 
@@ -41,6 +80,59 @@ class StudySetRouteTests(unittest.TestCase):
         
         delete_rest_call(self, f"http://localhost:3002/sets/{post_response["_id"]}") # deleting the set we create to avoid bloating the test db
     
+    def test_create_study_set_with_cards(self):
+        # This method tests creating a study set together with all of its cards and their files in a single request
+
+        created_card_bodies = [{"prompt": "First", "response": "One", "userResponseType": "text"},
+                               {"prompt": "Second", "response": "Two", "userResponseType": "drawn", "file": {"partOfPrompt": True}}]
+        created_set_body = {"title": "This will be deleted", "cards": json.dumps(created_card_bodies)}
+        with open("./files/jpeg-home.jpg", "rb") as attached_file:
+            file = {"file-1": ("attachment", attached_file, "image/jpeg")} # files are matched to cards through their index
+            post_response = post_rest_call(self, "http://localhost:3002/sets", request_parameters=created_set_body, attached_files=file)
+
+        self.assertEqual(created_set_body["title"], post_response["title"], 
+                         f"Expected created set to have title '{created_set_body["title"]}' but instead got title '{post_response["title"]}'")
+        self.assertEqual(len(created_card_bodies), len(post_response["cards"]),
+                         f"Expected created set to have {len(created_card_bodies)} cards but instead got {len(post_response["cards"])}")
+        
+        # Every card should have been created in order, and only the second card should have a file
+        returned_cards = get_rest_call(self, f"http://localhost:3002/sets/{post_response["_id"]}/cards")["cards"]
+        for i in range(len(created_card_bodies)):
+            self.assertEqual(created_card_bodies[i]["prompt"], returned_cards[i]["prompt"],
+                             f"Expected prompt '{created_card_bodies[i]["prompt"]}' but instead got '{returned_cards[i]["prompt"]}'")
+        self.assertFalse("file" in returned_cards[0], "Expected the first card to not have a file")
+        self.assertEqual("image/jpeg", returned_cards[1]["file"]["fileType"],
+                         f"Expected the second card's file type to be 'image/jpeg' but instead got '{returned_cards[1]["file"]["fileType"]}'")
+        self.assertTrue(returned_cards[1]["file"]["partOfPrompt"], "Expected the second card's file to be part of its prompt")
+
+        delete_rest_call(self, f"http://localhost:3002/sets/{post_response["_id"]}") # deleting the set we create to avoid bloating the test db
+
+    def test_create_study_set_with_invalid_card(self):
+        # This method tests that creating a study set with an invalid card is rejected instead of creating part of the set
+
+        created_card_bodies = [{"prompt": "First", "response": "One", "userResponseType": "text"},
+                               {"prompt": "Second", "response": "Two", "userResponseType": "sung"}] # this response type isn't supported
+        created_set_string = json.dumps({"title": "This should not be created", "cards": created_card_bodies})
+        header = {"Content-Type": "application/json"} # This header results in the string being interpreted as a JSON
+
+        post_response = post_rest_call(self, "http://localhost:3002/sets", request_parameters=created_set_string, 
+                                       request_header=header, expected_code=400)
+        self.assertTrue(post_response["error"]["message"].startswith("Card 1"), 
+                        f"Expected the 400 message to identify the invalid card but instead got '{post_response["error"]["message"]}'")
+
+    def test_create_study_set_with_cards_file_no_part_of_prompt(self):
+        # This method tests that a file attached to a card while creating a set must indicate whether it's part of the card's prompt
+
+        created_card_bodies = [{"prompt": "First", "response": "One", "userResponseType": "text"}]
+        created_set_body = {"title": "This should not be created", "cards": json.dumps(created_card_bodies)}
+        with open("./files/jpeg-home.jpg", "rb") as attached_file:
+            file = {"file-0": ("attachment", attached_file, "image/jpeg")}
+            post_response = post_rest_call(self, "http://localhost:3002/sets", request_parameters=created_set_body, 
+                                           attached_files=file, expected_code=400)
+        expected_message = "Card 0: File must be part of a prompt or response"
+        self.assertEqual(expected_message, post_response["error"]["message"],
+                         f"Expected 400 message of '{expected_message}' but instead got '{post_response["error"]["message"]}'")
+
     def test_create_study_set_no_title(self):
         # This method tests attempting to create a study set with no title field in the request. Sets must have a title to be displayed to users
 
@@ -123,6 +215,23 @@ class StudySetRouteTests(unittest.TestCase):
         self.assertEqual(expected_card_get_404_message, second_card_get_response["error"]["message"],
                          f"Expected 404 message of '{expected_card_get_404_message}' but instead got '{second_card_get_response["error"]["message"]}'")
 
+    def test_delete_study_set_with_files(self):
+        # This method tests that deleting a study set also deletes its cards' files
+
+        created_card_bodies = [{"prompt": "Uh oh", "response": "Oh no", "userResponseType": "text", "file": {"partOfPrompt": False}}]
+        created_set_body = {"title": "This will be deleted", "cards": json.dumps(created_card_bodies)}
+        with open("./files/test_gif.gif", "rb") as attached_file:
+            file = {"file-0": ("attachment", attached_file, "image/gif")}
+            post_response = post_rest_call(self, "http://localhost:3002/sets", request_parameters=created_set_body, attached_files=file)
+        card_id = post_response["cards"][0]
+        get_raw_rest_call(self, f"http://localhost:3002/cards/{card_id}/file") # the file should exist before we delete the set
+
+        delete_rest_call(self, f"http://localhost:3002/sets/{post_response["_id"]}")
+
+        # The card is gone, so its file can no longer be reached either
+        get_rest_call(self, f"http://localhost:3002/cards/{card_id}", expected_code=404)
+        get_rest_call(self, f"http://localhost:3002/cards/{card_id}/file", expected_code=404)
+
     def test_get_study_set_doesnt_exist(self):
         # This method tests attempting to get a study set with an id not present in the db
         # This should give different response code from attempting to get a study set with an invalidly formatted id
@@ -143,10 +252,112 @@ class StudySetRouteTests(unittest.TestCase):
         # This method tests attempting to get a study set when the id exists in the db
         
         get_response = get_rest_call(self, f"http://localhost:3002/sets/{self.unmodified_set_id}")
-        expected_title = "don't modify me" # NOTE this can change depending on the test data in the test db
+        expected_title = "don't modify me" # the title the set was created with in setUp
         self.assertEqual(expected_title, get_response["title"],
                          f"Expected title of '{expected_title}' but instead got '{get_response["title"]}")
 
+    def test_get_study_set_not_modified(self):
+        # This method tests that sending back the ETag of a study set we already have means the set isn't sent again
+
+        get_result = get_raw_rest_call(self, f"http://localhost:3002/sets/{self.unmodified_set_id}")
+        etag = get_result.headers["ETag"]
+        cached_result = get_raw_rest_call(self, f"http://localhost:3002/sets/{self.unmodified_set_id}", 
+                                          request_header={"If-None-Match": etag}, expected_code=304)
+        self.assertEqual(b"", cached_result.content, "Expected a 304 response to not contain the study set")
+
+    def test_get_study_set_etag_changes_after_update(self):
+        # This method tests that changing a study set gives it a new ETag, so a client holding the old version gets the new one
+
+        get_result = get_raw_rest_call(self, f"http://localhost:3002/sets/{self.tested_set_id}")
+        etag = get_result.headers["ETag"]
+
+        updated_set_title = {"title": "A title that invalidates the cache"}
+        header = {"Content-Type": "application/json"} # This header results in the string being interpreted as a JSON
+        put_rest_call(self, f"http://localhost:3002/sets/{self.tested_set_id}", request_parameters=json.dumps(updated_set_title), request_header=header)
+
+        updated_result = get_raw_rest_call(self, f"http://localhost:3002/sets/{self.tested_set_id}", request_header={"If-None-Match": etag})
+        self.assertNotEqual(etag, updated_result.headers["ETag"], "Expected the study set's ETag to change after its title was updated")
+        self.assertEqual(updated_set_title["title"], updated_result.json()["title"],
+                         f"Expected title of '{updated_set_title["title"]}' but instead got '{updated_result.json()["title"]}'")
+
+    def test_get_cards_in_study_set_compressed(self):
+        # This method tests that a large list of cards is compressed for clients that accept it and sent unchanged to those that don't
+
+        created_card_bodies = [{"prompt": f"Prompt number {i}", "response": f"Response number {i}", "userResponseType": "text"} for i in range(40)]
+        created_set_body = {"title": "This will be deleted", "cards": json.dumps(created_card_bodies)}
+        post_response = post_rest_call(self, "http://localhost:3002/sets", request_parameters=created_set_body)
+
+        compressed_result = get_raw_rest_call(self, f"http://localhost:3002/sets/{post_response["_id"]}/cards", request_header={"Accept-Encoding": "gzip"})
+        uncompressed_result = get_raw_rest_call(self, f"http://localhost:3002/sets/{post_response["_id"]}/cards", request_header={"Accept-Encoding": "identity"})
+        self.assertEqual("gzip", compressed_result.headers.get("Content-Encoding"),
+                         f"Expected the cards to be gzip encoded but instead got encoding '{compressed_result.headers.get("Content-Encoding")}'")
+        self.assertFalse("Content-Encoding" in uncompressed_result.headers, "Expected the cards to not be encoded when the client doesn't accept it")
+        self.assertTrue("Accept-Encoding" in compressed_result.headers.get("Vary", ""), "Expected the response to vary on Accept-Encoding")
+        self.assertEqual(uncompressed_result.json(), compressed_result.json(), "Expected the compressed and uncompressed cards to be the same")
+        self.assertFalse("__v" in compressed_result.json()["cards"][0], "Expected the cards to not include their version key")
+
+        delete_rest_call(self, f"http://localhost:3002/sets/{post_response["_id"]}") # deleting the set we create to avoid bloating the test db
+
+    def test_get_cards_in_study_set_doesnt_exist(self):
+        # This method tests attempting to get the cards in a study set with an id not present in the db
+        # This should give different response code from attempting to get the cards in a study set with an invalidly formatted id
+
+        get_response = get_rest_call(self, f"http://localhost:3002/sets/{self.id_doesnt_exist}/cards", expected_code=404)
+        expected_get_404_message = "Study Set does not exist" # We need to verify that this 404 code is because the resource doesn't exist, not because of an invalid URL
+        self.assertEqual(expected_get_404_message, get_response["error"]["message"],
+                         f"Expected 404 message of '{expected_get_404_message}' but instead got '{get_response["error"]["message"]}'")
+
+    def test_get_cards_in_study_set_invalid_id(self):
+        # This method tests attempting to get the cards in a study set with an invalidly formatted id
+        # This should give different response code from attempting to get the cards in a study set with a validly formatted id that doesn't exist
+
+        get_rest_call(self, f"http://localhost:3002/sets/{self.id_invalid}/cards", expected_code=400)
+        # The get_rest_call method asserts that the response code is 400, so we don't need to do anything else
+
+    def test_get_cards_in_study_set_invalid_fields(self):
+        # This method tests attempting to get the cards in a study set while requesting a field that flashcards don't have
+
+        get_response = get_rest_call(self, f"http://localhost:3002/sets/{self.tested_set_id}/cards", 
+                                     request_parameters={"fields": "prompt,notAField"}, expected_code=400)
+        expected_get_400_message = "invalid card fields requested" # We need to verify the 400 is caused by the requested fields and not the set id
+        self.assertEqual(expected_get_400_message, get_response["error"]["message"],
+                         f"Expected 400 message of '{expected_get_400_message}' but instead got '{get_response["error"]["message"]}'")
+
+    def test_get_cards_in_study_set_exists(self):
+        # This method tests getting every card in a study set in one request, and that the cards come back in the set's order
+        
+        # We first create the study set we read from so we know exactly which cards it contains
+        created_set_body = {"title": "This will be deleted"}
+        created_set_string = json.dumps(created_set_body) # This converts the dictionary to a json in string format
+        header = {"Content-Type": "application/json"} # This header results in the string being interpreted as a JSON
+        created_set_id = post_rest_call(self, "http://localhost:3002/sets", request_parameters=created_set_string, 
+                                        request_header=header)["_id"]
+        
+        created_card_bodies = [{"prompt": "First", "response": "One", "userResponseType": "text"},
+                               {"prompt": "Second", "response": "Two", "userResponseType": "drawn"},
+                               {"prompt": "Third", "response": "Three", "userResponseType": "recorded"}]
+        for created_card_body in created_card_bodies:
+            set_card_ids = post_rest_call(self, f"http://localhost:3002/sets/{created_set_id}", request_parameters=json.dumps(created_card_body), 
+                                          request_header=header)["cards"]
+
+        get_response = get_rest_call(self, f"http://localhost:3002/sets/{created_set_id}/cards")
+        returned_cards = get_response["cards"]
+        self.assertEqual(set_card_ids, [card["_id"] for card in returned_cards],
+                         "Expected the returned cards to be in the same order as the set's card ids")
+        for i in range(len(created_card_bodies)):
+            self.assertEqual(created_card_bodies[i]["prompt"], returned_cards[i]["prompt"],
+                             f"Expected prompt '{created_card_bodies[i]["prompt"]}' but instead got '{returned_cards[i]["prompt"]}'")
+            self.assertEqual(created_card_bodies[i]["userResponseType"], returned_cards[i]["userResponseType"],
+                             f"Expected user response type '{created_card_bodies[i]["userResponseType"]}' but instead got '{returned_cards[i]["userResponseType"]}'")
+
+        # Requesting only some fields should leave the others out of every card
+        projected_response = get_rest_call(self, f"http://localhost:3002/sets/{created_set_id}/cards", request_parameters={"fields": "prompt"})
+        for card in projected_response["cards"]:
+            self.assertTrue("prompt" in card, "Expected projected cards to contain the requested prompt field")
+            self.assertFalse("response" in card, "Expected projected cards to leave out fields that weren't requested")
+
+        delete_rest_call(self, f"http://localhost:3002/sets/{created_set_id}") # deleting the set we create to avoid bloating the test db
+
     def test_update_study_set_doesnt_exist(self):
         # This method tests attempting to update the title of a study set with an id not present in the db
         # This should give different response code from attempting to update a study set with an invalidly formatted id
@@ -281,6 +492,33 @@ class StudySetRouteTests(unittest.TestCase):
         delete_rest_call(self, f"http://localhost:3002/sets/{self.tested_set_id}/{self.id_invalid}",
                             expected_code=400)
 
+    def test_cards_in_study_set_keep_order_after_delete_and_add(self):
+        # This method tests that cards know which set they're in and stay in the set's order after a card is removed and another is added
+
+        created_card_bodies = [{"prompt": "First", "response": "One", "userResponseType": "text"},
+                               {"prompt": "Second", "response": "Two", "userResponseType": "text"},
+                               {"prompt": "Third", "response": "Three", "userResponseType": "text"}]
+        created_set_body = {"title": "This will be deleted", "cards": json.dumps(created_card_bodies)}
+        post_response = post_rest_call(self, "http://localhost:3002/sets", request_parameters=created_set_body)
+        set_id = post_response["_id"]
+
+        delete_rest_call(self, f"http://localhost:3002/sets/{set_id}/{post_response["cards"][1]}")
+        header = {"Content-Type": "application/json"} # This header results in the string being interpreted as a JSON
+        added_card_body = {"prompt": "Fourth", "response": "Four", "userResponseType": "text"}
+        add_response = post_rest_call(self, f"http://localhost:3002/sets/{set_id}", request_parameters=json.dumps(added_card_body), request_header=header)
+
+        returned_cards = get_rest_call(self, f"http://localhost:3002/sets/{set_id}/cards")["cards"]
+        returned_prompts = [card["prompt"] for card in returned_cards]
+        self.assertEqual(["First", "Third", "Fourth"], returned_prompts, f"Expected prompts ['First', 'Third', 'Fourth'] but instead got {returned_prompts}")
+        self.assertEqual(add_response["cards"], [card["_id"] for card in returned_cards], "Expected the cards to be returned in the set's order")
+        for card in returned_cards:
+            self.assertEqual(set_id, card["setId"], f"Expected card '{card["prompt"]}' to be in set '{set_id}' but instead got '{card["setId"]}'")
+        returned_positions = [card["position"] for card in returned_cards]
+        self.assertEqual(sorted(returned_positions), returned_positions, f"Expected the cards' positions to increase but instead got {returned_positions}")
+        self.assertEqual(len(set(returned_positions)), len(returned_positions), f"Expected every card to have its own position but instead got {returned_positions}")
+
+        delete_rest_call(self, f"http://localhost:3002/sets/{set_id}") # deleting the set we create to avoid bloating the test db
+
     def test_add_card_and_delete_card_to_study_set_exists(self):
         # This method tests attempting to add a card to a study set with a valid set id, then tests attempting to delete that card 
         # We are bundling these two features into one test so we can ensure that the state of the test db after our test is the same as before we executed it
@@ -290,7 +528,7 @@ class StudySetRouteTests(unittest.TestCase):
         created_card_string = json.dumps(created_card_body) # This converts the dictionary to a json in string format
         header = {"Content-Type": "application/json"} # This header results in the string being interpreted as a JSON
 
-        # we are assuming the added card will be in the 4th position in the array - this could be susceptible to changes to the testing db
+        # the set is created with 3 cards in setUp, so the added card will be in the 4th position in the array
         added_card_id = post_rest_call(self, f"http://localhost:3002/sets/{self.tested_set_id}", request_parameters=created_card_string,
                                        request_header=header)["cards"][3]
         
@@ -315,6 +553,54 @@ class StudySetRouteTests(unittest.TestCase):
         set_card_ids = get_set_result["cards"]
         self.assertFalse(added_card_id in set_card_ids) 
 
+    def test_add_cards_to_study_set_concurrently(self):
+        # This method tests adding many cards to the same set at once. Every add must end up in the set, none can overwrite another
+        # We create a new set for this test and delete it afterwards so the cards don't change the sets other tests rely on
+
+        header = {"Content-Type": "application/json"} # This header results in the string being interpreted as a JSON
+        created_set_id = post_rest_call(self, "http://localhost:3002/sets", request_parameters=json.dumps({"title": "Concurrent adds"}),
+                                        request_header=header)["_id"]
+        added_card_count = 200
+
+        def add_card(card_number):
+            created_card_string = json.dumps({"prompt": f"Prompt {card_number}", "response": "Response", "userResponseType": "text"})
+            return post_rest_call(self, f"http://localhost:3002/sets/{created_set_id}", request_parameters=created_card_string,
+                                  request_header=header)
+
+        try:
+            with ThreadPoolExecutor(max_workers=50) as executor:
+                list(executor.map(add_card, range(added_card_count)))
+
+            set_card_ids = get_rest_call(self, f"http://localhost:3002/sets/{created_set_id}")["cards"]
+            self.assertEqual(added_card_count, len(set_card_ids),
+                             f"Expected {added_card_count} cards in the set but instead got {len(set_card_ids)}")
+            self.assertEqual(added_card_count, len(set(set_card_ids)), "Expected every card in the set to be unique")
+        finally:
+            delete_rest_call(self, f"http://localhost:3002/sets/{created_set_id}")
+
+    def test_add_set_quiz_scores_concurrently(self):
+        # This method tests adding many quiz scores to the same set at once. Every score must be recorded, none can overwrite another
+
+        header = {"Content-Type": "application/json"} # This header results in the string being interpreted as a JSON
+        created_set_id = post_rest_call(self, "http://localhost:3002/sets", request_parameters=json.dumps({"title": "Concurrent quiz scores"}),
+                                        request_header=header)["_id"]
+        added_score_count = 200
+
+        def add_score(score_number):
+            added_score_string = json.dumps({"addedQuizScore": str(score_number / added_score_count)})
+            return post_rest_call(self, f"http://localhost:3002/sets/{created_set_id}/quiz", request_parameters=added_score_string,
+                                  request_header=header)
+
+        try:
+            with ThreadPoolExecutor(max_workers=50) as executor:
+                list(executor.map(add_score, range(added_score_count)))
+
+            attempt_count = get_rest_call(self, f"http://localhost:3002/sets/{created_set_id}/stats")["attemptCount"]
+            self.assertEqual(added_score_count, attempt_count,
+                             f"Expected {added_score_count} quiz attempts but instead got {attempt_count}")
+        finally:
+            delete_rest_call(self, f"http://localhost:3002/sets/{created_set_id}")
+
     def test_add_set_quiz_score_doesnt_exist(self):
         # This method tests adding a quiz score to a study set with an id that doesn't exist in the db
         # This should produce a different error code than using an invalidly formatted id
@@ -424,8 +710,8 @@ class StudySetRouteTests(unittest.TestCase):
     def test_add_set_quiz_score_integer(self):
         # This method tests attempting to add a quiz score with an integer, which should be accepted
 
-        # We want to get the initial state of the set to ensure that a value was actually added to the array
-        get_response = get_rest_call(self, f"http://localhost:3002/sets/{self.tested_set_id}")
+        # We want to get the initial stats of the set to ensure that an attempt was actually recorded
+        get_response = get_rest_call(self, f"http://localhost:3002/sets/{self.tested_set_id}/stats")
 
         added_score_body = {"addedQuizScore": "1"}
         added_score_string = json.dumps(added_score_body) # This converts the dictionary to a json in string format 
@@ -436,21 +722,22 @@ class StudySetRouteTests(unittest.TestCase):
         # We can't delete quiz scores from the db, so we need to get the quiz score we added from where it should be in the array (at the end) since we can't guarantee a precise index where it'll be
             # users shouldn't be able to erase their quiz history whether deliberately or accidentally
         
-        # Verifying that exactly one quiz score was added to the array
-        resulting_scores = post_response["quizScores"]
-        initial_scores = get_response["quizScores"]
-        self.assertEqual(len(initial_scores) + 1, len(resulting_scores),
-                         f"Expected resulting number of quiz scores to be {len(initial_scores) + 1} but instead got {len(resulting_scores)}")
-
-        # Verifying that our quiz score was added to the end of the array, we need to cast to float because python automatically turns the response from the client into a number
+        # Verifying that exactly one quiz attempt was recorded
+        resulting_count = post_response["quizStats"]["attemptCount"]
+        initial_count = get_response["attemptCount"]
+        self.assertEqual(initial_count + 1, resulting_count,
+                         f"Expected resulting number of quiz attempts to be {initial_count + 1} but instead got {resulting_count}")
+
+        # Verifying that our quiz score is the most recent score, we need to cast to a float because python automatically turns the response from the client into a number
+        resulting_scores = post_response["quizStats"]["recentScores"]
         self.assertEqual(float(added_score_body["addedQuizScore"]), resulting_scores[len(resulting_scores) - 1],
                          f"Expected added quiz score to be {added_score_body["addedQuizScore"]} but instead got {resulting_scores[len(resulting_scores) - 1]}")
         
     def test_add_set_quiz_score_float(self):
         # This method tests attempting to add a quiz score with a float, which should be accepted
 
-        # We want to get the initial state of the set to ensure that a value was actually added to the array
-        get_response = get_rest_call(self, f"http://localhost:3002/sets/{self.tested_set_id}")
+        # We want to get the initial stats of the set to ensure that an attempt was actually recorded
+        get_response = get_rest_call(self, f"http://localhost:3002/sets/{self.tested_set_id}/stats")
 
         added_score_body = {"addedQuizScore": "0.5"}
         added_score_string = json.dumps(added_score_body) # This converts the dictionary to a json in string format 
@@ -461,15 +748,58 @@ class StudySetRouteTests(unittest.TestCase):
         # We can't delete quiz scores from the db, so we need to get the quiz score we added from where it should be in the array (at the end) since we can't guarantee a precise index where it'll be
             # users shouldn't be able to erase their quiz history whether deliberately or accidentally
         
-        # Verifying that exactly one quiz score was added to the array
-        resulting_scores = post_response["quizScores"]
-        initial_scores = get_response["quizScores"]
-        self.assertEqual(len(initial_scores) + 1, len(resulting_scores),
-                         f"Expected resulting number of quiz scores to be {len(initial_scores) + 1} but instead got {len(resulting_scores)}")
-
-        # Verifying that our quiz score was added to the end of the array, we need to cast to a float because python automatically turns the response from the client into a number
+        # Verifying that exactly one quiz attempt was recorded
+        resulting_count = post_response["quizStats"]["attemptCount"]
+        initial_count = get_response["attemptCount"]
+        self.assertEqual(initial_count + 1, resulting_count,
+                         f"Expected resulting number of quiz attempts to be {initial_count + 1} but instead got {resulting_count}")
+
+        # Verifying that our quiz score is the most recent score, we need to cast to a float because python automatically turns the response from the client into a number
+        resulting_scores = post_response["quizStats"]["recentScores"]
         self.assertEqual(float(added_score_body["addedQuizScore"]), resulting_scores[len(resulting_scores) - 1],
                          f"Expected added quiz score to be {added_score_body["addedQuizScore"]} but instead got {resulting_scores[len(resulting_scores) - 1]}")
     
+    def test_get_study_set_stats_doesnt_exist(self):
+        # This method tests getting the quiz stats of a study set with an id that doesn't exist in the db
+
+        get_response = get_rest_call(self, f"http://localhost:3002/sets/{self.id_doesnt_exist}/stats", expected_code=404)
+        expected_get_404_message = "Study Set does not exist" # We need to verify that this 404 code is because the resource doesn't exist, not because of an invalid URL
+        self.assertEqual(expected_get_404_message, get_response["error"]["message"],
+                         f"Expected a 404 message of '{expected_get_404_message}' but instead got '{get_response["error"]["message"]}'")
+
+    def test_get_study_set_stats_invalid_id(self):
+        # This method tests getting the quiz stats of a study set with an invalidly formatted id
+
+        get_rest_call(self, f"http://localhost:3002/sets/{self.id_invalid}/stats", expected_code=400)
+
+    def test_get_study_set_stats_exists(self):
+        # This method tests that the stats of a set are updated with every quiz score added to it
+        # We create a new set for this test and delete it afterwards so we know exactly which scores it has
+
+        header = {"Content-Type": "application/json"} # This header results in the string being interpreted as a JSON
+        created_set_id = post_rest_call(self, "http://localhost:3002/sets", request_parameters=json.dumps({"title": "Quiz stats"}),
+                                        request_header=header)["_id"]
+        try:
+            initial_stats = get_rest_call(self, f"http://localhost:3002/sets/{created_set_id}/stats")
+            self.assertEqual(0, initial_stats["attemptCount"], f"Expected a new set to have no attempts but instead got {initial_stats["attemptCount"]}")
+            self.assertIsNone(initial_stats["meanScore"], "Expected a new set to have no mean score")
+
+            added_scores = [0.5, 1, 0.25]
+            for score in added_scores:
+                post_rest_call(self, f"http://localhost:3002/sets/{created_set_id}/quiz", request_parameters=json.dumps({"addedQuizScore": score}),
+                               request_header=header)
+
+            stats = get_rest_call(self, f"http://localhost:3002/sets/{created_set_id}/stats")
+            self.assertEqual(len(added_scores), stats["attemptCount"],
+                             f"Expected {len(added_scores)} attempts but instead got {stats["attemptCount"]}")
+            self.assertAlmostEqual(sum(added_scores) / len(added_scores), stats["meanScore"])
+            self.assertEqual(max(added_scores), stats["bestScore"], f"Expected a best score of {max(added_scores)} but instead got {stats["bestScore"]}")
+            self.assertEqual(added_scores, stats["recentScores"], f"Expected recent scores of {added_scores} but instead got {stats["recentScores"]}")
+            # The moving average lies between the lowest and highest score, and leans towards the latest one
+            self.assertTrue(min(added_scores) <= stats["movingAverage"] <= max(added_scores),
+                            f"Expected the moving average to be between the lowest and highest score but instead got {stats["movingAverage"]}")
+        finally:
+            delete_rest_call(self, f"http://localhost:3002/sets/{created_set_id}")
+
     # TODO (for test_flashcard_route.py): Need to verify that 404 messages are for the targeted resource and not caused by attempting to hit a route that doesn't exist
         # Also need to update the comment for the 'header' - mentions a 'user string', not sure where this typo came from
\ No newline at end of file